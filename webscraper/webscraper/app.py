@@ -1,147 +1,212 @@
-import sys
-import os
 import os
 import sys
+import time
 
+# Startup phases are timed from here; see /startup/stats
+IMPORT_STARTED = time.perf_counter()
 
-import google.generativeai as genai
-from flask import Flask, render_template, request, jsonify, send_file, url_for
-from flask_cors import CORS
+from flask import Flask, render_template, request, jsonify, url_for, Response, stream_with_context, g
 from dotenv import load_dotenv
 import uuid
-import time
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import hashlib
+from jobs import JobManager, JobStore
+from cache import ResultCache, make_key
+from singleflight import SingleFlight
+from batch import RateLimiter, run_batch, write_bundle
+from streaming import SectionStreamParser, format_event
+from chunking import FALLBACK_TITLE, estimate_tokens, merge_structures, split_into_chunks
+from compaction import compact_input, looks_like_html
+from structurer import structure_text
+from jsonrepair import repair_json, salvage_structure
+from scheduler import BATCH, INTERACTIVE, GeminiScheduler, QuotaExhausted
+from hedge import PRIMARY, Hedger
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pdfpool import PdfConverter, find_soffice
+from ooxml import count_table_rows, write_document
+from memstore import MemoryArtifactStore
+from artifacts import ArtifactStore, file_digest
+from downloads import IMMUTABLE, REVALIDATE, negotiate, offload_header, read_range
+from fetcher import Fetcher
+from httpcache import HttpCache
+from parsers import get_parser
+from pipeline import run_pipeline
+from metrics import CONTENT_TYPE, REGISTRY
+from logconfig import bind_request_id, configure_logging, request_id_var
+import copy
+import io
+import json
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from functools import lru_cache
 
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Flask app
+# Structured logging is set up by create_app(); LOG_LEVEL=DEBUG also logs full document contents
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+logger = logging.getLogger('byteme')
+
+# Prometheus metrics, served on /metrics
+REQUEST_SECONDS = REGISTRY.histogram('byteme_request_duration_seconds', 'HTTP request latency until the response starts',
+                                     ('endpoint', 'method', 'status'))
+STAGE_SECONDS = REGISTRY.histogram('byteme_stage_duration_seconds', 'Time spent in each processing stage', ('stage',))
+GEMINI_SECONDS = REGISTRY.histogram('byteme_gemini_request_duration_seconds', 'Gemini call latency',
+                                    ('kind', 'outcome'))
+GEMINI_QUEUE_SECONDS = REGISTRY.histogram('byteme_gemini_queue_wait_seconds',
+                                          'Time Gemini calls wait for quota before they start', ('priority',))
+GEMINI_TOKENS = REGISTRY.counter('byteme_gemini_tokens_total', 'Tokens sent to and generated by Gemini',
+                                 ('kind', 'direction'))
+DOWNLOADS = REGISTRY.counter('byteme_downloads_total', 'Generated files served', ('type',))
+DOWNLOAD_BYTES = REGISTRY.counter('byteme_download_bytes_total', 'Bytes of generated files served', ('type',))
+REGISTRY.callback('byteme_structure_cache_events_total', 'Structuring cache hits, misses, stores and evictions',
+                  lambda: {(event,): count for event, count in result_cache.stats.items()}, ('event',), kind='counter')
+REGISTRY.callback('byteme_model_output_total', 'Model responses by how much repair they needed',
+                  lambda: {(outcome,): count for outcome, count in repair_stats.items()}, ('outcome',), kind='counter')
+REGISTRY.callback('byteme_gemini_queue_depth', 'Gemini calls waiting for quota',
+                  lambda: gemini_queue_depth(), ('priority',))
+REGISTRY.callback('byteme_gemini_hedges_total', 'Hedged Gemini calls: calls made, hedges fired or skipped, wins and cancellations',
+                  lambda: {(event,): count for event, count in hedger.stats.items()}, ('event',), kind='counter')
+REGISTRY.callback('byteme_compaction_tokens_total', 'Estimated prompt input tokens before and after compaction',
+                  lambda: {('before',): compaction_stats['tokens_before'], ('after',): compaction_stats['tokens_after']},
+                  ('phase',), kind='counter')
+REGISTRY.callback('byteme_startup_seconds', 'Seconds each startup phase of this process took',
+                  lambda: {(phase,): seconds for phase, seconds in startup_stats.items()}, ('phase',))
+
+# Initialize Flask app; CORS is enabled by create_app()
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# Comma-separated origins browsers may call the API from, or * for any
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(',') if origin.strip()]
+app_configured = False
+app_configured_lock = threading.Lock()
 
 # Configure Google Generative AI
 # You'll need to set your API key in an environment variable
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    print("Warning: GOOGLE_API_KEY environment variable not set")
 
-# Configure Gemini
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+# The Gemini SDK and python-docx are slow to import, so they are loaded on first use or by
+# warm_up(): WARM_UP=background (default) warms up in a thread while the worker starts serving,
+# WARM_UP=1 before it serves and WARM_UP=0 not at all
+WARM_UP = os.getenv("WARM_UP", "background")
+genai = None
+genai_lock = threading.Lock()
+docx_template = None
+docx2pdf_convert = None
+WD_ALIGN_PARAGRAPH = None
+docx_lock = threading.Lock()
+startup_stats = {}
 
 # Create output directory if it doesn't exist
-OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+OUTPUT_FOLDER = os.getenv("OUTPUT_FOLDER", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output'))
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/process', methods=['POST'])
-def process_text():
-    try:
-        # Get the input text from the request
-        input_text = request.form.get('text')
-        if not input_text:
-            return jsonify({'error': 'No text provided'}), 400
-
-        # Check if the input is already a JSON structure
-        try:
-            import json
-            # Try to parse as JSON first
-            if input_text.strip().startswith('{') and input_text.strip().endswith('}'):
-                print("Input appears to be JSON, trying to parse directly")
-                structured_content = json.loads(input_text)
-                print(f"Successfully parsed JSON input: {structured_content.keys() if isinstance(structured_content, dict) else 'not a dict'}")
-            else:
-                # Use Gemini AI to structure the content
-                print("Using Gemini to structure content")
-                structured_content = generate_structured_content(input_text)
-        except json.JSONDecodeError:
-            # Not valid JSON, use Gemini
-            print("Input is not valid JSON, using Gemini")
-            structured_content = generate_structured_content(input_text)
-
-        if not structured_content:
-            return jsonify({'error': 'Failed to generate structured content'}), 500
-
-        # Create a unique ID for this request to avoid file conflicts
-        request_id = str(uuid.uuid4())[:8]
-
-        # Create output filenames with the unique ID
-        docx_filename = f"Formatted_Document_{request_id}.docx"
-        pdf_filename = f"Formatted_Document_{request_id}.pdf"
-
-        output_docx_path = os.path.join(OUTPUT_FOLDER, docx_filename)
-
-        # Generate the document directly
-        success = create_document(structured_content, output_docx_path)
-
-        if not success or not os.path.exists(output_docx_path):
-            return jsonify({'error': 'Failed to create document file'}), 500
-
-        # Verify the document was created
-        if not os.path.exists(output_docx_path):
-            return jsonify({'error': f'Document file was not created at {output_docx_path}'}), 500
-
-        # Try to convert to PDF if docx2pdf is available
-        output_pdf_path = os.path.join(OUTPUT_FOLDER, pdf_filename)
-        pdf_available = False
-
-        try:
-            from docx2pdf import convert
-            convert(output_docx_path, output_pdf_path)
-
-            # Verify PDF was created
-            if os.path.exists(output_pdf_path) and os.path.getsize(output_pdf_path) > 0:
-                pdf_available = True
-                print(f"PDF created successfully at {output_pdf_path}")
-            else:
-                print(f"PDF file was not created or is empty")
-        except Exception as pdf_error:
-            print(f"Error converting to PDF: {str(pdf_error)}")
-            import traceback
-            print(traceback.format_exc())
-            # Continue even if PDF conversion fails
-
-        # Return success response with download links
-        response_data = {
-            'success': True,
-            'message': 'Document generated successfully',
-            'docx_url': url_for('download_file', filename=docx_filename),
-            'structured_content': structured_content
-        }
-
-        if pdf_available:
-            response_data['pdf_url'] = url_for('download_file', filename=pdf_filename)
-
-        return jsonify(response_data)
-
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"Error in process_text: {str(e)}\n{error_details}")
-        return jsonify({'error': str(e)}), 500
-
-def generate_structured_content(input_text):
-    """Use Gemini AI to structure the input text into sections for the document"""
-    if not GOOGLE_API_KEY:
-        raise Exception("Google API Key not configured")
-
-    try:
-        # Configure the model
-        generation_config = {
-            "temperature": 0.1,  # Lower temperature for more deterministic output
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-        }
-
-        # Create the prompt for Gemini
-        prompt = f"""
+# Bump RENDERER_VERSION whenever create_document output changes so stale artifacts are not reused
+RENDERER_VERSION = 1
+
+# Rendered files live in hash-sharded subdirectories of OUTPUT_FOLDER with a SQLite index;
+# ARTIFACT_TTL (seconds unused) and ARTIFACT_MAX_MB (total size) drive background eviction
+artifact_store = ArtifactStore(
+    OUTPUT_FOLDER,
+    os.getenv("ARTIFACT_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts.db')),
+    ttl=int(os.getenv("ARTIFACT_TTL", str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv("ARTIFACT_MAX_MB", "0")) * 1024 * 1024
+)
+ARTIFACT_GC_INTERVAL = int(os.getenv("ARTIFACT_GC_INTERVAL", "300"))
+
+# Downloads carry an ETag from the content digest and honour Range requests. DOWNLOAD_OFFLOAD
+# ("x-accel-redirect" or "x-sendfile") hands the file body to the front proxy instead;
+# DOWNLOAD_ACCEL_PREFIX is the internal nginx location that aliases OUTPUT_FOLDER
+DOWNLOAD_OFFLOAD = os.getenv("DOWNLOAD_OFFLOAD", "").lower()
+DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "/protected-output/")
+DOWNLOAD_CACHE_CONTROL = os.getenv("DOWNLOAD_CACHE_CONTROL", IMMUTABLE)
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(256 * 1024)))
+artifact_gc_thread = None
+artifact_gc_lock = threading.Lock()
+
+# Opt-in zero-disk mode: render into memory and serve from a size-bounded store,
+# spilling artifacts to OUTPUT_FOLDER when they are pushed out for space or expire.
+# Expiry is lazy, checked whenever the store is used, and an artifact is served
+# from memory until its spill has been written
+MEMORY_ARTIFACTS = os.getenv("MEMORY_ARTIFACTS", "0") == "1"
+memory_store = MemoryArtifactStore(
+    max_bytes=int(os.getenv("MEMORY_ARTIFACTS_MAX_MB", "256")) * 1024 * 1024,
+    ttl=int(os.getenv("MEMORY_ARTIFACTS_TTL", "3600")),
+    spill=lambda filename, data: spill_artifact(filename, data)
+) if MEMORY_ARTIFACTS else None
+
+# DOCX engine: "python-docx", "streaming" (ooxml writer) or "auto", which streams
+# documents with at least STREAMING_RENDER_ROWS table rows
+DOC_RENDERER = os.getenv("DOC_RENDERER", "auto")
+STREAMING_RENDER_ROWS = int(os.getenv("STREAMING_RENDER_ROWS", "2000"))
+render_flight = SingleFlight()
+
+# PDF conversion settings for the warm LibreOffice pool
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_BATCH_SIZE = int(os.getenv("PDF_BATCH_SIZE", "8"))
+PDF_TIMEOUT = int(os.getenv("PDF_TIMEOUT", "60"))
+PDF_MAX_CONVERSIONS_PER_WORKER = int(os.getenv("PDF_MAX_CONVERSIONS_PER_WORKER", "200"))
+pdf_converter = None
+pdf_converter_lock = threading.Lock()
+
+# PDFs are converted lazily on first download unless PDF_EAGER is set;
+# PDF_PRERENDER converts them in the background while the app is idle
+PDF_EAGER = os.getenv("PDF_EAGER", "0") == "1"
+PDF_PRERENDER = os.getenv("PDF_PRERENDER", "0") == "1"
+PDF_PRERENDER_INTERVAL = float(os.getenv("PDF_PRERENDER_INTERVAL", "5"))
+pdf_flight = SingleFlight()
+prerender_queue = deque(maxlen=1000)
+prerender_thread = None
+active_requests = 0
+active_requests_lock = threading.Lock()
+
+# Gemini settings; bump PROMPT_VERSION whenever PROMPT_TEMPLATE changes so cached results are not reused
+GEMINI_MODEL = "gemini-2.0-flash"
+GENERATION_CONFIG = {
+    "temperature": 0.1,  # Lower temperature for more deterministic output
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+}
+PROMPT_VERSION = 1
+
+# Every Gemini call goes through one scheduler that keeps within the RPM/TPM quotas (0 = no limit);
+# interactive calls go ahead of batch calls and give up if they cannot start within their deadline
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "0"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "0"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_DEADLINES = {
+    INTERACTIVE: float(os.getenv("GEMINI_INTERACTIVE_DEADLINE", "30")),
+    BATCH: float(os.getenv("GEMINI_BATCH_DEADLINE", "0")),
+}
+gemini_scheduler = GeminiScheduler(
+    requests_per_minute=GEMINI_RPM,
+    tokens_per_minute=GEMINI_TPM,
+    max_concurrency=GEMINI_MAX_CONCURRENCY,
+    max_retries=GEMINI_MAX_RETRIES,
+    on_wait=lambda seconds, priority: GEMINI_QUEUE_SECONDS.observe(seconds, priority=priority)
+)
+gemini_models = {}
+gemini_model_lock = threading.Lock()
+
+# Opt-in hedging: when a structuring call runs past GEMINI_HEDGE_PERCENTILE of recent latencies,
+# a second request (to GEMINI_HEDGE_MODEL) races it and the first valid JSON wins
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "0") == "1"
+GEMINI_HEDGE_MODEL = os.getenv("GEMINI_HEDGE_MODEL", GEMINI_MODEL)
+hedger = Hedger(
+    percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95")),
+    default_delay=float(os.getenv("GEMINI_HEDGE_DELAY", "5")),
+    min_delay=float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "0.5"))
+)
+hedge_executor = ThreadPoolExecutor(max_workers=4 * GEMINI_MAX_CONCURRENCY, thread_name_prefix='hedge')
+
+# Inputs above CHUNK_INPUT_TOKENS are split so each chunk's JSON fits in max_output_tokens
+CHUNK_INPUT_TOKENS = int(os.getenv("CHUNK_INPUT_TOKENS", "3000"))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "4"))
+PROMPT_TEMPLATE = """
         You are a document formatting expert. I need to create a well-structured document from the following text content:
 
         ```
@@ -194,108 +259,1174 @@ def generate_structured_content(input_text):
         5. Your response contains ONLY the JSON object, nothing else
         """
 
-        # Initialize the model
-        model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",  #  structured output
-            generation_config=generation_config
-        )
+# Truncated responses are completed with a continuation request instead of a full regeneration
+JSON_MAX_CONTINUATIONS = int(os.getenv("JSON_MAX_CONTINUATIONS", "2"))
+CONTINUATION_TEMPLATE = """
+        You are a document formatting expert. You were turning the following text content into a structured document:
+
+        ```
+        {input_text}
+        ```
+
+        Your previous response was cut off. These sections were already generated:
+
+        ```
+        {partial}
+        ```
+
+        Continue the document from where it stopped. Respond with ONLY a valid JSON object of the form
+        {{"sections": [...]}} holding the remaining sections, in the same format as the sections above.
+        If the last section above is unfinished, start with a section that has the same heading and level
+        and contains only its missing content. Do not repeat content that was already generated.
+        """
+repair_stats = {'responses': 0, 'clean': 0, 'repaired': 0, 'truncated': 0, 'continuations': 0,
+                'salvaged_sections': 0, 'fallbacks': 0}
+repair_stats_lock = threading.Lock()
+
+# Cache for Gemini structuring results
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache.db'))
+result_cache = ResultCache(
+    CACHE_DB_PATH,
+    ttl=int(os.getenv("CACHE_TTL", str(7 * 24 * 3600))),
+    memory_entries=int(os.getenv("CACHE_MEMORY_ENTRIES", "256")),
+    disk_entries=int(os.getenv("CACHE_DISK_ENTRIES", "10000"))
+)
+
+# Input compaction: boilerplate and duplicate removal before the text reaches the prompt
+INPUT_COMPACTION = os.getenv("INPUT_COMPACTION", "1") == "1"
+compaction_stats = {'inputs': 0, 'html_inputs': 0, 'tokens_before': 0, 'tokens_after': 0}
+compaction_stats_lock = threading.Lock()
+
+# Local structuring: well-structured plaintext/Markdown skips Gemini entirely
+LOCAL_STRUCTURER = os.getenv("LOCAL_STRUCTURER", "1") == "1"
+LOCAL_STRUCTURE_CONFIDENCE = float(os.getenv("LOCAL_STRUCTURE_CONFIDENCE", "0.85"))
+
+# Background job settings
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.db'))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+job_manager = None
+job_manager_lock = threading.Lock()
+
+# Batch settings
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_RENDER_WORKERS = int(os.getenv("BATCH_RENDER_WORKERS", "2"))
+BATCH_REQUESTS_PER_MINUTE = int(os.getenv("BATCH_REQUESTS_PER_MINUTE", "0")) or None
+render_pool = None
+render_pool_lock = threading.Lock()
+batch_rate_limiter = RateLimiter(BATCH_REQUESTS_PER_MINUTE)
+
+# URL pipeline settings: fetch -> parse -> structure -> render, with bounded queues between stages
+URL_MAX_ITEMS = int(os.getenv("URL_MAX_ITEMS", "100"))
+URL_FETCH_WORKERS = int(os.getenv("URL_FETCH_WORKERS", "8"))
+URL_RENDER_WORKERS = int(os.getenv("URL_RENDER_WORKERS", "2"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+URL_CACHE_PATH = os.getenv("URL_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http.db'))
+url_fetcher = Fetcher(max_in_flight=URL_FETCH_WORKERS, cache=HttpCache(URL_CACHE_PATH))
 
-        # Generate the response
-        response = model.generate_content(prompt)
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/process', methods=['POST'])
+def process_text():
+    try:
+        # Get the input text from the request
+        with STAGE_SECONDS.time(stage='parse_request'):
+            input_text = request.form.get('text')
+        if not input_text:
+            return jsonify({'error': 'No text provided'}), 400
 
-        # Extract the JSON from the response
-        import json
-        response_text = response.text.strip()
+        input_stats = {}
+        structured_content = structure_input(input_text, use_cache=wants_cache(request.form), stats=input_stats)
 
-        # If the response is wrapped in markdown code blocks, remove them
-        if response_text.startswith("```json"):
-            response_text = response_text.replace("```json", "", 1)
-        elif response_text.startswith("```"):
-            response_text = response_text.replace("```", "", 1)
+        if not structured_content:
+            return jsonify({'error': 'Failed to generate structured content'}), 500
 
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
+        docx_filename, pdf_filename = render_documents(structured_content)
 
-        # Clean up any potential leading/trailing characters that might break JSON parsing
-        response_text = response_text.strip()
+        response_data = build_response(docx_filename, pdf_filename, structured_content)
+        response_data['structured_by'] = input_stats.pop('structured_by', 'model')
+        if 'local_confidence' in input_stats:
+            response_data['local_confidence'] = input_stats.pop('local_confidence')
+        if input_stats:
+            response_data['input_tokens'] = input_stats
+        return jsonify(response_data)
 
-        # Try to find JSON object boundaries if there's extra text
-        if not response_text.startswith('{'):
-            start_idx = response_text.find('{')
-            if start_idx >= 0:
-                response_text = response_text[start_idx:]
+    except QuotaExhausted as e:
+        logger.warning(f"Gemini quota exhausted: {str(e)}")
+        return quota_response(e)
+    except Exception as e:
+        logger.exception(f"Error in process_text: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def quota_response(e):
+    """503 telling the client when the Gemini quota should allow another attempt"""
+    response = jsonify({'error': 'Gemini quota exceeded, please retry later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(round(e.retry_after or 60))))
+    return response
+
+@app.route('/process_stream', methods=['POST'])
+def process_stream():
+    """Stream the document's sections as Server-Sent Events while Gemini generates them"""
+    input_text = request.form.get('text')
+    if not input_text:
+        return jsonify({'error': 'No text provided'}), 400
+
+    use_cache = wants_cache(request.form)
+    request_id = g.request_id
+
+    def generate():
+        # The body runs as the response is sent, after the request hooks have finished
+        request_id_var.set(request_id)
+        try:
+            stripped = input_text.strip()
+            if stripped.startswith('{') and stripped.endswith('}'):
+                # JSON input needs no model call
+                structured_content = structure_input(input_text, use_cache)
+            else:
+                structured_content = structure_locally(input_text)
 
-        if not response_text.endswith('}'):
-            end_idx = response_text.rfind('}')
-            if end_idx >= 0:
-                response_text = response_text[:end_idx+1]
+            if structured_content is not None:
+                # Content that needed no model call is just replayed as events
+                events = [('title', structured_content.get('title'))]
+                events += [('section', section) for section in structured_content.get('sections', [])]
+                events.append(('document', structured_content))
+            else:
+                events = stream_structured_content(compact_prompt_input(input_text), use_cache)
+
+            structured_content = None
+            index = 0
+            for kind, value in events:
+                if kind == 'title':
+                    yield format_event('title', {'title': value})
+                elif kind == 'section':
+                    yield format_event('section', {'index': index, 'section': value})
+                    index += 1
+                else:
+                    structured_content = value
+
+            yield format_event('stage', {'stage': 'rendering'})
+            docx_filename, pdf_filename = render_documents(structured_content)
+            yield format_event('done', build_response(docx_filename, pdf_filename, structured_content))
+
+        except QuotaExhausted as e:
+            logger.warning(f"Gemini quota exhausted: {str(e)}")
+            yield format_event('error', {'error': 'Gemini quota exceeded, please retry later',
+                                         'retry_after': e.retry_after})
+        except Exception as e:
+            logger.exception(f"Error in process_stream: {str(e)}")
+            yield format_event('error', {'error': str(e)})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def wants_cache(params):
+    """Callers can bypass the structuring cache with cache=0"""
+    return params.get('cache', '1').lower() not in ('0', 'false', 'no')
+
+def compact_prompt_input(input_text, stats=None):
+    """Strip boilerplate and duplicates from the input and record the tokens saved
+
+    stats, when given, is filled with this input's token counts before and after.
+    """
+    if not INPUT_COMPACTION:
+        return input_text
+    with STAGE_SECONDS.time(stage='compaction'):
+        compacted, input_stats = compact_input(input_text)
+    if not compacted.strip():
+        # Nothing survived extraction, so let the model see the original
+        return input_text
+    with compaction_stats_lock:
+        compaction_stats['inputs'] += 1
+        compaction_stats['html_inputs'] += int(input_stats['html'])
+        compaction_stats['tokens_before'] += input_stats['tokens_before']
+        compaction_stats['tokens_after'] += input_stats['tokens_after']
+    logger.info(f"Compacted input from {input_stats['tokens_before']} to {input_stats['tokens_after']} tokens "
+                f"({input_stats['saved_percent']}% saved)")
+    if stats is not None:
+        stats.update(input_stats)
+    return compacted
+
+def structure_locally(input_text, stats=None):
+    """Structure plaintext/Markdown without Gemini when the local parser is confident enough
+
+    Returns None when the input should go to the model instead.
+    """
+    if not LOCAL_STRUCTURER or looks_like_html(input_text):
+        return None
+    with STAGE_SECONDS.time(stage='local_structure'):
+        structured_content, confidence = structure_text(input_text)
+    if stats is not None:
+        stats['local_confidence'] = confidence
+    if confidence < LOCAL_STRUCTURE_CONFIDENCE:
+        logger.info(f"Local structuring confidence {confidence} is below {LOCAL_STRUCTURE_CONFIDENCE}")
+        return None
+    logger.info(f"Structured content locally with confidence {confidence}")
+    if stats is not None:
+        stats['structured_by'] = 'local'
+    return structured_content
+
+def structure_text_input(input_text, use_cache=True, stats=None, priority=INTERACTIVE):
+    """Structure non-JSON input locally if possible, otherwise with Gemini"""
+    structured_content = structure_locally(input_text, stats)
+    if structured_content is not None:
+        return structured_content
+    # Use Gemini AI to structure the content
+    logger.info("Using Gemini to structure content")
+    return generate_structured_content(compact_prompt_input(input_text, stats), use_cache, priority=priority)
+
+def structure_input(input_text, use_cache=True, stats=None, priority=INTERACTIVE):
+    """Turn the submitted text into structured content, parsing JSON input directly"""
+    with STAGE_SECONDS.time(stage='structure'):
+        return _structure_input(input_text, use_cache, stats, priority)
+
+def _structure_input(input_text, use_cache=True, stats=None, priority=INTERACTIVE):
+    # Check if the input is already a JSON structure
+    try:
+        # Try to parse as JSON first
+        if input_text.strip().startswith('{') and input_text.strip().endswith('}'):
+            logger.info("Input appears to be JSON, trying to parse directly")
+            structured_content = json.loads(input_text)
+            logger.debug("Successfully parsed JSON input: %s",
+                         list(structured_content) if isinstance(structured_content, dict) else 'not a dict')
+            if stats is not None:
+                stats['structured_by'] = 'json'
+        else:
+            structured_content = structure_text_input(input_text, use_cache, stats, priority)
+    except json.JSONDecodeError:
+        # Not valid JSON, use Gemini
+        logger.info("Input is not valid JSON, using Gemini")
+        structured_content = structure_text_input(input_text, use_cache, stats, priority)
+
+    return structured_content
+
+def document_key(structured_content, renderer='python-docx'):
+    """Canonical hash of the structured content and renderer version used to name artifacts"""
+    canonical = json.dumps(structured_content, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    material = f"{RENDERER_VERSION}:{renderer}:{canonical}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+def artifact_ready(path):
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+def render_documents(structured_content, report=None, with_pdf=None, in_memory=None):
+    """Render the DOCX (and PDF when possible) and return their filenames
+
+    Artifacts are named by the content hash, so identical content is rendered
+    once and concurrent identical requests share a single render.
+    """
+    if with_pdf is None:
+        with_pdf = PDF_EAGER
+    if in_memory is None:
+        in_memory = MEMORY_ARTIFACTS
+    renderer = choose_renderer(structured_content)
+    key = document_key(structured_content, renderer)
+    return render_flight.do(f"{key}:{with_pdf}:{in_memory}",
+                            lambda: _render_documents(key, structured_content, report, with_pdf, renderer, in_memory))
+
+def choose_renderer(structured_content):
+    """Pick the DOCX engine: python-docx by default, the streaming writer for big tables"""
+    if not isinstance(structured_content, dict):
+        return 'python-docx'
+    if DOC_RENDERER in ('python-docx', 'streaming'):
+        return DOC_RENDERER
+    if count_table_rows(structured_content) >= STREAMING_RENDER_ROWS:
+        return 'streaming'
+    return 'python-docx'
+
+def render_docx_file(structured_content, output_path, renderer='python-docx'):
+    """Write the DOCX with the chosen engine"""
+    with STAGE_SECONDS.time(stage='render'):
+        return _render_docx_file(structured_content, output_path, renderer)
+
+def _render_docx_file(structured_content, output_path, renderer):
+    if renderer == 'streaming':
+        try:
+            return write_document(structured_content, output_path)
+        except Exception as e:
+            logger.exception(f"Error in streaming renderer, falling back to python-docx: {str(e)}")
+    return create_document(structured_content, output_path)
+
+def artifact_available(filename):
+    """Check the in-memory store and then the output folder for a rendered file"""
+    if memory_store is not None and memory_store.contains(filename):
+        return True
+    return artifact_store.contains(filename)
+
+def spill_artifact(filename, data):
+    """Write an in-memory artifact to the output folder so it outlives the memory store"""
+    if artifact_store.contains(filename):
+        return
+    temp_path = os.path.join(OUTPUT_FOLDER, f"{filename}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    artifact_store.add_file(filename, temp_path)
+
+def _render_documents(key, structured_content, report=None, with_pdf=True, renderer='python-docx', in_memory=False):
+    docx_filename = f"Formatted_Document_{key}.docx"
+    pdf_filename = f"Formatted_Document_{key}.pdf"
+
+    if artifact_available(docx_filename):
+        logger.info(f"Reusing existing document {docx_filename}")
+    elif in_memory:
+        # Render straight into memory; nothing touches the output folder
+        if report:
+            report('rendering')
+        buffer = io.BytesIO()
+        success = render_docx_file(structured_content, buffer, renderer)
+        if not success or not buffer.getbuffer().nbytes:
+            raise Exception('Failed to create document file')
+        memory_store.put(docx_filename, buffer.getvalue())
+    else:
+        # Render to a temporary file so a half-written document is never served
+        if report:
+            report('rendering')
+        temp_docx_path = os.path.join(OUTPUT_FOLDER, f"{key}.{uuid.uuid4().hex[:8]}.tmp.docx")
+        success = render_docx_file(structured_content, temp_docx_path, renderer)
+
+        if not success or not os.path.exists(temp_docx_path):
+            if os.path.exists(temp_docx_path):
+                os.remove(temp_docx_path)
+            raise Exception('Failed to create document file')
+
+        artifact_store.add_file(docx_filename, temp_docx_path, source_hash=key)
+
+    if not with_pdf:
+        # The PDF is converted on first download, or by the idle pre-renderer; without a
+        # converter there is nothing to link to
+        if not artifact_available(pdf_filename):
+            if not pdf_converter_available():
+                return docx_filename, None
+            prerender_queue.append(docx_filename)
+        return docx_filename, pdf_filename
+
+    if artifact_available(pdf_filename):
+        logger.info(f"Reusing existing PDF {pdf_filename}")
+        return docx_filename, pdf_filename
+
+    if report:
+        report('converting')
+    return docx_filename, convert_to_pdf(docx_filename)
+
+def ensure_pdf(pdf_filename):
+    """Convert a PDF on demand from its DOCX; concurrent requests share one conversion"""
+    if artifact_available(pdf_filename):
+        return pdf_filename
+    docx_filename = os.path.splitext(pdf_filename)[0] + '.docx'
+    if not artifact_available(docx_filename):
+        return None
+    return pdf_flight.do(pdf_filename, lambda: convert_to_pdf(docx_filename))
+
+def start_artifact_gc():
+    """Start the background thread that evicts old files from the artifact store"""
+    global artifact_gc_thread
+    if artifact_gc_thread is not None or not (artifact_store.ttl or artifact_store.max_bytes):
+        return
+    with artifact_gc_lock:
+        if artifact_gc_thread is None:
+            artifact_gc_thread = threading.Thread(target=artifact_store.run_gc_forever, args=(ARTIFACT_GC_INTERVAL,),
+                                                  name='artifact-gc', daemon=True)
+            artifact_gc_thread.start()
+
+def start_pdf_prerender():
+    """Start the idle-time PDF pre-render thread once, if enabled"""
+    global prerender_thread
+    if not PDF_PRERENDER or prerender_thread is not None:
+        return
+    with pdf_converter_lock:
+        if prerender_thread is None:
+            prerender_thread = threading.Thread(target=prerender_loop, name='pdf-prerender', daemon=True)
+            prerender_thread.start()
+
+def prerender_loop():
+    """Convert queued PDFs one at a time whenever no requests are being served"""
+    while True:
+        time.sleep(PDF_PRERENDER_INTERVAL)
+        converter = pdf_converter
+        busy = active_requests > 0 or (converter is not None and converter.summary()['queue_depth'] > 0)
+        if busy or not prerender_queue:
+            continue
+        docx_filename = prerender_queue.popleft()
+        try:
+            ensure_pdf(os.path.splitext(docx_filename)[0] + '.pdf')
+        except Exception as e:
+            logger.error(f"Error pre-rendering PDF for {docx_filename}: {str(e)}")
+
+def render_docx(structured_content):
+    """Render only the DOCX; used by batch workers so PDFs can be converted together
+
+    Batch output is bundled from disk by the parent process, so it is never
+    kept in a worker's memory store.
+    """
+    return render_documents(structured_content, with_pdf=False, in_memory=False)
+
+def pdf_converter_available():
+    """Whether PDFs can be made here: LibreOffice, or docx2pdf with Microsoft Word on Windows/macOS"""
+    if pdf_converter is not None or find_soffice():
+        return True
+    if sys.platform not in ('win32', 'darwin'):
+        return False
+    try:
+        load_docx2pdf()
+    except ImportError:
+        return False
+    return True
+
+def pdf_error():
+    """Why a document came back without a PDF"""
+    return 'PDF conversion failed' if pdf_converter_available() else 'No PDF converter is available'
+
+def get_pdf_converter():
+    """Start the warm LibreOffice pool on first use, or return None if LibreOffice is missing"""
+    global pdf_converter
+    with pdf_converter_lock:
+        if pdf_converter is None:
+            soffice_path = find_soffice()
+            if not soffice_path:
+                return None
+            pdf_converter = PdfConverter(
+                soffice_path,
+                workers=PDF_WORKERS,
+                batch_size=PDF_BATCH_SIZE,
+                timeout=PDF_TIMEOUT,
+                max_conversions_per_worker=PDF_MAX_CONVERSIONS_PER_WORKER
+            )
+    return pdf_converter
+
+def pdf_paths(docx_filename):
+    pdf_filename = os.path.splitext(docx_filename)[0] + '.pdf'
+    temp_pdf_path = os.path.join(OUTPUT_FOLDER, f"{os.path.splitext(docx_filename)[0]}.{uuid.uuid4().hex[:8]}.tmp.pdf")
+    return pdf_filename, temp_pdf_path
+
+def finish_pdf(pdf_filename, temp_pdf_path, error=None, in_memory=False):
+    """Move a converted PDF into place; returns the filename or None if conversion failed"""
+    try:
+        if error is not None:
+            logger.error(f"Error converting to PDF: {str(error)}")
+        elif artifact_ready(temp_pdf_path) and in_memory:
+            with open(temp_pdf_path, 'rb') as f:
+                memory_store.put(pdf_filename, f.read())
+            logger.info(f"PDF {pdf_filename} created in memory")
+            return pdf_filename
+        elif artifact_ready(temp_pdf_path):
+            source_hash = os.path.splitext(pdf_filename)[0].rsplit('_', 1)[-1]
+            output_pdf_path = artifact_store.add_file(pdf_filename, temp_pdf_path, source_hash=source_hash)
+            logger.info(f"PDF created successfully at {output_pdf_path}")
+            return pdf_filename
+        else:
+            logger.error("PDF file was not created or is empty")
+        return None
+    finally:
+        if os.path.exists(temp_pdf_path):
+            os.remove(temp_pdf_path)
+
+def convert_to_pdf(docx_filename):
+    """Convert a rendered DOCX to PDF and return the PDF filename, or None on failure"""
+    output_docx_path = artifact_store.path_for(docx_filename)
+    pdf_filename, temp_pdf_path = pdf_paths(docx_filename)
+    error = None
+
+    # Converters need a file, so an in-memory DOCX gets a short-lived temporary copy
+    docx_data = memory_store.get(docx_filename) if memory_store is not None else None
+    in_memory = docx_data is not None
+    if in_memory:
+        output_docx_path = f"{os.path.splitext(temp_pdf_path)[0]}.docx"
+        with open(output_docx_path, 'wb') as f:
+            f.write(docx_data)
 
-        # Parse the JSON
+    try:
+        converter = get_pdf_converter()
+        if converter is not None:
+            with STAGE_SECONDS.time(stage='pdf'):
+                converter.convert(output_docx_path, temp_pdf_path)
+        else:
+            # Without LibreOffice fall back to docx2pdf (Microsoft Word on Windows/macOS)
+            convert = load_docx2pdf()
+            with STAGE_SECONDS.time(stage='pdf'):
+                convert(output_docx_path, temp_pdf_path)
+    except Exception as pdf_error:
+        logger.exception(f"PDF conversion of {docx_filename} failed")
+        error = pdf_error
+        # Continue even if PDF conversion fails
+    finally:
+        if in_memory and os.path.exists(output_docx_path):
+            os.remove(output_docx_path)
+
+    return finish_pdf(pdf_filename, temp_pdf_path, error, in_memory)
+
+def convert_documents(docx_filenames):
+    """Convert many DOCX files at once, sharing LibreOffice round-trips; returns {docx: pdf or None}"""
+    converter = get_pdf_converter()
+    if converter is None:
+        return {docx_filename: convert_to_pdf(docx_filename) for docx_filename in docx_filenames}
+
+    pending = []
+    results = {}
+    for docx_filename in docx_filenames:
+        pdf_filename, temp_pdf_path = pdf_paths(docx_filename)
+        if artifact_store.contains(pdf_filename):
+            results[docx_filename] = pdf_filename
+        else:
+            pending.append((docx_filename, pdf_filename, temp_pdf_path))
+
+    with STAGE_SECONDS.time(stage='pdf_batch'):
+        errors = converter.convert_many([(artifact_store.path_for(docx_filename), temp_pdf_path)
+                                         for docx_filename, _, temp_pdf_path in pending])
+    for (docx_filename, pdf_filename, temp_pdf_path), error in zip(pending, errors):
+        results[docx_filename] = finish_pdf(pdf_filename, temp_pdf_path, error)
+    return results
+
+def build_response(docx_filename, pdf_filename, structured_content):
+    """Build the JSON response with download links for the rendered files"""
+    response_data = {
+        'success': True,
+        'message': 'Document generated successfully',
+        'docx_url': url_for('download_file', filename=docx_filename),
+        'structured_content': structured_content
+    }
+
+    if pdf_filename:
+        response_data['pdf_url'] = url_for('download_file', filename=pdf_filename)
+    else:
+        response_data['pdf_error'] = pdf_error()
+
+    return response_data
+
+def run_job(payload, report):
+    """Run the /process stages for a background job"""
+    request_id_var.set(payload.get('request_id', '-'))
+    report('structuring')
+    structured_content = structure_input(payload['text'], payload.get('use_cache', True))
+
+    if not structured_content:
+        raise Exception('Failed to generate structured content')
+
+    docx_filename, pdf_filename = render_documents(structured_content, report)
+
+    return {
+        'docx_filename': docx_filename,
+        'pdf_filename': pdf_filename,
+        'structured_content': structured_content
+    }
+
+def get_job_manager():
+    """Create the job worker pool on first use and resume jobs left over from a restart"""
+    global job_manager
+    with job_manager_lock:
+        if job_manager is None:
+            job_manager = JobManager(JobStore(JOB_DB_PATH), run_job, max_workers=JOB_WORKERS)
+            job_manager.resume_pending()
+    return job_manager
+
+@app.before_request
+def start_request():
+    """Tag the request with an id (the caller's X-Request-ID if given) for logs and the response"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    g.request_token = request_id_var.set(g.request_id)
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '-')
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unknown',
+                                method=request.method, status=response.status_code)
+    if 'first_request' not in startup_stats:
+        startup_stats['first_request'] = round(time.perf_counter() - IMPORT_STARTED, 4)
+    if request.endpoint == 'download_file' and response.status_code in (200, 206):
+        file_type = os.path.splitext(request.view_args.get('filename', ''))[1].lstrip('.') or 'other'
+        DOWNLOADS.inc(type=file_type)
+        DOWNLOAD_BYTES.inc(response.content_length or 0, type=file_type)
+    return response
+
+@app.before_request
+def start_job_workers():
+    global active_requests
+    with active_requests_lock:
+        active_requests += 1
+    start_background_services()
+
+def start_background_services():
+    get_job_manager()
+    start_pdf_prerender()
+    start_artifact_gc()
+
+@app.teardown_request
+def finish_request(exc):
+    global active_requests
+    with active_requests_lock:
+        active_requests -= 1
+    token = g.pop('request_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a document job and return its id immediately"""
+    input_text = request.form.get('text')
+    if not input_text:
+        return jsonify({'error': 'No text provided'}), 400
+
+    job_id = get_job_manager().submit({'text': input_text, 'use_cache': wants_cache(request.form),
+                                       'request_id': g.request_id})
+
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('job_status', job_id=job_id),
+        'result_url': url_for('job_result', job_id=job_id),
+        'events_url': url_for('job_events', job_id=job_id)
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'stage': job['stage'],
+        'error': job['error'],
+        'created': job['created'],
+        'updated': job['updated']
+    })
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error'] or 'Job failed'}), 500
+
+    if job['status'] != 'done':
+        return jsonify({'job_id': job_id, 'status': job['status'], 'stage': job['stage']}), 202
+
+    result = job['result']
+    return jsonify(build_response(result['docx_filename'], result['pdf_filename'], result['structured_content']))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream job progress as Server-Sent Events"""
+    return Response(stream_with_context(get_job_manager().events(job_id)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def gemini_queue_depth():
+    summary = gemini_scheduler.summary()
+    return {(INTERACTIVE,): summary['queued'] - summary['queued_batch'], (BATCH,): summary['queued_batch']}
+
+def record_startup(phase, started):
+    startup_stats[phase] = round(time.perf_counter() - started, 4)
+
+def load_genai():
+    """Import and configure google.generativeai on first use"""
+    global genai
+    with genai_lock:
+        if genai is None:
+            started = time.perf_counter()
+            import google.generativeai as module
+            if GOOGLE_API_KEY:
+                module.configure(api_key=GOOGLE_API_KEY)
+            genai = module
+            record_startup('genai', started)
+    return genai
+
+def load_docx():
+    """Import python-docx and parse its default DOCX template, once per process"""
+    global docx_template, WD_ALIGN_PARAGRAPH
+    with docx_lock:
+        if docx_template is None:
+            started = time.perf_counter()
+            from docx import Document
+            from docx.enum.text import WD_ALIGN_PARAGRAPH as alignment
+            WD_ALIGN_PARAGRAPH = alignment
+            docx_template = Document()
+            record_startup('docx', started)
+    return docx_template
+
+def new_document():
+    """A blank python-docx Document; copying the parsed template is faster than reading it again"""
+    return copy.deepcopy(load_docx())
+
+def load_docx2pdf():
+    """docx2pdf's convert(), the PDF fallback when LibreOffice is missing"""
+    global docx2pdf_convert
+    with docx_lock:
+        if docx2pdf_convert is None:
+            from docx2pdf import convert
+            docx2pdf_convert = convert
+    return docx2pdf_convert
+
+def warm_up():
+    """Do a worker's one-time setup before it takes traffic instead of on its first requests"""
+    started = time.perf_counter()
+    load_docx()
+    load_genai()
+    if PDF_EAGER or PDF_PRERENDER:
+        # PDFs will be converted for sure, so find the converter now
+        phase = time.perf_counter()
+        if get_pdf_converter() is None:
+            try:
+                load_docx2pdf()
+            except ImportError:
+                logger.warning("Neither LibreOffice nor docx2pdf is available; PDFs will not be produced")
+        record_startup('pdf_converter', phase)
+    phase = time.perf_counter()
+    start_background_services()
+    record_startup('background', phase)
+    record_startup('warm_up', started)
+
+def configure_app_logging():
+    """Send logs to stdout in LOG_FORMAT; also run in each render worker process"""
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+
+def configure_app():
+    """Set up logging and CORS once, when the app is created rather than when it is imported"""
+    global app_configured
+    with app_configured_lock:
+        if app_configured:
+            return
+        started = time.perf_counter()
+        configure_app_logging()
+        from flask_cors import CORS
+        CORS(app, origins=CORS_ORIGINS)  # Enable CORS for all routes
+        if not GOOGLE_API_KEY:
+            logger.warning("GOOGLE_API_KEY environment variable not set")
+        app_configured = True
+        record_startup('configure', started)
+
+def cors_headers(origin):
+    """The CORS headers flask_cors adds to a response from origin, for routes served outside Flask"""
+    if '*' in CORS_ORIGINS and not origin:
+        return [('Access-Control-Allow-Origin', '*')]
+    if '*' in CORS_ORIGINS or (origin or '').lower() in {allowed.lower() for allowed in CORS_ORIGINS}:
+        return [('Access-Control-Allow-Origin', origin), ('Vary', 'Origin')]
+    return []
+
+def create_app(warm=None):
+    """Return the Flask app ready to serve, for servers that take a factory: gunicorn 'app:create_app()'
+
+    warm ('background', '1' or '0'; default WARM_UP) says when the heavy
+    imports, the DOCX template and the background workers are set up, so
+    that the first requests do not have to.
+    """
+    configure_app()
+    mode = WARM_UP if warm is None else warm
+    if mode == 'background':
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    elif mode == '1':
+        warm_up()
+    startup_stats['ready'] = round(time.perf_counter() - IMPORT_STARTED, 4)
+    logger.info(f"Ready to serve after {startup_stats['ready']:.2f}s", extra={'fields': dict(startup_stats)})
+    return app
+
+def get_model(model_name=GEMINI_MODEL):
+    """The long-lived Gemini client for model_name, shared by every call"""
+    with gemini_model_lock:
+        if model_name not in gemini_models:
+            gemini_models[model_name] = load_genai().GenerativeModel(
+                model_name=model_name,  #  structured output
+                generation_config=GENERATION_CONFIG
+            )
+        return gemini_models[model_name]
+
+def call_gemini(kind, prompt, priority=INTERACTIVE, stream=False, model_name=GEMINI_MODEL, start_by=None):
+    """Make a Gemini call once the scheduler admits it
+
+    Raises QuotaExhausted if the call cannot start before its priority's
+    deadline (or start_by, a time.monotonic() value) or keeps hitting the
+    quota. Model latency is recorded from the moment the call is admitted, so
+    it excludes time spent queued. Returns (response, started); a streamed
+    response is recorded by the caller once it has been read. A streamed
+    response is a ScheduledStream, which holds its concurrency slot until it
+    is read to the end or closed.
+    """
+    tokens = estimate_tokens(prompt)
+    deadline = GEMINI_DEADLINES[priority]
+    attempt = {}
+
+    def request():
+        attempt['started'] = time.perf_counter()
         try:
-            structured_content = json.loads(response_text)
-            return structured_content
-        except json.JSONDecodeError as json_err:
-            print(f"JSON parsing error: {str(json_err)}")
-            print(f"Response text: {response_text}")
+            return get_model(model_name).generate_content(prompt, stream=stream)
+        except Exception:
+            record_gemini_call(kind, attempt['started'], prompt, error=True)
+            raise
+
+    if start_by is None and deadline:
+        start_by = time.monotonic() + deadline
+    schedule = gemini_scheduler.stream if stream else gemini_scheduler.call
+    response = schedule(request, tokens, priority, start_by)
+    if not stream:
+        usage = getattr(response, 'usage_metadata', None)
+        record_gemini_call(kind, attempt['started'], prompt, response.text, usage)
+        gemini_scheduler.settle(tokens, getattr(usage, 'prompt_token_count', None))
+    return response, attempt['started']
+
+def generate_response_text(prompt, priority=INTERACTIVE):
+    """The model's response to prompt, hedged with a second request when GEMINI_HEDGE is on"""
+    if not GEMINI_HEDGE:
+        response, _ = call_gemini('generate', prompt, priority)
+        return response.text
+
+    def attempt(which, cancelled):
+        # Streaming lets the losing request be abandoned part way through; both legs hold a
+        # scheduler slot until they finish, and the hedge never waits in the queue
+        kind = 'generate' if which == PRIMARY else 'hedge'
+        model_name = GEMINI_MODEL if which == PRIMARY else GEMINI_HEDGE_MODEL
+        response, started = call_gemini(kind, prompt, priority, stream=True, model_name=model_name,
+                                        start_by=None if which == PRIMARY else time.monotonic())
+        parts = []
+        with response:
+            for chunk in response:
+                if cancelled.is_set():
+                    record_gemini_call(kind, started, prompt, ''.join(parts), cancelled=True)
+                    return None
+                parts.append(chunk.text)
+        usage = getattr(response, 'usage_metadata', None)
+        record_gemini_call(kind, started, prompt, ''.join(parts), usage)
+        return ''.join(parts)
+
+    def valid_json(text):
+        return text is not None and not repair_json(extract_json_text(text)).repaired
+
+    text = hedger.run(bind_request_id(attempt), valid_json, hedge_executor,
+                      admit=lambda: gemini_scheduler.can_admit(estimate_tokens(prompt)))
+    if text is None:
+        raise Exception('Gemini returned no response')
+    return text
+
+def generate_structured_content(input_text, use_cache=True, fallback_limit=5000, priority=INTERACTIVE):
+    """Use Gemini AI to structure the input text into sections for the document"""
+    if not GOOGLE_API_KEY:
+        raise Exception("Google API Key not configured")
 
+    # Inputs whose structured output would overflow max_output_tokens are split up
+    chunks = chunk_input(input_text)
+    if chunks is not None:
+        return generate_chunked_content(chunks, use_cache, priority)
+
+    # Identical requests produce identical output, so serve them from the cache
+    cache_key = make_key(input_text, PROMPT_VERSION, GEMINI_MODEL, GENERATION_CONFIG)
+    if use_cache:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for structured content {cache_key[:12]}")
+            return cached
+
+    structured_content, complete = run_model_steps(structure_steps(input_text, fallback_limit),
+                                                   lambda kind, prompt: request_model_text(kind, prompt, priority))
+    # Only complete responses are cached, never salvaged partials or fallbacks
+    if complete and use_cache:
+        result_cache.set(cache_key, structured_content)
+    return structured_content
+
+def request_model_text(kind, prompt, priority=INTERACTIVE):
+    """The response text for one of structure_steps' model calls"""
+    if kind == 'generate':
+        return generate_response_text(prompt, priority)
+    response, _ = call_gemini(kind, prompt, priority)
+    return response.text
+
+def structure_steps(input_text, fallback_limit=5000):
+    """Structure input_text with Gemini, as a generator of the model calls it needs
+
+    Yields (kind, prompt) for each call and is sent the response text, or has
+    the call's exception thrown in, so the sync and async paths make the same
+    decisions. Returns (structured_content, complete); run it with
+    run_model_steps.
+    """
+    try:
+        response_text = yield 'generate', PROMPT_TEMPLATE.format(input_text=input_text)
+
+        # Parse the JSON, repairing truncated or malformed output
+        structured_content, complete = parse_model_output(response_text)
+        if structured_content is None:
+            logger.debug("Response text: %s", response_text)
+            count_repair('fallbacks')
             # Try a fallback approach - create a simple document structure
-            return {
-                "title": "Generated Document",
-                "sections": [
+            return fallback_structure(input_text), False
+
+        if not complete:
+            structured_content, complete = yield from continuation_steps(input_text, structured_content)
+        return structured_content, complete
+
+    except QuotaExhausted:
+        # A quota failure is the caller's to report; a fallback document would hide it
+        raise
+    except Exception as e:
+        logger.exception(f"Error generating structured content: {str(e)}")
+
+        # Return a simple fallback structure
+        return fallback_structure(input_text[:fallback_limit]), False  # Limit text length in case it's very long
+
+def advance_steps(steps, reply=None, error=None):
+    """Resume a generator of model calls with a reply or error
+
+    Returns ((kind, prompt), None) for its next call, or (None, result) once it is done.
+    """
+    try:
+        return (steps.throw(error) if error is not None else steps.send(reply)), None
+    except StopIteration as done:
+        return None, done.value
+
+def run_model_steps(steps, call):
+    """Drive a generator of model calls to its result, making each call with call(kind, prompt)"""
+    request, result = advance_steps(steps)
+    while request is not None:
+        try:
+            reply, error = call(*request), None
+        except Exception as e:
+            reply, error = None, e
+        request, result = advance_steps(steps, reply, error)
+    return result
+
+def record_gemini_call(kind, started, prompt, output_text=None, usage=None, error=False, cancelled=False):
+    """Record a Gemini call's latency and token counts, estimating tokens when usage is unavailable"""
+    elapsed = time.perf_counter() - started
+    GEMINI_SECONDS.observe(elapsed, kind=kind, outcome='error' if error else 'cancelled' if cancelled else 'ok')
+    prompt_tokens = getattr(usage, 'prompt_token_count', None) or estimate_tokens(prompt)
+    GEMINI_TOKENS.inc(prompt_tokens, kind=kind, direction='prompt')
+    output_tokens = 0
+    if output_text is not None:
+        output_tokens = getattr(usage, 'candidates_token_count', None) or estimate_tokens(output_text)
+        GEMINI_TOKENS.inc(output_tokens, kind=kind, direction='output')
+    logger.info(f"Gemini {kind} call took {elapsed:.2f}s", extra={'fields': {
+        'gemini_kind': kind, 'seconds': round(elapsed, 3), 'prompt_tokens': prompt_tokens,
+        'output_tokens': output_tokens, 'error': error, 'cancelled': cancelled
+    }})
+
+def count_repair(key, amount=1):
+    with repair_stats_lock:
+        repair_stats[key] += amount
+
+def extract_json_text(response_text):
+    """Strip markdown fences and any text around the JSON object in a model response"""
+    response_text = response_text.strip()
+
+    # If the response is wrapped in markdown code blocks, remove them
+    if response_text.startswith("```json"):
+        response_text = response_text.replace("```json", "", 1)
+    elif response_text.startswith("```"):
+        response_text = response_text.replace("```", "", 1)
+
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+
+    # Try to find JSON object boundaries if there's extra text
+    response_text = response_text.strip()
+    start_idx = response_text.find('{')
+    return response_text[start_idx:] if start_idx >= 0 else response_text
+
+def parse_model_output(response_text):
+    """Parse a structured-content response, salvaging what it can from broken JSON
+
+    Returns (structured_content, complete): structured_content is None when
+    nothing usable was found, and complete is False when the response was cut
+    off and its missing sections still need to be generated.
+    """
+    result = repair_json(extract_json_text(response_text))
+    count_repair('responses')
+    if not result.repaired and isinstance(result.value, dict) and isinstance(result.value.get('sections'), list):
+        count_repair('clean')
+        return result.value, True
+
+    structured_content = salvage_structure(result.value)
+    if structured_content is None:
+        logger.warning(f"Could not salvage the response: {', '.join(result.repairs) or 'no sections'}")
+        return None, False
+
+    count_repair('repaired' if result.complete else 'truncated')
+    count_repair('salvaged_sections', len(structured_content['sections']))
+    repairs = ', '.join(sorted(set(result.repairs))) or 'none'
+    logger.warning(f"Salvaged {len(structured_content['sections'])} sections from "
+                   f"{'malformed' if result.complete else 'truncated'} model output (repairs: {repairs})")
+    structured_content['title'] = structured_content['title'] or FALLBACK_TITLE
+    return structured_content, result.complete
+
+def continue_structure(input_text, structured_content, priority=INTERACTIVE):
+    """Ask the model for the sections missing from a truncated response and merge them in
+
+    Returns (structured_content, complete).
+    """
+    return run_model_steps(continuation_steps(input_text, structured_content),
+                           lambda kind, prompt: request_model_text(kind, prompt, priority))
+
+def continuation_steps(input_text, structured_content):
+    """The model calls of continue_structure, as a generator like structure_steps"""
+    for _ in range(JSON_MAX_CONTINUATIONS):
+        count_repair('continuations')
+        logger.info(f"Requesting a continuation after {len(structured_content['sections'])} sections")
+        prompt = CONTINUATION_TEMPLATE.format(
+            input_text=input_text,
+            partial=json.dumps(structured_content['sections'], ensure_ascii=False)
+        )
+        try:
+            response_text = yield 'continuation', prompt
+            result = repair_json(extract_json_text(response_text))
+        except Exception as e:
+            logger.error(f"Continuation request failed: {str(e)}")
+            return structured_content, False
+
+        more = salvage_structure(result.value)
+        if more is None:
+            return structured_content, False
+        count_repair('salvaged_sections', len(more['sections']))
+        structured_content = append_sections(structured_content, more['sections'])
+        if result.complete:
+            return structured_content, True
+    return structured_content, False
+
+def append_sections(structured_content, sections):
+    """Append continued sections, joining one that resumes the last unfinished section"""
+    existing = list(structured_content['sections'])
+    if sections and existing and existing[-1]['heading'] == sections[0]['heading'] \
+            and existing[-1].get('level') == sections[0].get('level'):
+        existing[-1] = dict(existing[-1], content=existing[-1]['content'] + sections[0]['content'])
+        sections = sections[1:]
+    return dict(structured_content, sections=existing + list(sections))
+
+def chunk_input(input_text):
+    """Split an input too long for one request into token-budgeted chunks, or return None if it fits"""
+    if estimate_tokens(input_text) <= CHUNK_INPUT_TOKENS:
+        return None
+    chunks = split_into_chunks(input_text, CHUNK_INPUT_TOKENS)
+    logger.info(f"Structuring {len(chunks)} chunks of up to {CHUNK_INPUT_TOKENS} tokens")
+    return chunks
+
+def generate_chunked_content(chunks, use_cache=True, priority=INTERACTIVE):
+    """Structure the chunks of a long input in parallel and merge the results"""
+    # Each chunk is already within budget, so its fallback keeps the whole chunk
+    with ThreadPoolExecutor(max_workers=CHUNK_CONCURRENCY, thread_name_prefix='chunk') as executor:
+        parts = list(executor.map(
+            bind_request_id(lambda chunk: generate_structured_content(chunk, use_cache, None, priority)), chunks
+        ))
+
+    return merge_structures(parts)
+
+def fallback_structure(text):
+    """Simple single-section document used when Gemini output cannot be used"""
+    return {
+        "title": "Generated Document",
+        "sections": [
+            {
+                "heading": "Content",
+                "level": 1,
+                "content": [
                     {
-                        "heading": "Content",
-                        "level": 1,
-                        "content": [
-                            {
-                                "type": "paragraph",
-                                "text": input_text
-                            }
-                        ]
+                        "type": "paragraph",
+                        "text": text
                     }
                 ]
             }
+        ]
+    }
 
-    except Exception as e:
-        import traceback
-        print(f"Error generating structured content: {str(e)}")
-        print(traceback.format_exc())
+def stream_structured_content(input_text, use_cache=True):
+    """Stream Gemini's structuring of the input text
 
-        # Return a simple fallback structure
-        return {
-            "title": "Generated Document",
-            "sections": [
-                {
-                    "heading": "Content",
-                    "level": 1,
-                    "content": [
-                        {
-                            "type": "paragraph",
-                            "text": input_text[:5000]  # Limit text length in case it's very long
-                        }
-                    ]
-                }
-            ]
-        }
+    Yields ('title', title) and ('section', section) events as soon as each
+    piece of the JSON response is complete, then ('document', structured_content)
+    assembled from those same sections.
+    """
+    if not GOOGLE_API_KEY:
+        raise Exception("Google API Key not configured")
+
+    chunks = chunk_input(input_text)
+    if chunks is not None:
+        # Long inputs are structured chunk by chunk, then replayed as events
+        structured_content = generate_chunked_content(chunks, use_cache)
+        yield 'title', structured_content['title']
+        for section in structured_content['sections']:
+            yield 'section', section
+        yield 'document', structured_content
+        return
+
+    cache_key = make_key(input_text, PROMPT_VERSION, GEMINI_MODEL, GENERATION_CONFIG)
+    if use_cache:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for structured content {cache_key[:12]}")
+            yield 'title', cached.get('title')
+            for section in cached.get('sections', []):
+                yield 'section', section
+            yield 'document', cached
+            return
+
+    parser = SectionStreamParser()
+    title_sent = False
+    started = None
+    try:
+        prompt = PROMPT_TEMPLATE.format(input_text=input_text)
+        response, started = call_gemini('stream', prompt, stream=True)
+
+        streamed = []
+        with response:
+            for chunk in response:
+                streamed.append(chunk.text)
+                sections = parser.feed(chunk.text)
+                if parser.title is not None and not title_sent:
+                    title_sent = True
+                    yield 'title', parser.title
+                for section in sections:
+                    yield 'section', section
+        usage = getattr(response, 'usage_metadata', None)
+        record_gemini_call('stream', started, prompt, ''.join(streamed), usage)
+
+    except QuotaExhausted:
+        raise
+    except Exception as e:
+        if started is not None:
+            record_gemini_call('stream', started, prompt, error=True)
+        logger.exception(f"Error streaming structured content: {str(e)}")
+
+    count_repair('responses')
+    if parser.sections:
+        structured_content = parser.document()
+        complete = parser.complete
+        if not complete:
+            # Ask only for the sections the cut-off response is missing
+            count_repair('truncated')
+            sent = len(structured_content['sections'])
+            structured_content, complete = continue_structure(input_text, structured_content)
+            for section in structured_content['sections'][sent:]:
+                yield 'section', section
+        # A response cut off part way through is still usable but must not be cached
+        if complete and use_cache:
+            result_cache.set(cache_key, structured_content)
+    else:
+        structured_content = fallback_structure(input_text[:5000])
+        if not title_sent:
+            yield 'title', structured_content['title']
+        for section in structured_content['sections']:
+            yield 'section', section
+
+    yield 'document', structured_content
 
 def create_document(structured_content, output_path):
     """Create a Word document from the structured content"""
     try:
-        # Print the structured content for debugging
-        print(f"Structured content: {structured_content}")
+        # The full content is only worth its I/O when debugging
+        logger.debug("Structured content: %s", structured_content)
 
         # Create a new Document
-        doc = Document()
+        doc = new_document()
 
         # Check if we have valid structured content
         if not isinstance(structured_content, dict):
             # If Gemini returned raw JSON text instead of parsed JSON
             if isinstance(structured_content, str):
-                import json
                 try:
                     structured_content = json.loads(structured_content)
-                    print(f"Parsed JSON: {structured_content}")
+                    logger.debug("Parsed JSON: %s", structured_content)
                 except Exception as json_err:
-                    print(f"JSON parsing error: {str(json_err)}")
+                    logger.error(f"JSON parsing error: {str(json_err)}")
                     # If we can't parse the JSON, create a simple document with the raw content
                     doc.add_heading("Generated Document", level=0)
                     doc.add_paragraph(str(structured_content))
@@ -353,6 +1484,12 @@ def create_document(structured_content, output_path):
                             if item:  # Only add non-empty items
                                 doc.add_paragraph(item, style='List Bullet')
 
+                elif content_type == 'numbered_list':
+                    # Add numbered list
+                    for item in content_item.get('items', []):
+                        if item:
+                            doc.add_paragraph(item, style='List Number')
+
                 # Special handling for text that contains bullet points indicated by numbers or dashes
                 elif content_type == 'paragraph' and content_item.get('text', ''):
                     text = content_item.get('text', '')
@@ -409,7 +1546,7 @@ def create_document(structured_content, output_path):
                     # Check if we need to reprocess this as a structured document
                     if '\r\n\r\n' in text and ('Highlights:' in text or 'Scope:' in text):
                         # Clear the document and start over with better formatting
-                        doc = Document()
+                        doc = new_document()
 
                         # Add the title - extract from text if possible
                         title_text = "OmniHuman-1 and Alternatives"
@@ -515,36 +1652,38 @@ def create_document(structured_content, output_path):
 
         # Save the document with proper error handling
         try:
+            # In-memory rendering hands us a file object instead of a path
+            if not isinstance(output_path, str):
+                doc.save(output_path)
+                return True
+
             # Make sure the output directory exists
             os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
 
             # Save the document
-            doc.save(output_path)
+            with STAGE_SECONDS.time(stage='save'):
+                doc.save(output_path)
 
             # Explicitly release the document object
             del doc
 
             # Verify the file was created and is not empty
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                print(f"Document successfully saved to {output_path} with size {os.path.getsize(output_path)} bytes")
+                logger.info(f"Document successfully saved to {output_path} with size {os.path.getsize(output_path)} bytes")
                 return True
             else:
-                print(f"Document file was not created or is empty at {output_path}")
+                logger.error(f"Document file was not created or is empty at {output_path}")
                 return False
         except Exception as save_error:
-            print(f"Error saving document: {str(save_error)}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception(f"Error saving document: {str(save_error)}")
             return False
 
     except Exception as e:
-        import traceback
-        print(f"Error creating document: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error creating document: {str(e)}")
 
         # Create a simple error document
         try:
-            error_doc = Document()
+            error_doc = new_document()
             error_doc.add_heading("Error in Document Generation", level=0)
             error_doc.add_paragraph(f"An error occurred: {str(e)}")
             error_doc.save(output_path)
@@ -553,21 +1692,313 @@ def create_document(structured_content, output_path):
 
         return False
 
+def get_render_pool():
+    """Create the process pool used to render batch documents on first use"""
+    global render_pool
+    with render_pool_lock:
+        if render_pool is None:
+            # spawn keeps the worker processes clear of locks held by this process's threads
+            render_pool = ProcessPoolExecutor(max_workers=BATCH_RENDER_WORKERS,
+                                              mp_context=multiprocessing.get_context('spawn'),
+                                              initializer=configure_app_logging)
+    return render_pool
+
+def process_batch(texts, use_cache=True, max_concurrency=None):
+    """Structure and render many inputs at once
+
+    Returns the per-item results, a throughput/latency report and the filename
+    of a zip bundle holding every rendered document.
+    """
+    items, report = run_batch(
+        texts,
+        bind_request_id(lambda text: structure_input(text, use_cache, priority=BATCH)),
+        get_render_pool(),
+        render_docx,
+        max_concurrency=max_concurrency or BATCH_CONCURRENCY,
+        rate_limiter=batch_rate_limiter
+    )
+
+    # Convert every missing PDF together so the LibreOffice workers can batch them
+    docx_filenames = [item['docx_filename'] for item in items if item['status'] == 'done']
+    if docx_filenames:
+        pdf_filenames = convert_documents(docx_filenames)
+        for item in items:
+            if item['status'] == 'done':
+                item['pdf_filename'] = pdf_filenames.get(item['docx_filename'])
+
+    bundle_filename = f"Batch_{str(uuid.uuid4())[:8]}.zip"
+    temp_bundle_path = os.path.join(OUTPUT_FOLDER, f"{bundle_filename}.tmp")
+    write_bundle(items, artifact_store.path_for, temp_bundle_path)
+    artifact_store.add_file(bundle_filename, temp_bundle_path)
+    logger.info(f"Batch of {report['count']} finished: {report['succeeded']} succeeded in {report['elapsed_seconds']}s")
+
+    return items, report, bundle_filename
+
+@app.route('/process_batch', methods=['POST'])
+def process_batch_route():
+    """Process a JSON list of texts in one request"""
+    try:
+        data = request.get_json(silent=True) or {}
+        texts = data.get('texts')
+        if not isinstance(texts, list) or not texts:
+            return jsonify({'error': 'Provide a non-empty "texts" list'}), 400
+        if len(texts) > BATCH_MAX_ITEMS:
+            return jsonify({'error': f'A batch can hold at most {BATCH_MAX_ITEMS} items'}), 400
+        if not all(isinstance(text, str) and text for text in texts):
+            return jsonify({'error': 'Every item in "texts" must be a non-empty string'}), 400
+
+        items, report, bundle_filename = process_batch(
+            texts,
+            use_cache=wants_cache({'cache': str(data.get('cache', '1'))}),
+            max_concurrency=min(int(data.get('concurrency') or BATCH_CONCURRENCY), BATCH_CONCURRENCY)
+        )
+
+        for item in items:
+            if item.get('docx_filename'):
+                item['docx_url'] = url_for('download_file', filename=item['docx_filename'])
+            if item.get('pdf_filename'):
+                item['pdf_url'] = url_for('download_file', filename=item['pdf_filename'])
+            elif item.get('docx_filename'):
+                item['pdf_error'] = pdf_error()
+
+        return jsonify({
+            'success': report['failed'] == 0,
+            'items': items,
+            'report': report,
+            'bundle_url': url_for('download_file', filename=bundle_filename)
+        })
+
+    except Exception as e:
+        logger.exception(f"Error in process_batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def fetch_page(url):
+    """Pipeline stage: download a page, through the HTTP cache"""
+    result = url_fetcher.fetch(url)
+    if not result.ok:
+        raise result.error
+    return result
+
+def extract_page_text(result):
+    """Pipeline stage: pull the page's main content out of its HTML"""
+    if INPUT_COMPACTION:
+        text = compact_prompt_input(result.html)
+    else:
+        text = result.text if result.text is not None else get_parser()(result.html)
+    if text is result.html or not text.strip():
+        raise Exception('No visible text found on the page')
+    return text
+
+def process_urls(urls, use_cache=True, max_concurrency=None):
+    """Turn web pages into documents with the fetch, parse, structure and render stages pipelined
+
+    Returns the per-item results and a report with each stage's latency.
+    """
+    def structure(text):
+        structured_content = structure_locally(text)
+        if structured_content is None:
+            batch_rate_limiter.wait()
+            structured_content = generate_structured_content(text, use_cache, priority=BATCH)
+        if not structured_content:
+            raise Exception('Failed to generate structured content')
+        return structured_content
+
+    def render(structured_content):
+        docx_filename, pdf_filename = render_documents(structured_content)
+        return docx_filename, pdf_filename, structured_content
+
+    stages = [
+        ('fetch', bind_request_id(fetch_page), min(URL_FETCH_WORKERS, len(urls))),
+        ('parse', bind_request_id(extract_page_text), 1),
+        ('structure', bind_request_id(structure), min(max_concurrency or BATCH_CONCURRENCY, len(urls))),
+        ('render', bind_request_id(render), min(URL_RENDER_WORKERS, len(urls)))
+    ]
+    items, report = run_pipeline(urls, stages, queue_size=PIPELINE_QUEUE_SIZE)
+    for item in items:
+        item['url'] = urls[item['index']]
+    logger.info(f"URL pipeline of {report['count']} finished: {report['succeeded']} succeeded in {report['elapsed_seconds']}s")
+    return items, report
+
+@app.route('/process_url', methods=['POST'])
+def process_url():
+    """Fetch a web page and turn its text into a document"""
+    try:
+        url = request.form.get('url') or (request.get_json(silent=True) or {}).get('url')
+        if not url:
+            return jsonify({'error': 'No URL provided'}), 400
+
+        items, report = process_urls([url], use_cache=wants_cache(request.form))
+        item = items[0]
+        if item['status'] != 'done':
+            status = 400 if item['stage'] in ('fetch', 'parse') else 500
+            return jsonify({'error': item['error'], 'stage': item['stage'], 'stages': item['stages']}), status
+
+        docx_filename, pdf_filename, structured_content = item['result']
+        response_data = build_response(docx_filename, pdf_filename, structured_content)
+        response_data['stages'] = item['stages']
+        return jsonify(response_data)
+
+    except Exception as e:
+        logger.exception(f"Error in process_url: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/process_url_batch', methods=['POST'])
+def process_url_batch():
+    """Turn a JSON list of URLs into documents in one request"""
+    try:
+        data = request.get_json(silent=True) or {}
+        urls = data.get('urls')
+        if not isinstance(urls, list) or not urls:
+            return jsonify({'error': 'Provide a non-empty "urls" list'}), 400
+        if len(urls) > URL_MAX_ITEMS:
+            return jsonify({'error': f'A batch can hold at most {URL_MAX_ITEMS} URLs'}), 400
+        if not all(isinstance(url, str) and url for url in urls):
+            return jsonify({'error': 'Every item in "urls" must be a non-empty string'}), 400
+
+        items, report = process_urls(
+            urls,
+            use_cache=wants_cache({'cache': str(data.get('cache', '1'))}),
+            max_concurrency=min(int(data.get('concurrency') or BATCH_CONCURRENCY), BATCH_CONCURRENCY)
+        )
+
+        for item in items:
+            result = item.pop('result', None)
+            if result:
+                docx_filename, pdf_filename, structured_content = result
+                item['title'] = structured_content.get('title') if isinstance(structured_content, dict) else None
+                item['docx_url'] = url_for('download_file', filename=docx_filename)
+                if pdf_filename:
+                    item['pdf_url'] = url_for('download_file', filename=pdf_filename)
+                else:
+                    item['pdf_error'] = pdf_error()
+
+        return jsonify({'success': report['failed'] == 0, 'items': items, 'report': report})
+
+    except Exception as e:
+        logger.exception(f"Error in process_url_batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/artifacts/stats')
+def artifact_stats():
+    """Report the artifact store's size and how many files it has evicted"""
+    return jsonify(artifact_store.summary())
+
+@app.route('/memory/stats')
+def memory_stats():
+    """Report size and hit counters for the in-memory artifact store"""
+    if memory_store is None:
+        return jsonify({'enabled': False})
+    stats = memory_store.summary()
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@app.route('/pdf/stats')
+def pdf_stats():
+    """Report queue depth, queue wait and conversion time for the PDF worker pool"""
+    converter = pdf_converter
+    if converter is None:
+        return jsonify({'available': find_soffice() is not None, 'started': False})
+    stats = converter.summary()
+    stats.update(available=True, started=True)
+    return jsonify(stats)
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Report hit/miss counters for the structuring cache"""
+    return jsonify(result_cache.summary())
+
+@app.route('/repair/stats')
+def repair_summary():
+    """Report how often model output needed repair or a continuation"""
+    with repair_stats_lock:
+        stats = dict(repair_stats)
+    stats['repair_rate'] = round((stats['repaired'] + stats['truncated']) / stats['responses'], 4) \
+        if stats['responses'] else 0.0
+    return jsonify(stats)
+
+@app.route('/gemini/stats')
+def gemini_summary():
+    """Report the Gemini scheduler's queue, quota headroom and retries, and how hedging is doing"""
+    summary = gemini_scheduler.summary()
+    summary['hedging'] = dict(hedger.summary(), enabled=GEMINI_HEDGE, model=GEMINI_HEDGE_MODEL)
+    return jsonify(summary)
+
+@app.route('/compaction/stats')
+def compaction_summary():
+    """Report how many prompt tokens input compaction has saved"""
+    with compaction_stats_lock:
+        stats = dict(compaction_stats)
+    saved = stats['tokens_before'] - stats['tokens_after']
+    stats['saved_percent'] = round(100.0 * saved / stats['tokens_before'], 1) if stats['tokens_before'] else 0.0
+    return jsonify(stats)
+
+@app.route('/startup/stats')
+def startup_summary():
+    """Report how long this process took to import, warm up and serve its first request"""
+    return jsonify(startup_stats)
+
+@app.route('/metrics')
+def metrics():
+    """Expose request, stage and Gemini metrics in the Prometheus text format"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@lru_cache(maxsize=256)
+def legacy_digest(path, mtime_ns, size):
+    """Digest of an unindexed file, recomputed only when its mtime or size changes"""
+    with open(path, 'rb') as f:
+        return file_digest(f)
+
+
+def find_download(filename):
+    """Return (path, size, digest, cache_control) of a file to download, or raise FileNotFoundError
+
+    Indexed artifacts never change under their name, so they are cacheable for
+    good; older files sitting directly in OUTPUT_FOLDER are revalidated.
+    """
+    described = artifact_store.describe(filename)
+    if described is not None:
+        path, size, digest = described
+        return path, size, digest, DOWNLOAD_CACHE_CONTROL
+    path = os.path.join(OUTPUT_FOLDER, filename)
+    info = os.stat(path)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    return path, info.st_size, legacy_digest(path, info.st_mtime_ns, info.st_size), REVALIDATE
+
+
 @app.route('/download/<filename>')
 def download_file(filename):
-    """Download a generated file"""
-    file_path = os.path.join(OUTPUT_FOLDER, filename)
-
-    # Check if the file exists
-    if not os.path.exists(file_path):
-        return jsonify({'error': f'File {filename} not found'}), 404
+    """Download a generated file, with ETag revalidation and byte ranges"""
+    # PDFs are only converted the first time someone asks for them
+    if filename.endswith('.pdf') and not artifact_available(filename):
+        if artifact_available(os.path.splitext(filename)[0] + '.docx'):
+            if not ensure_pdf(filename):
+                return jsonify({'error': f'Could not convert {filename} to PDF'}), 503
+
+    # Serve in-memory artifacts without touching the disk
+    described = memory_store.describe(filename) if memory_store is not None else None
+    if described is not None:
+        data, digest = described
+        status, headers, byte_range = negotiate(request.headers, filename, len(data), digest, DOWNLOAD_CACHE_CONTROL)
+        body = data[byte_range[0]:byte_range[1]] if byte_range else b''
+        return Response(body, status, headers)
 
     try:
-        # Try to send the file
-        return send_file(file_path, as_attachment=True)
+        file_path, size, digest, cache_control = find_download(filename)
+        offload = offload_header(DOWNLOAD_OFFLOAD, file_path, OUTPUT_FOLDER, DOWNLOAD_ACCEL_PREFIX)
+        status, headers, byte_range = negotiate(request.headers, filename, size, digest, cache_control, offload)
+        if byte_range is None:
+            return Response(b'', status, headers)
+        body = read_range(file_path, byte_range[0], byte_range[1], DOWNLOAD_CHUNK_SIZE)
+        return Response(body, status, headers, direct_passthrough=True)
+    except (FileNotFoundError, IsADirectoryError):
+        artifact_store.forget(filename)
+        return jsonify({'error': f'File {filename} not found'}), 404
     except Exception as e:
-        print(f"Error sending file {filename}: {str(e)}")
+        logger.error(f"Error sending file {filename}: {str(e)}")
         return jsonify({'error': f'Error downloading file: {str(e)}'}), 500
 
+startup_stats['import'] = round(time.perf_counter() - IMPORT_STARTED, 4)
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(f, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of an open binary file, read from the start"""
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Hash-sharded output directory with a SQLite index of every stored file
+
+    Files live under root/ab/cd/<name>, where abcd are the first hex digits of
+    the name's hash, so no single directory grows without bound. The index
+    records size, creation and last access times, the source hash and a digest
+    of the file's content, which lets lookups, downloads and garbage
+    collection avoid walking or re-reading the filesystem.
+    """
+
+    def __init__(self, root, db_path, ttl=0, max_bytes=0, touch_interval=60):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self.stats = {'evicted_files': 0, 'evicted_bytes': 0, 'gc_runs': 0}
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    name TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    source_hash TEXT,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    digest TEXT
+                )
+            """)
+            # Indexes created before content digests were recorded get the column added
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(artifacts)")}
+            if 'digest' not in columns:
+                self._conn.execute("ALTER TABLE artifacts ADD COLUMN digest TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_accessed ON artifacts (accessed)")
+
+    def path_for(self, name):
+        digest = hashlib.sha256(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], name)
+
+    def add_file(self, name, temp_path, source_hash=None):
+        """Move a finished temporary file into its shard and index it"""
+        path = self.path_for(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        with open(path, 'rb') as f:
+            digest = file_digest(f)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (name, path, size, source_hash, created, accessed, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, os.path.relpath(path, self.root), os.path.getsize(path), source_hash, now, now, digest)
+            )
+        return path
+
+    def contains(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM artifacts WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    def lookup(self, name, touch=True):
+        """Return the path of an indexed file (recording the access), or None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM artifacts WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            if touch:
+                # Only rewrite the row now and then so hot files do not turn every read into a write
+                with self._conn:
+                    self._conn.execute("UPDATE artifacts SET accessed = ? WHERE name = ? AND accessed < ?",
+                                       (now, name, now - self.touch_interval))
+        return os.path.join(self.root, row[0])
+
+    def describe(self, name):
+        """Return (path, size, digest) of an indexed file, recording the access, or None
+
+        Files indexed before digests were recorded have theirs computed now.
+        Raises FileNotFoundError if the file has gone missing.
+        """
+        path = self.lookup(name)
+        if path is None:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT size, digest FROM artifacts WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        size, digest = row
+        # Checked here rather than when the body is read, so a missing file is a 404, not a broken response
+        os.stat(path)
+        if digest is None:
+            with open(path, 'rb') as f:
+                digest = file_digest(f)
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE artifacts SET digest = ? WHERE name = ?", (digest, name))
+        return path, size, digest
+
+    def forget(self, name):
+        """Drop an index entry whose file has disappeared"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM artifacts WHERE name = ?", (name,))
+
+    def _delete(self, rows):
+        evicted_bytes = 0
+        for name, path, size in rows:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+            evicted_bytes += size
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM artifacts WHERE name = ?", [(row[0],) for row in rows])
+            self.stats['evicted_files'] += len(rows)
+            self.stats['evicted_bytes'] += evicted_bytes
+
+    def collect_garbage(self):
+        """Evict files unused for longer than the TTL, then the least recently used over the quota"""
+        now = time.time()
+        evicted = 0
+        if self.ttl:
+            with self._lock:
+                rows = self._conn.execute("SELECT name, path, size FROM artifacts WHERE accessed < ?",
+                                          (now - self.ttl,)).fetchall()
+            self._delete(rows)
+            evicted += len(rows)
+
+        if self.max_bytes:
+            with self._lock:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+                rows = []
+                if total > self.max_bytes:
+                    for row in self._conn.execute("SELECT name, path, size FROM artifacts ORDER BY accessed"):
+                        if total <= self.max_bytes:
+                            break
+                        rows.append(row)
+                        total -= row[2]
+            self._delete(rows)
+            evicted += len(rows)
+
+        with self._lock:
+            self.stats['gc_runs'] += 1
+        if evicted:
+            logger.info(f"Artifact store evicted {evicted} file(s)")
+        return evicted
+
+    def run_gc_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                logger.exception(f"Error collecting artifact garbage: {str(e)}")
+
+    def summary(self):
+        with self._lock:
+            files, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+            stats = dict(self.stats)
+        stats.update(files=files, bytes=total, max_bytes=self.max_bytes, ttl=self.ttl)
+        return stats
@@ -0,0 +1,471 @@
+"""Async serving mode: run the app on an event loop with an ASGI server.
+
+    uvicorn asgi:application --port 5000
+
+/process, /download and /metrics are served natively on the event loop:
+Gemini calls use the client's async API, so a request waiting on the model
+holds no thread, and rendering, cache and file I/O run in thread pools.
+Every other route is passed to the Flask app in a worker thread.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from flask import request as flask_request
+
+import app as webapp
+from cache import make_key
+from downloads import negotiate, offload_header
+from chunking import estimate_tokens, merge_structures
+from hedge import PRIMARY
+from jsonrepair import repair_json
+from logconfig import request_id_var
+from metrics import CONTENT_TYPE
+from scheduler import INTERACTIVE, QuotaExhausted
+
+
+logger = logging.getLogger('byteme.asgi')
+
+# Serving through this module means the app is in use, even if the server skips the lifespan startup
+webapp.configure_app()
+
+# Rendering and PDF conversion are CPU-bound; cache lookups and file reads are short blocking I/O;
+# requests handed to Flask hold a thread for as long as they run
+ASYNC_RENDER_WORKERS = int(os.getenv("ASYNC_RENDER_WORKERS", str(os.cpu_count() or 2)))
+ASYNC_IO_WORKERS = int(os.getenv("ASYNC_IO_WORKERS", "16"))
+ASYNC_WSGI_WORKERS = int(os.getenv("ASYNC_WSGI_WORKERS", "32"))
+render_executor = ThreadPoolExecutor(max_workers=ASYNC_RENDER_WORKERS, thread_name_prefix='async-render')
+io_executor = ThreadPoolExecutor(max_workers=ASYNC_IO_WORKERS, thread_name_prefix='async-io')
+wsgi_executor = ThreadPoolExecutor(max_workers=ASYNC_WSGI_WORKERS, thread_name_prefix='async-wsgi')
+
+
+async def run_in(executor, fn, *args):
+    """Run fn(*args) in executor, keeping the request id for its log lines"""
+    context = request_id_var.get()
+
+    def call():
+        request_id_var.set(context)
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+class Request:
+    """The parts of an ASGI HTTP request the native routes need"""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.headers = {}
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            self.headers[name] = f"{self.headers[name]}, {value}" if name in self.headers else value
+
+    def environ(self):
+        """A WSGI environ for the request, for Flask and for form parsing"""
+        server = self.scope.get('server') or ('localhost', 80)
+        client = self.scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': self.method,
+            'SCRIPT_NAME': self.scope.get('root_path', ''),
+            'PATH_INFO': self.path.encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': self.scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{self.scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': self.scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(self.body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in self.headers.items():
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'content-length':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                environ['HTTP_' + name.upper().replace('-', '_')] = value
+        return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def send_response(send, status, body=b'', headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.encode('latin-1'), str(value).encode('latin-1')) for name, value in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, status, data, headers=()):
+    body = json.dumps(data).encode('utf-8')
+    await send_response(send, status, body, [('Content-Type', 'application/json'), ('Content-Length', len(body))]
+                        + list(headers))
+
+
+async def call_gemini_async(kind, prompt, priority=INTERACTIVE, stream=False, model_name=webapp.GEMINI_MODEL,
+                            start_by=None):
+    """Async counterpart of app.call_gemini; waits for the scheduler without holding a thread"""
+    tokens = estimate_tokens(prompt)
+    deadline = webapp.GEMINI_DEADLINES[priority]
+    attempt = {}
+
+    async def request():
+        attempt['started'] = time.perf_counter()
+        try:
+            return await webapp.get_model(model_name).generate_content_async(prompt, stream=stream)
+        except Exception:
+            webapp.record_gemini_call(kind, attempt['started'], prompt, error=True)
+            raise
+
+    if start_by is None and deadline:
+        start_by = time.monotonic() + deadline
+    schedule = webapp.gemini_scheduler.stream_async if stream else webapp.gemini_scheduler.call_async
+    response = await schedule(request, tokens, priority, start_by)
+    if not stream:
+        usage = getattr(response, 'usage_metadata', None)
+        webapp.record_gemini_call(kind, attempt['started'], prompt, response.text, usage)
+        webapp.gemini_scheduler.settle(tokens, getattr(usage, 'prompt_token_count', None))
+    return response, attempt['started']
+
+
+async def generate_response_text_async(prompt, priority=INTERACTIVE):
+    """Async counterpart of app.generate_response_text; a losing hedge is cancelled mid-stream"""
+    if not webapp.GEMINI_HEDGE:
+        response, _ = await call_gemini_async('generate', prompt, priority)
+        return response.text
+
+    async def attempt(which):
+        kind = 'generate' if which == PRIMARY else 'hedge'
+        model_name = webapp.GEMINI_MODEL if which == PRIMARY else webapp.GEMINI_HEDGE_MODEL
+        response, started = await call_gemini_async(kind, prompt, priority, stream=True, model_name=model_name,
+                                                    start_by=None if which == PRIMARY else time.monotonic())
+        parts = []
+        async with response:
+            try:
+                async for chunk in response:
+                    parts.append(chunk.text)
+            except asyncio.CancelledError:
+                webapp.record_gemini_call(kind, started, prompt, ''.join(parts), cancelled=True)
+                raise
+        usage = getattr(response, 'usage_metadata', None)
+        webapp.record_gemini_call(kind, started, prompt, ''.join(parts), usage)
+        return ''.join(parts)
+
+    def valid_json(text):
+        return text is not None and not repair_json(webapp.extract_json_text(text)).repaired
+
+    text = await webapp.hedger.run_async(attempt, valid_json,
+                                         admit=lambda: webapp.gemini_scheduler.can_admit(estimate_tokens(prompt)))
+    if text is None:
+        raise Exception('Gemini returned no response')
+    return text
+
+
+async def request_model_text_async(kind, prompt, priority=INTERACTIVE):
+    """Async counterpart of app.request_model_text"""
+    if kind == 'generate':
+        return await generate_response_text_async(prompt, priority)
+    response, _ = await call_gemini_async(kind, prompt, priority)
+    return response.text
+
+
+async def run_model_steps_async(steps, priority=INTERACTIVE):
+    """Async counterpart of app.run_model_steps; the steps' parsing runs in the render pool"""
+    request, result = await run_in(render_executor, webapp.advance_steps, steps)
+    while request is not None:
+        try:
+            reply, error = await request_model_text_async(*request, priority), None
+        except Exception as e:
+            reply, error = None, e
+        request, result = await run_in(render_executor, webapp.advance_steps, steps, reply, error)
+    return result
+
+
+async def generate_structured_content_async(input_text, use_cache=True, fallback_limit=5000, priority=INTERACTIVE):
+    """Async counterpart of app.generate_structured_content"""
+    if not webapp.GOOGLE_API_KEY:
+        raise Exception("Google API Key not configured")
+
+    chunks = webapp.chunk_input(input_text)
+    if chunks is not None:
+        limit = asyncio.Semaphore(webapp.CHUNK_CONCURRENCY)
+
+        async def structure_chunk(chunk):
+            async with limit:
+                return await generate_structured_content_async(chunk, use_cache, None, priority)
+        return merge_structures(await asyncio.gather(*[structure_chunk(chunk) for chunk in chunks]))
+
+    cache_key = make_key(input_text, webapp.PROMPT_VERSION, webapp.GEMINI_MODEL, webapp.GENERATION_CONFIG)
+    if use_cache:
+        cached = await run_in(io_executor, webapp.result_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for structured content {cache_key[:12]}")
+            return cached
+
+    structured_content, complete = await run_model_steps_async(webapp.structure_steps(input_text, fallback_limit),
+                                                               priority)
+    if complete and use_cache:
+        await run_in(io_executor, webapp.result_cache.set, cache_key, structured_content)
+    return structured_content
+
+
+async def structure_input_async(input_text, use_cache=True, stats=None, priority=INTERACTIVE):
+    """Async counterpart of app.structure_input"""
+    with webapp.STAGE_SECONDS.time(stage='structure'):
+        stripped = input_text.strip()
+        if stripped.startswith('{') and stripped.endswith('}'):
+            try:
+                structured_content = json.loads(input_text)
+                if stats is not None:
+                    stats['structured_by'] = 'json'
+                return structured_content
+            except json.JSONDecodeError:
+                logger.info("Input is not valid JSON, using Gemini")
+
+        structured_content = await run_in(render_executor, webapp.structure_locally, input_text, stats)
+        if structured_content is not None:
+            return structured_content
+        logger.info("Using Gemini to structure content")
+        prompt_input = await run_in(render_executor, webapp.compact_prompt_input, input_text, stats)
+        return await generate_structured_content_async(prompt_input, use_cache, priority=priority)
+
+
+def parse_form(environ):
+    with webapp.app.request_context(environ):
+        return flask_request.form.to_dict()
+
+
+def build_response(environ, docx_filename, pdf_filename, structured_content):
+    # url_for needs a request context to build the download links
+    with webapp.app.request_context(environ):
+        return webapp.build_response(docx_filename, pdf_filename, structured_content)
+
+
+async def process_text(request, send):
+    """POST /process, with the model call awaited on the event loop"""
+    environ = request.environ()
+    with webapp.STAGE_SECONDS.time(stage='parse_request'):
+        form = parse_form(environ)
+    input_text = form.get('text')
+    if not input_text:
+        return await send_json(send, 400, {'error': 'No text provided'})
+
+    try:
+        input_stats = {}
+        structured_content = await structure_input_async(input_text, webapp.wants_cache(form), input_stats)
+        if not structured_content:
+            return await send_json(send, 500, {'error': 'Failed to generate structured content'})
+
+        docx_filename, pdf_filename = await run_in(render_executor, webapp.render_documents, structured_content)
+
+        response_data = build_response(environ, docx_filename, pdf_filename, structured_content)
+        response_data['structured_by'] = input_stats.pop('structured_by', 'model')
+        if 'local_confidence' in input_stats:
+            response_data['local_confidence'] = input_stats.pop('local_confidence')
+        if input_stats:
+            response_data['input_tokens'] = input_stats
+        await send_json(send, 200, response_data)
+
+    except QuotaExhausted as e:
+        logger.warning(f"Gemini quota exhausted: {str(e)}")
+        await send_json(send, 503, {'error': 'Gemini quota exceeded, please retry later'},
+                        [('Retry-After', max(1, int(round(e.retry_after or 60))))])
+    except Exception as e:
+        logger.exception(f"Error in process_text: {str(e)}")
+        await send_json(send, 500, {'error': str(e)})
+
+
+async def download_file(request, send, filename):
+    """GET /download/<filename>, with ETags and byte ranges, streamed in DOWNLOAD_CHUNK_SIZE pieces"""
+    if filename.endswith('.pdf') and not await run_in(io_executor, webapp.artifact_available, filename):
+        if await run_in(io_executor, webapp.artifact_available, os.path.splitext(filename)[0] + '.docx'):
+            if not await run_in(render_executor, webapp.ensure_pdf, filename):
+                return await send_json(send, 503, {'error': f'Could not convert {filename} to PDF'})
+
+    described = webapp.memory_store.describe(filename) if webapp.memory_store is not None else None
+    if described is not None:
+        data, digest = described
+        status, headers, byte_range = negotiate(request.headers, filename, len(data), digest,
+                                                webapp.DOWNLOAD_CACHE_CONTROL)
+        return await send_response(send, status, data[byte_range[0]:byte_range[1]] if byte_range else b'', headers)
+
+    try:
+        file_path, size, digest, cache_control = await run_in(io_executor, webapp.find_download, filename)
+        offload = offload_header(webapp.DOWNLOAD_OFFLOAD, file_path, webapp.OUTPUT_FOLDER, webapp.DOWNLOAD_ACCEL_PREFIX)
+        status, headers, byte_range = negotiate(request.headers, filename, size, digest, cache_control, offload)
+        f = await run_in(io_executor, open, file_path, 'rb') if byte_range is not None else None
+    except (FileNotFoundError, IsADirectoryError):
+        await run_in(io_executor, webapp.artifact_store.forget, filename)
+        return await send_json(send, 404, {'error': f'File {filename} not found'})
+    except Exception as e:
+        logger.error(f"Error sending file {filename}: {str(e)}")
+        return await send_json(send, 500, {'error': f'Error downloading file: {str(e)}'})
+
+    if f is None:
+        return await send_response(send, status, b'', headers)
+    try:
+        start, stop = byte_range
+        await run_in(io_executor, f.seek, start)
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(name.encode('latin-1'), str(value).encode('latin-1'))
+                                for name, value in headers]})
+        remaining = stop - start
+        while remaining > 0:
+            chunk = await run_in(io_executor, f.read, min(webapp.DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        f.close()
+
+
+async def metrics(request, send):
+    body = webapp.REGISTRY.render().encode('utf-8')
+    await send_response(send, 200, body, [('Content-Type', CONTENT_TYPE), ('Content-Length', len(body))])
+
+
+def route(method, path):
+    """The native handler for a request and its extra arguments, or None to hand it to Flask"""
+    if method == 'POST' and path == '/process':
+        return process_text, ()
+    if method == 'GET' and path == '/metrics':
+        return metrics, ()
+    if method == 'GET' and path.startswith('/download/'):
+        filename = path[len('/download/'):]
+        if filename and '/' not in filename:
+            return download_file, (filename,)
+    return None
+
+
+async def call_flask(request, send):
+    """Run the request through the Flask app on a worker thread, streaming its response back
+
+    The whole response is produced on one thread, since Flask's streamed
+    responses keep their request context in thread-local state.
+    """
+    loop = asyncio.get_running_loop()
+    environ = request.environ()
+
+    def forward(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            return lambda data: None
+
+        result = webapp.app(environ, start_response)
+        try:
+            for chunk in result:
+                if 'sent' not in started:
+                    forward({'type': 'http.response.start', 'status': started['status'],
+                             'headers': started['headers']})
+                    started['sent'] = True
+                if chunk:
+                    forward({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if 'sent' not in started:
+                forward({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            forward({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    await loop.run_in_executor(wsgi_executor, run)
+
+
+async def handle_native(handler, args, request, send):
+    """Run a native route with the same request id, CORS headers, metrics and idle tracking as Flask"""
+    request_id = request.headers.get('x-request-id') or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    started = time.perf_counter()
+    response = {}
+
+    async def send_tagged(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            # Flask adds these through flask_cors; native routes have to add them themselves
+            extra = [(name.encode('latin-1'), value.encode('latin-1'))
+                     for name, value in webapp.cors_headers(request.headers.get('origin'))]
+            message = dict(message, headers=list(message['headers']) + extra + [(b'x-request-id', request_id.encode())])
+            webapp.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=handler.__name__,
+                                           method=request.method, status=message['status'])
+        elif message['type'] == 'http.response.body':
+            response['bytes'] = response.get('bytes', 0) + len(message.get('body', b''))
+        await send(message)
+
+    with webapp.active_requests_lock:
+        webapp.active_requests += 1
+    try:
+        await handler(request, send_tagged, *args)
+    finally:
+        with webapp.active_requests_lock:
+            webapp.active_requests -= 1
+    if handler is download_file and response.get('status') in (200, 206):
+        file_type = os.path.splitext(args[0])[1].lstrip('.') or 'other'
+        webapp.DOWNLOADS.inc(type=file_type)
+        webapp.DOWNLOAD_BYTES.inc(response.get('bytes', 0), type=file_type)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await asyncio.get_running_loop().run_in_executor(io_executor, webapp.create_app)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for executor in (render_executor, io_executor, wsgi_executor):
+                executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """The ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    request = Request(scope, body)
+    native = route(request.method, request.path)
+    if native is None:
+        return await call_flask(request, send)
+    handler, args = native
+    await handle_native(handler, args, request, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(application, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "5000")),
+                lifespan='on', log_level=os.getenv("LOG_LEVEL", "INFO").lower())
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class RateLimiter:
+    """Space out call starts so no more than rate_per_minute begin in any minute"""
+
+    def __init__(self, rate_per_minute=None):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_batch(texts, structure, render_pool, render, max_concurrency=4, rate_limiter=None):
+    """Structure texts concurrently and render the results on a process pool
+
+    structure(text) returns structured content and runs on up to max_concurrency
+    threads; render(structured_content) returns (docx_filename, pdf_filename) and
+    runs on render_pool. Each item succeeds or fails on its own.
+    """
+    started = time.time()
+    items = [{'index': i, 'status': 'pending'} for i in range(len(texts))]
+    limiter = rate_limiter or RateLimiter()
+
+    def structure_item(index):
+        limiter.wait()
+        item_start = time.time()
+        structured_content = structure(texts[index])
+        if not structured_content:
+            raise Exception('Failed to generate structured content')
+        return structured_content, time.time() - item_start, item_start
+
+    render_futures = {}
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='batch-structure') as executor:
+        futures = {executor.submit(structure_item, i): i for i in range(len(texts))}
+        for future in as_completed(futures):
+            index = futures[future]
+            item = items[index]
+            try:
+                structured_content, structure_seconds, item_start = future.result()
+            except Exception as e:
+                item.update(status='failed', stage='structuring', error=str(e))
+                continue
+            item.update(structure_seconds=round(structure_seconds, 3), title=structured_content.get('title')
+                        if isinstance(structured_content, dict) else None)
+            # Render as soon as an item is structured so the two stages overlap
+            render_futures[render_pool.submit(render, structured_content)] = (index, item_start, time.time())
+
+    for future in as_completed(render_futures):
+        index, item_start, render_start = render_futures[future]
+        item = items[index]
+        try:
+            docx_filename, pdf_filename = future.result()
+        except Exception as e:
+            item.update(status='failed', stage='rendering', error=str(e))
+            continue
+        finished = time.time()
+        item.update(
+            status='done',
+            docx_filename=docx_filename,
+            pdf_filename=pdf_filename,
+            render_seconds=round(finished - render_start, 3),
+            latency_seconds=round(finished - item_start, 3)
+        )
+
+    elapsed = time.time() - started
+    latencies = [item['latency_seconds'] for item in items if item['status'] == 'done']
+    succeeded = len(latencies)
+    report = {
+        'count': len(texts),
+        'succeeded': succeeded,
+        'failed': len(texts) - succeeded,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(succeeded / elapsed, 3) if elapsed > 0 else 0.0,
+        'latency_p50_seconds': percentile(latencies, 50),
+        'latency_p95_seconds': percentile(latencies, 95),
+        'latency_max_seconds': max(latencies) if latencies else 0.0
+    }
+    return items, report
+
+
+def write_bundle(items, path_for, bundle_path):
+    """Zip every rendered file from a batch into a single bundle
+
+    path_for(filename) returns where a rendered file is stored.
+    """
+    with zipfile.ZipFile(bundle_path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for item in items:
+            if item['status'] != 'done':
+                continue
+            for key in ('docx_filename', 'pdf_filename'):
+                filename = item.get(key)
+                if filename:
+                    extension = os.path.splitext(filename)[1]
+                    bundle.write(path_for(filename), f"{item['index']:04d}{extension}")
+    return bundle_path
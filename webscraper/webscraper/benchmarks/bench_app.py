@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Benchmark document generation end to end against a fake Gemini backend.
+
+Usage:
+    python benchmarks/bench_app.py [--micro] [--load] [--concurrency 1,4,16] [--output results.json]
+
+Micro-benchmarks time create_document, the streaming renderer, model output
+parsing, JSON repair and local structuring on synthetic structured_content
+of several sizes, and the scraper's parse_content with each parser backend
+on the same documents as HTML pages. The load test serves the app on a local port and sweeps
+/process and /download through the given concurrency levels. Gemini is
+replaced by benchmarks/fake_gemini.py, which replays synthetic or recorded
+responses (--recordings) after --latency seconds, so no API key is needed and
+runs are repeatable. Results are printed (or written) as JSON; compare two
+runs with benchmarks/compare.py.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from batch import percentile  # noqa: E402
+from fake_gemini import FakeGemini, load_recordings  # noqa: E402
+from synthetic import make_input_text, make_structured_content, to_html, to_markdown  # noqa: E402
+
+# sections, paragraphs per section, words per paragraph, bullets, table rows
+SHAPES = {
+    'small': (4, 2, 50, 3, 0),
+    'medium': (12, 4, 60, 5, 20),
+    'large': (40, 6, 80, 8, 200),
+}
+
+
+def shape_content(name, title='Synthetic Report'):
+    sections, paragraphs, words, bullets, table_rows = SHAPES[name]
+    return make_structured_content(sections, paragraphs, words, bullets, table_rows, title=title)
+
+
+def summarize(latencies):
+    """Latency figures in milliseconds for a list of durations in seconds"""
+    return {
+        'count': len(latencies),
+        'mean_ms': round(1000 * sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'p50_ms': round(1000 * percentile(latencies, 50), 3),
+        'p95_ms': round(1000 * percentile(latencies, 95), 3),
+        'p99_ms': round(1000 * percentile(latencies, 99), 3),
+        'max_ms': round(1000 * max(latencies), 3) if latencies else 0.0,
+    }
+
+
+def time_calls(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    stats = summarize(latencies)
+    stats['ops_per_second'] = round(len(latencies) / sum(latencies), 2) if sum(latencies) else 0.0
+    return stats
+
+
+def load_scraper():
+    """The scrap script as a module; its file has no .py extension"""
+    from importlib.machinery import SourceFileLoader
+    from importlib.util import module_from_spec, spec_from_loader
+
+    path = os.path.join(os.path.dirname(BENCH_DIR), 'scrap')
+    spec = spec_from_loader('scrap', SourceFileLoader('scrap', path))
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_micro(app, shapes, repeat, workdir):
+    from jsonrepair import repair_json
+    from ooxml import write_document
+    from parsers import PARSERS
+    from structurer import structure_text
+
+    scraper = load_scraper()
+
+    results = []
+    for name in shapes:
+        content = shape_content(name)
+        response_text = '```json\n' + json.dumps(content, indent=2) + '\n```'
+        truncated = response_text[:int(len(response_text) * 0.7)]
+        markdown = to_markdown(content)
+        html = to_html(content)
+        docx_path = os.path.join(workdir, f'micro_{name}.docx')
+        benchmarks = [
+            ('create_document', lambda: app.create_document(content, docx_path)),
+            ('write_document', lambda: write_document(content, docx_path)),
+            ('parse_model_output', lambda: app.parse_model_output(response_text)),
+            ('repair_truncated_json', lambda: repair_json(app.extract_json_text(truncated))),
+            ('structure_text', lambda: structure_text(markdown)),
+        ]
+        benchmarks += [(f'parse_content_{backend}', lambda backend=backend: scraper.parse_content(html, backend))
+                       for backend in sorted(PARSERS)]
+        for benchmark, fn in benchmarks:
+            # The python-docx renderer is far slower than the rest; fewer passes keep large runs short
+            passes = max(3, repeat // 5) if benchmark == 'create_document' and name == 'large' else repeat
+            stats = time_calls(fn, passes)
+            results.append(dict(benchmark=benchmark, shape=name, **stats))
+            print(f"{benchmark:<22} {name:<7} p50 {stats['p50_ms']:>10.3f} ms", file=sys.stderr)
+    return results
+
+
+def run_load(app, levels, requests_per_level, input_words, backend):
+    import requests
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app.create_app(), threaded=True)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    local = threading.local()
+    sequence = iter(range(10 ** 9))
+    sequence_lock = threading.Lock()
+
+    def one_request():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        with sequence_lock:
+            number = next(sequence)
+        started = time.perf_counter()
+        response = local.session.post(f'{base_url}/process',
+                                      data={'text': make_input_text(input_words, seed=number), 'cache': '0'})
+        process_seconds = time.perf_counter() - started
+        if response.status_code != 200:
+            return process_seconds, None
+        started = time.perf_counter()
+        download = local.session.get(base_url + response.json()['docx_url'])
+        download_seconds = time.perf_counter() - started
+        if download.status_code != 200 or not download.content:
+            return process_seconds, None
+        return process_seconds, download_seconds
+
+    results = []
+    try:
+        one_request()
+        for concurrency in levels:
+            count = max(requests_per_level, concurrency)
+            calls_before = backend.calls
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                outcomes = list(executor.map(lambda _: one_request(), range(count)))
+            elapsed = time.perf_counter() - started
+            downloads = [download for _, download in outcomes if download is not None]
+            results.append({
+                'concurrency': concurrency,
+                'requests': count,
+                'errors': count - len(downloads),
+                'seconds': round(elapsed, 3),
+                'requests_per_second': round(count / elapsed, 2),
+                'gemini_calls': backend.calls - calls_before,
+                'process': summarize([process for process, _ in outcomes]),
+                'download': summarize(downloads),
+            })
+            print(f"concurrency {concurrency:<4} {results[-1]['requests_per_second']:>8} req/s  "
+                  f"process p95 {results[-1]['process']['p95_ms']:>9.1f} ms  errors {results[-1]['errors']}",
+                  file=sys.stderr)
+    finally:
+        server.shutdown()
+    return results
+
+
+def prepare_environment(workdir):
+    """Keep every database and rendered file out of the working tree"""
+    for name, value in (('GOOGLE_API_KEY', 'benchmark'), ('LOG_LEVEL', 'WARNING'), ('LOCAL_STRUCTURER', '0'),
+                        ('OUTPUT_FOLDER', os.path.join(workdir, 'output')),
+                        ('CACHE_DB_PATH', os.path.join(workdir, 'cache.db')),
+                        ('JOB_DB_PATH', os.path.join(workdir, 'jobs.db')),
+                        ('ARTIFACT_DB_PATH', os.path.join(workdir, 'artifacts.db')),
+                        ('URL_CACHE_PATH', os.path.join(workdir, 'http.db'))):
+        os.environ.setdefault(name, value)
+
+
+def make_backend(args):
+    """A FakeGemini for the --recordings, --response-shape, --latency and --jitter arguments"""
+    if args.recordings:
+        responses = load_recordings(args.recordings)
+    else:
+        base = shape_content(args.response_shape)
+
+        # A distinct title per call gives every document its own content hash, so nothing is reused
+        def responses(number):
+            return json.dumps(dict(base, title=f'Benchmark document {number}'))
+    return FakeGemini(responses, latency=args.latency, jitter=args.jitter)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--micro', action='store_true', help='run only the micro-benchmarks')
+    parser.add_argument('--load', action='store_true', help='run only the load test')
+    parser.add_argument('--shapes', default='small,medium,large', help='document sizes for the micro-benchmarks')
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per micro-benchmark')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated load test concurrency levels')
+    parser.add_argument('--requests', type=int, default=40, help='requests per concurrency level')
+    parser.add_argument('--input-words', type=int, default=600, help='words of text submitted per request')
+    parser.add_argument('--response-shape', default='medium', choices=sorted(SHAPES),
+                        help='size of the fake model responses')
+    parser.add_argument('--recordings', help='replay these recorded responses instead of synthetic ones')
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds each fake Gemini call takes')
+    parser.add_argument('--jitter', type=float, default=0.05, help='extra random seconds per fake Gemini call')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    run_all = not args.micro and not args.load
+
+    workdir = tempfile.mkdtemp(prefix='byteme-bench-')
+    prepare_environment(workdir)
+    import app
+
+    backend = make_backend(args)
+    backend.install(app.load_genai())
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'renderer': app.DOC_RENDERER,
+            'args': vars(args),
+        }
+    }
+    if run_all or args.micro:
+        results['micro'] = run_micro(app, [s for s in args.shapes.split(',') if s], args.repeat, workdir)
+    if run_all or args.load:
+        levels = [int(level) for level in args.concurrency.split(',') if level]
+        results['load'] = run_load(app, levels, args.requests, args.input_words, backend)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
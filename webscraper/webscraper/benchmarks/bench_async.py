@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""Load test many concurrent slow /process requests against the async and sync servers.
+
+Usage:
+    python benchmarks/bench_async.py [--concurrency 300] [--latency 2] [--modes async,sync] [--output results.json]
+
+Each mode serves the app in its own process with Gemini replaced by
+benchmarks/fake_gemini.py, which answers after --latency seconds. "async" is
+asgi.py under uvicorn; "sync" is the Flask app on a WSGI server with
+--sync-threads worker threads (0 starts a thread per request, like
+app.run). All --concurrency requests are sent at once on separate
+connections. Throughput, latency, errors and the server's peak thread count
+and memory are reported as JSON.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_app import SHAPES, git_commit, make_backend, prepare_environment, summarize  # noqa: E402
+from synthetic import make_input_text  # noqa: E402
+
+
+def serve(args):
+    """Run one server with the fake backend installed; used as the child process of each mode"""
+    prepare_environment(tempfile.mkdtemp(prefix='byteme-bench-async-'))
+    import app
+
+    make_backend(args).install(app.load_genai())
+    if args.serve == 'async':
+        import uvicorn
+        from asgi import application
+
+        uvicorn.run(application, host='127.0.0.1', port=args.port, log_level='warning', lifespan='on',
+                    backlog=4096)
+        return
+
+    from werkzeug.serving import BaseWSGIServer, make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    if not args.sync_threads:
+        server = make_server('127.0.0.1', args.port, app.create_app(), threaded=True)
+    else:
+        class PooledServer(BaseWSGIServer):
+            """Handles connections on a fixed pool of threads, like a threaded WSGI worker"""
+            request_queue_size = 4096
+            pool = ThreadPoolExecutor(max_workers=args.sync_threads)
+
+            def process_request(self, request, client_address):
+                self.pool.submit(self._handle, request, client_address)
+
+            def _handle(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+        server = PooledServer('127.0.0.1', args.port, app.create_app())
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def http_request(port, method, path, body=b''):
+    """One request on its own connection; returns (status, response body)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+                     f'Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n'
+                     .encode('latin-1') + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1]), payload
+
+
+def process_stats(pid):
+    """(threads, resident MB) of a process, from /proc on Linux"""
+    threads = rss = 0
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return threads, rss
+
+
+async def wait_until_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with status {process.returncode}')
+        try:
+            status, _ = await http_request(port, 'GET', '/metrics')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+async def load(port, pid, concurrency, input_words):
+    from urllib.parse import urlencode
+
+    bodies = [urlencode({'text': make_input_text(input_words, seed=number), 'cache': '0'}).encode()
+              for number in range(concurrency + 1)]
+    # One request first so imports and the first render are not timed
+    await http_request(port, 'POST', '/process', bodies[-1])
+
+    peak = {'threads': 0, 'rss_mb': 0.0}
+    done = asyncio.Event()
+
+    async def sample():
+        while not done.is_set():
+            threads, rss = process_stats(pid)
+            peak['threads'] = max(peak['threads'], threads)
+            peak['rss_mb'] = max(peak['rss_mb'], rss)
+            await asyncio.sleep(0.05)
+
+    async def one(body):
+        started = time.perf_counter()
+        try:
+            status, payload = await http_request(port, 'POST', '/process', body)
+            ok = status == 200 and b'docx_url' in payload
+        except OSError:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    idle_threads, idle_rss = process_stats(pid)
+    sampler = asyncio.ensure_future(sample())
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*[one(body) for body in bodies[:concurrency]])
+    elapsed = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    return {
+        'concurrency': concurrency,
+        'errors': sum(1 for ok, _ in outcomes if not ok),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(concurrency / elapsed, 2),
+        'process': summarize([seconds for ok, seconds in outcomes if ok]),
+        'idle_threads': idle_threads,
+        'peak_threads': peak['threads'],
+        'idle_rss_mb': round(idle_rss, 1),
+        'peak_rss_mb': round(peak['rss_mb'], 1),
+    }
+
+
+def run_mode(mode, args):
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port)]
+    for name in ('latency', 'jitter', 'response_shape', 'sync_threads'):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    if args.recordings:
+        command += ['--recordings', args.recordings]
+    env = dict(os.environ)
+    # Keep the model the only slow part: fast renderer, no quota queueing before the stub
+    env.setdefault('DOC_RENDERER', 'streaming')
+    env.setdefault('GEMINI_MAX_CONCURRENCY', str(max(16, args.concurrency * 2)))
+    process = subprocess.Popen(command, env=env)
+    try:
+        async def run():
+            await wait_until_ready(port, process)
+            return await load(port, process.pid, args.concurrency, args.input_words)
+        result = asyncio.run(run())
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    result['mode'] = mode
+    print(f"{mode:<6} {result['requests_per_second']:>8} req/s  p50 {result['process']['p50_ms']:>9.1f} ms  "
+          f"p95 {result['process']['p95_ms']:>9.1f} ms  errors {result['errors']}  "
+          f"peak threads {result['peak_threads']}", file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--modes', default='async,sync', help='servers to test: async, sync or both')
+    parser.add_argument('--concurrency', type=int, default=300, help='requests sent at once')
+    parser.add_argument('--input-words', type=int, default=200, help='words of text submitted per request')
+    parser.add_argument('--response-shape', default='small', choices=sorted(SHAPES),
+                        help='size of the fake model responses')
+    parser.add_argument('--recordings', help='replay these recorded responses instead of synthetic ones')
+    parser.add_argument('--latency', type=float, default=2.0, help='seconds each fake Gemini call takes')
+    parser.add_argument('--jitter', type=float, default=0.2, help='extra random seconds per fake Gemini call')
+    parser.add_argument('--sync-threads', type=int, default=32,
+                        help='worker threads of the sync server (0 = one per request)')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--serve', choices=('async', 'sync'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'args': {name: value for name, value in vars(args).items() if name not in ('serve', 'port')},
+        },
+        'async_load': [run_mode(mode, args) for mode in args.modes.split(',') if mode],
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Compare throughput, peak memory and output equivalence of the HTML parser backends.
+
+Usage:
+    python benchmarks/bench_parsers.py [CORPUS_DIR] [--repeat N] [--json]
+
+CORPUS_DIR holds saved .html pages. Without one, a synthetic corpus is
+generated. Each backend runs in its own process so its peak RSS (which
+includes lxml's C allocations) can be measured in isolation.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers import PARSERS  # noqa: E402
+
+
+def load_corpus(corpus_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, '**', '*.htm*'), recursive=True)):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append(f.read())
+    return pages
+
+
+def synthetic_corpus(pages=20, paragraphs=2000):
+    corpus = []
+    for page in range(pages):
+        body = ''.join(
+            f'<div class="row"><p>Paragraph {i} of page {page} with <b>bold</b> &amp; <a href="#">links</a>.</p>'
+            f'<script>var x{i} = "{i}";</script><!-- comment {i} --></div>'
+            for i in range(paragraphs)
+        )
+        corpus.append(f'<html><head><title>Page {page}</title><style>p {{ color: red; }}</style></head>'
+                      f'<body><nav>Home | About</nav>{body}<footer>Footer</footer></body></html>')
+    return corpus
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def run_backend(name, corpus, repeat, queue):
+    parse = PARSERS[name]
+    baseline = peak_rss_mb()
+    outputs = [parse(html) for html in corpus]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in corpus:
+            parse(html)
+    elapsed = time.perf_counter() - started
+    queue.put({
+        'backend': name,
+        'seconds': round(elapsed, 4),
+        'pages_per_second': round(len(corpus) * repeat / elapsed, 2),
+        'mb_per_second': round(sum(len(html) for html in corpus) * repeat / elapsed / 1e6, 2),
+        'peak_rss_delta_mb': round(peak_rss_mb() - baseline, 2),
+        'outputs': outputs,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('corpus', nargs='?', help='directory of saved .html pages')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the corpus per backend')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not corpus:
+        print(f"No .html files found in {args.corpus}")
+        sys.exit(1)
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in sorted(PARSERS):
+        queue = context.Queue()
+        process = context.Process(target=run_backend, args=(name, corpus, args.repeat, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    # Every backend must produce the same visible text as the original soup backend
+    reference = next(result['outputs'] for result in results if result['backend'] == 'soup')
+    for result in results:
+        outputs = result.pop('outputs')
+        result['mismatched_pages'] = sum(1 for a, b in zip(outputs, reference) if a != b)
+
+    if args.json:
+        print(json.dumps({'pages': len(corpus), 'bytes': sum(len(html) for html in corpus), 'results': results},
+                         indent=2))
+        return
+
+    print(f"{len(corpus)} pages, {sum(len(html) for html in corpus) / 1e6:.1f} MB, {args.repeat} passes")
+    print(f"{'backend':<8} {'pages/s':>10} {'MB/s':>8} {'peak MB':>9} {'mismatch':>9}")
+    for result in results:
+        print(f"{result['backend']:<8} {result['pages_per_second']:>10} {result['mb_per_second']:>8} "
+              f"{result['peak_rss_delta_mb']:>9} {result['mismatched_pages']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Measure how long a fresh server process takes to serve its first request.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--modes lazy,background,warm] [--output results.json]
+
+Each run starts a new process that imports the app and serves it on a local
+port. "lazy" sets WARM_UP=0, so the Gemini SDK and python-docx are imported by
+the first requests that need them; "background" warms up in a thread while
+the server listens; "warm" warms up before listening.
+
+The first request is a /process of JSON input, which renders a DOCX without
+calling the model. Reported per mode: seconds until the port accepts
+connections, seconds until the first response is complete, the first and
+second request latencies, and the process's own /startup/stats breakdown.
+
+Before timing anything, a bare `import app` is checked to leave the
+DEFERRED_MODULES unimported; the run fails if any of them was loaded.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_app import git_commit, prepare_environment, shape_content  # noqa: E402
+from batch import percentile  # noqa: E402
+
+
+# Slow imports that must wait for create_app() or first use
+DEFERRED_MODULES = ('flask_cors', 'google.generativeai', 'docx', 'docx2pdf')
+
+
+def list_eager_imports():
+    """Print which DEFERRED_MODULES a bare import of the app loads; run in a fresh process"""
+    prepare_environment(tempfile.mkdtemp(prefix='byteme-bench-startup-'))
+    import app  # noqa: F401
+
+    print(json.dumps([name for name in DEFERRED_MODULES if name in sys.modules]))
+
+
+def eager_imports():
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--imports'],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def serve(port):
+    prepare_environment(tempfile.mkdtemp(prefix='byteme-bench-startup-'))
+    import logging
+
+    import app
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    # Trees from before the app factory serve the module-level app
+    flask_app = app.create_app() if hasattr(app, 'create_app') else app.app
+    make_server('127.0.0.1', port, flask_app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_json(base_url, number):
+    body = urlencode({'text': json.dumps(dict(shape_content('small'), title=f'Startup document {number}'))})
+    started = time.perf_counter()
+    with urlopen(f'{base_url}/process', body.encode(), timeout=60) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+WARM_UP_MODES = {'lazy': '0', 'background': 'background', 'warm': '1'}
+
+
+def one_run(mode, timeout=60):
+    port = free_port()
+    env = dict(os.environ, WARM_UP=WARM_UP_MODES[mode])
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)], env=env)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'server exited with status {process.returncode}')
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError('server did not start')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.005)
+        ready = time.perf_counter() - started
+        base_url = f'http://127.0.0.1:{port}'
+        first_request = process_json(base_url, 0)
+        first_response = time.perf_counter() - started
+        second_request = process_json(base_url, 1)
+        try:
+            with urlopen(f'{base_url}/startup/stats', timeout=10) as response:
+                breakdown = json.load(response)
+        except HTTPError:
+            breakdown = {}
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {'ready': ready, 'first_response': first_response, 'first_request': first_request,
+            'second_request': second_request, 'breakdown': breakdown}
+
+
+def median(values):
+    return round(percentile(values, 50), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--modes', default='lazy,background,warm',
+                        help='comma-separated startup modes: lazy, background, warm')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes started per mode')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--imports', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve)
+    if args.imports:
+        return list_eager_imports()
+
+    eager = eager_imports()
+    if eager:
+        sys.exit(f"import app loaded modules that should be deferred: {', '.join(eager)}")
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'args': {name: value for name, value in vars(args).items() if name not in ('serve', 'imports')},
+        },
+        'startup': [],
+    }
+    for mode in [mode for mode in args.modes.split(',') if mode]:
+        runs = [one_run(mode) for _ in range(args.runs)]
+        phases = sorted({phase for run in runs for phase in run['breakdown']})
+        entry = {
+            'mode': mode,
+            'runs': args.runs,
+            'ready_seconds': median([run['ready'] for run in runs]),
+            'first_response_seconds': median([run['first_response'] for run in runs]),
+            'first_request_ms': round(1000 * median([run['first_request'] for run in runs]), 1),
+            'second_request_ms': round(1000 * median([run['second_request'] for run in runs]), 1),
+            'breakdown_seconds': {phase: median([run['breakdown'][phase] for run in runs
+                                                 if phase in run['breakdown']]) for phase in phases},
+        }
+        results['startup'].append(entry)
+        print(f"{mode:<10} ready {entry['ready_seconds']:>6.3f} s  first response {entry['first_response_seconds']:>6.3f} s  "
+              f"first request {entry['first_request_ms']:>7.1f} ms  second {entry['second_request_ms']:>6.1f} ms",
+              file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Compare two bench_app.py result files.
+
+Usage:
+    python benchmarks/compare.py BASELINE.json CANDIDATE.json [--threshold PCT]
+
+Prints the p50/p95 change of every micro-benchmark and load level found in
+both files. Exits with status 1 if any p50 got slower by more than the
+threshold (default 10%).
+"""
+import argparse
+import json
+import sys
+
+
+def _change(old, new):
+    return 100.0 * (new - old) / old if old else 0.0
+
+
+def _rows(results):
+    rows = {}
+    for entry in results.get('micro', []):
+        rows[f"{entry['benchmark']} [{entry['shape']}]"] = entry
+    for entry in results.get('load', []):
+        rows[f"process c={entry['concurrency']}"] = entry['process']
+        rows[f"download c={entry['concurrency']}"] = entry['download']
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed p50 slowdown in percent')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    old_rows, new_rows = _rows(baseline), _rows(candidate)
+
+    print(f"{baseline['meta'].get('commit')} -> {candidate['meta'].get('commit')}")
+    print(f"{'benchmark':<36} {'p50 ms':>10} {'change':>8} {'p95 ms':>10} {'change':>8}")
+    regressions = 0
+    for name, new in new_rows.items():
+        old = old_rows.get(name)
+        if old is None:
+            continue
+        p50_change = _change(old['p50_ms'], new['p50_ms'])
+        flag = ''
+        if p50_change > args.threshold:
+            regressions += 1
+            flag = '  slower'
+        print(f"{name:<36} {new['p50_ms']:>10.3f} {p50_change:>+7.1f}% {new['p95_ms']:>10.3f} "
+              f"{_change(old['p95_ms'], new['p95_ms']):>+7.1f}%{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""A local stand-in for genai.GenerativeModel that replays responses with injected latency.
+
+Responses come from a recordings file or a callable. A recordings file is
+either a JSON list of response texts or JSON lines, each a response text or
+an object with a "response" key. Responses are handed out in order and
+wrapped around when they run out.
+"""
+import json
+import random
+import threading
+import time
+
+
+def load_recordings(path):
+    with open(path, encoding='utf-8') as f:
+        raw = f.read()
+    stripped = raw.lstrip()
+    if stripped.startswith('['):
+        entries = json.loads(stripped)
+    else:
+        entries = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    responses = [entry['response'] if isinstance(entry, dict) else entry for entry in entries]
+    if not responses:
+        raise ValueError(f"No responses recorded in {path}")
+    return responses
+
+
+class _UsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Response:
+    def __init__(self, text, prompt):
+        self.text = text
+        # Roughly four characters per token, as the app estimates
+        self.usage_metadata = _UsageMetadata(len(prompt) // 4, len(text) // 4)
+
+
+class _StreamedResponse:
+    def __init__(self, chunks, prompt, first_delay, chunk_delay):
+        self._chunks = chunks
+        self._first_delay = first_delay
+        self._chunk_delay = chunk_delay
+        self.usage_metadata = _UsageMetadata(len(prompt) // 4, sum(len(c) for c in chunks) // 4)
+
+    def __iter__(self):
+        time.sleep(self._first_delay)
+        for index, chunk in enumerate(self._chunks):
+            if index:
+                time.sleep(self._chunk_delay)
+            yield _Chunk(chunk)
+
+
+class _AsyncStreamedResponse(_StreamedResponse):
+    async def __aiter__(self):
+        import asyncio
+        await asyncio.sleep(self._first_delay)
+        for index, chunk in enumerate(self._chunks):
+            if index:
+                await asyncio.sleep(self._chunk_delay)
+            yield _Chunk(chunk)
+
+
+class FakeGemini:
+    """
+    Replays responses for every GenerativeModel created while installed.
+
+    Args:
+        responses: A list of response texts, or a callable taking the call
+            number and returning one.
+        latency (float): Seconds each call takes before it returns.
+        jitter (float): Extra uniformly random seconds added to each call.
+        stream_chunks (int): How many pieces a streamed response is split into.
+        seed (int): Seed for the jitter.
+    """
+
+    def __init__(self, responses, latency=0.0, jitter=0.0, stream_chunks=8, seed=0):
+        self.responses = responses
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = max(1, stream_chunks)
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            number = self.calls
+            self.calls += 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if callable(self.responses):
+            return self.responses(number), delay
+        return self.responses[number % len(self.responses)], delay
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        text, delay = self._next()
+        if not stream:
+            time.sleep(delay)
+            return _Response(text, prompt)
+        size = max(1, -(-len(text) // self.stream_chunks))
+        chunks = [text[start:start + size] for start in range(0, len(text), size)] or ['']
+        # Time to first chunk dominates, as with the real API
+        return _StreamedResponse(chunks, prompt, delay * 0.5, delay * 0.5 / len(chunks))
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        import asyncio
+        text, delay = self._next()
+        if not stream:
+            await asyncio.sleep(delay)
+            return _Response(text, prompt)
+        size = max(1, -(-len(text) // self.stream_chunks))
+        chunks = [text[start:start + size] for start in range(0, len(text), size)] or ['']
+        return _AsyncStreamedResponse(chunks, prompt, delay * 0.5, delay * 0.5 / len(chunks))
+
+    def model_class(self):
+        backend = self
+
+        class GenerativeModel:
+            def __init__(self, model_name=None, generation_config=None, **kwargs):
+                self.model_name = model_name
+                self.generation_config = generation_config
+
+            def generate_content(self, prompt, stream=False, **kwargs):
+                return backend.generate_content(prompt, stream=stream, **kwargs)
+
+            async def generate_content_async(self, prompt, stream=False, **kwargs):
+                return await backend.generate_content_async(prompt, stream=stream, **kwargs)
+
+        return GenerativeModel
+
+    def install(self, genai_module):
+        """Replace genai_module.GenerativeModel; returns the original so it can be restored"""
+        original = genai_module.GenerativeModel
+        genai_module.GenerativeModel = self.model_class()
+        return original
@@ -0,0 +1,107 @@
+"""Deterministic synthetic inputs and structured_content for the benchmarks."""
+import random
+from html import escape
+
+WORDS = (
+    'quarterly revenue growth market customer product team release roadmap pipeline latency storage '
+    'document report summary analysis forecast budget region service platform feature migration '
+    'incident review metric target baseline experiment rollout feedback contract partner support'
+).split()
+
+
+def _sentence(rng, words):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def make_paragraph(rng, words=60):
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 16))
+        sentences.append(_sentence(rng, length))
+        remaining -= length
+    return ' '.join(sentences)
+
+
+def make_structured_content(sections=8, paragraphs=3, paragraph_words=60, bullets=5, table_rows=0,
+                            table_cols=4, title='Synthetic Report', seed=0):
+    """
+    Builds structured_content of a given shape, the same for the same arguments.
+
+    Args:
+        sections (int): Number of top-level sections.
+        paragraphs (int): Paragraphs per section.
+        paragraph_words (int): Words per paragraph.
+        bullets (int): Items in each section's bullet list (0 for none).
+        table_rows (int): Rows in each section's table (0 for none).
+        table_cols (int): Columns in each table.
+        title (str): The document title.
+        seed (int): Seed for the word choice.
+
+    Returns:
+        dict: Structured content as returned by generate_structured_content.
+    """
+    rng = random.Random(seed)
+    result = {'title': title, 'sections': []}
+    for index in range(sections):
+        content = [{'type': 'paragraph', 'text': make_paragraph(rng, paragraph_words)} for _ in range(paragraphs)]
+        if bullets:
+            content.append({'type': 'bullet_list', 'items': [_sentence(rng, 6) for _ in range(bullets)]})
+        if table_rows:
+            content.append({
+                'type': 'table',
+                'headers': [f'Column {col + 1}' for col in range(table_cols)],
+                'rows': [[f'{rng.choice(WORDS)} {row}.{col}' for col in range(table_cols)] for row in range(table_rows)]
+            })
+        result['sections'].append({'heading': f'Section {index + 1}', 'level': 1, 'content': content})
+    return result
+
+
+def to_markdown(structured_content):
+    """The Markdown a user might paste for the same document"""
+    lines = [f"# {structured_content['title']}", '']
+    for section in structured_content['sections']:
+        lines.extend(['#' * (section['level'] + 1) + ' ' + section['heading'], ''])
+        for item in section['content']:
+            if item['type'] == 'paragraph':
+                lines.append(item['text'])
+            elif item['type'] in ('bullet_list', 'numbered_list'):
+                lines.extend(f'- {entry}' for entry in item['items'])
+            elif item['type'] == 'table':
+                lines.append('| ' + ' | '.join(item['headers']) + ' |')
+                lines.append('|' + '---|' * len(item['headers']))
+                lines.extend('| ' + ' | '.join(row) + ' |' for row in item['rows'])
+            lines.append('')
+    return '\n'.join(lines)
+
+
+def to_html(structured_content):
+    """A scraped page for the same document, with the navigation, scripts and footer around it"""
+    parts = [f"<html><head><title>{escape(structured_content['title'])}</title>",
+             '<style>p { color: #333; }</style><script>var analytics = {"id": 1};</script></head>',
+             '<body><nav><a href="/">Home</a> | <a href="/about">About</a></nav><main>',
+             f"<h1>{escape(structured_content['title'])}</h1>"]
+    for section in structured_content['sections']:
+        level = min(section['level'] + 1, 6)
+        parts.append(f"<section><h{level}>{escape(section['heading'])}</h{level}>")
+        for item in section['content']:
+            if item['type'] == 'paragraph':
+                parts.append(f"<p>{escape(item['text'])} <a href=\"#\">more</a></p><!-- tracking -->")
+            elif item['type'] in ('bullet_list', 'numbered_list'):
+                tag = 'ul' if item['type'] == 'bullet_list' else 'ol'
+                parts.append(f"<{tag}>" + ''.join(f"<li>{escape(entry)}</li>" for entry in item['items']) + f"</{tag}>")
+            elif item['type'] == 'table':
+                parts.append('<table><tr>' + ''.join(f"<th>{escape(cell)}</th>" for cell in item['headers']) + '</tr>')
+                parts.extend('<tr>' + ''.join(f"<td>{escape(cell)}</td>" for cell in row) + '</tr>'
+                             for row in item['rows'])
+                parts.append('</table>')
+        parts.append('</section>')
+    parts.append('</main><footer>Copyright &copy; Example</footer></body></html>')
+    return '\n'.join(parts)
+
+
+def make_input_text(words=600, seed=0):
+    """Unstructured prose to submit to /process, so the model (not the local structurer) handles it"""
+    rng = random.Random(seed)
+    return '\n'.join(make_paragraph(rng, 60) for _ in range(max(1, words // 60)))
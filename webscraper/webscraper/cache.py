@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalize input text so trivially different resubmissions share a cache key"""
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def make_key(input_text, prompt_version, model_name, generation_config):
+    """Hash everything that can change the model's output into a single cache key"""
+    material = json.dumps({
+        'text': normalize_text(input_text),
+        'prompt_version': prompt_version,
+        'model': model_name,
+        'generation_config': generation_config
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache: an in-memory LRU in front of an on-disk SQLite store"""
+
+    def __init__(self, db_path, ttl=7 * 24 * 3600, memory_entries=256, disk_entries=10000):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return json.loads(value)
+                del self._memory[key]
+
+            row = self._conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value, created = row
+                if now - created < self.ttl:
+                    with self._conn:
+                        self._conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                    self._remember(key, value, created)
+                    self.stats['disk_hits'] += 1
+                    return json.loads(value)
+                with self._conn:
+                    self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.stats['evictions'] += 1
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key, structured_content):
+        value = json.dumps(structured_content)
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+            self.stats['stores'] += 1
+            self._evict_disk(now)
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        # Expired entries go first, then the least recently used beyond the size limit
+        with self._conn:
+            expired = self._conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,)).rowcount
+            overflow = self._conn.execute("""
+                DELETE FROM results WHERE key IN (
+                    SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.disk_entries,)).rowcount
+        self.stats['evictions'] += expired + overflow
+
+    def summary(self):
+        with self._lock:
+            disk_entries = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+        stats['disk_entries'] = disk_entries
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = hits / lookups if lookups else 0.0
+        return stats
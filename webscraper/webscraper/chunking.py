@@ -0,0 +1,113 @@
+import re
+
+
+# Rough characters-per-token ratio for English text with Gemini's tokenizer
+CHARS_PER_TOKEN = 4
+
+FALLBACK_TITLE = 'Generated Document'
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def looks_like_heading(block):
+    """Short single-line blocks, markdown headings and lines ending in ':' start new topics"""
+    first_line = block.strip().split('\n', 1)[0].strip()
+    if first_line.startswith('#'):
+        return True
+    return '\n' not in block.strip() and len(first_line) < 80 and (
+        first_line.endswith(':') or not first_line.endswith(('.', '!', '?', ','))
+    )
+
+
+def _split_oversized(block, max_chars):
+    """Split a block that is too big on its own at line, then character, boundaries"""
+    pieces = []
+    current = ''
+    for line in block.split('\n'):
+        while len(line) > max_chars:
+            cut = line.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:cut])
+            line = line[cut:].lstrip()
+        if current and len(current) + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text, max_tokens):
+    """Split text into chunks of at most max_tokens at paragraph and heading boundaries"""
+    # Sized against estimate_tokens, so no chunk is itself long enough to be split again
+    max_chars = (max_tokens - 1) * CHARS_PER_TOKEN
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    blocks = [block.strip('\n') for block in re.split(r'\n\s*\n', text) if block.strip()]
+
+    chunks = []
+    current = []
+    current_chars = 0
+    for block in blocks:
+        pieces = [block] if len(block) <= max_chars else _split_oversized(block, max_chars)
+        for piece in pieces:
+            # Prefer to start a new chunk at a heading once the current one is half full
+            at_heading = looks_like_heading(piece) and current_chars >= max_chars // 2
+            if current and (current_chars + len(piece) + 2 > max_chars or at_heading):
+                chunks.append('\n\n'.join(current))
+                current = []
+                current_chars = 0
+            current.append(piece)
+            current_chars += len(piece) + 2
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+def _normalize_levels(sections):
+    levels = [section.get('level', 1) for section in sections if isinstance(section.get('level', 1), int)]
+    shift = min(levels) - 1 if levels else 0
+    for section in sections:
+        level = section.get('level', 1)
+        if not isinstance(level, int):
+            level = 1
+        section['level'] = max(1, min(9, level - shift))
+    return sections
+
+
+def merge_structures(parts):
+    """Merge the structured content of consecutive chunks into one document
+
+    The first real title wins, section levels are normalized per chunk so
+    every chunk's top sections sit at level 1, and a section split across a
+    chunk boundary (same heading on both sides) is joined back together.
+    """
+    title = None
+    sections = []
+    for part in parts:
+        if not isinstance(part, dict):
+            continue
+        part_title = part.get('title')
+        if title is None and part_title and part_title != FALLBACK_TITLE:
+            title = part_title
+
+        part_sections = _normalize_levels([dict(section) for section in part.get('sections', [])
+                                           if isinstance(section, dict)])
+        for section in part_sections:
+            previous = sections[-1] if sections else None
+            if previous is not None and previous.get('heading') == section.get('heading') \
+                    and previous.get('level') == section.get('level'):
+                previous['content'] = list(previous.get('content', [])) + list(section.get('content', []))
+            else:
+                sections.append(section)
+
+    return {
+        'title': title or FALLBACK_TITLE,
+        'sections': sections
+    }
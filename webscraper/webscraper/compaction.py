@@ -0,0 +1,237 @@
+import re
+
+from bs4 import BeautifulSoup, NavigableString
+
+from chunking import estimate_tokens
+
+try:
+    import lxml  # noqa: F401
+    SOUP_PARSER = 'lxml'
+except ImportError:  # lxml is optional; html.parser gives the same tree, only slower
+    SOUP_PARSER = 'html.parser'
+
+
+# Elements that never hold the main content
+REMOVED_TAGS = ('script', 'style', 'noscript', 'template', 'svg', 'iframe', 'form', 'button',
+                'nav', 'footer', 'aside')
+
+# Class/id hints for boilerplate, and hints that rescue an element anyway (as in Readability)
+UNLIKELY = re.compile(r'banner|breadcrumb|combx|comment|community|consent|cookie|disqus|extra|foot|header|'
+                      r'legends|menu|modal|newsletter|pager|pagination|popup|promo|related|remark|replies|'
+                      r'rss|share|shoutbox|sidebar|skyscraper|social|sponsor|subscribe|supplemental', re.I)
+MAYBE = re.compile(r'and|article|body|column|content|main|shadow', re.I)
+
+BLOCK_TAGS = ('address', 'article', 'blockquote', 'dd', 'div', 'dl', 'dt', 'figcaption', 'h1', 'h2', 'h3',
+              'h4', 'h5', 'h6', 'li', 'main', 'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul')
+
+# Paragraph-like elements whose text is scored, and the shortest one worth scoring
+SCORED_TAGS = ('p', 'pre', 'td', 'blockquote')
+MIN_PARAGRAPH_CHARS = 25
+
+# A <main>/<article> with at least this much text is taken as the content without scoring
+MIN_CONTENT_CHARS = 200
+
+# Lines shorter than this (list markers, separators, '```') may legitimately repeat
+MIN_DEDUP_CHARS = 12
+
+# Whitespace other than tabs; tabs separate columns, so they are kept as they are
+SPACES = re.compile(r'[^\S\t]+')
+
+INVISIBLE = re.compile('[\u200b\u200c\u200d\u2060\ufeff]')
+
+# Stands in for a line break between blocks while the source's own whitespace is collapsed
+_BREAK = '\x00'
+
+
+def looks_like_html(text):
+    """Markup pasted as input starts with a tag and contains ordinary page elements"""
+    return text.lstrip().startswith('<') and re.search(
+        r'<(html|head|body|div|p|article|main|section|span|table)\b', text[:5000], re.I
+    ) is not None
+
+
+def _is_unlikely(element):
+    if element.name in ('html', 'body', 'article', 'main'):
+        return False
+    hints = ' '.join(element.get('class') or []) + ' ' + (element.get('id') or '')
+    return bool(UNLIKELY.search(hints)) and not MAYBE.search(hints)
+
+
+def _link_density(element, text_length):
+    if not text_length:
+        return 0.0
+    link_length = sum(len(link.get_text(' ', strip=True)) for link in element.find_all('a'))
+    return link_length / text_length
+
+
+def _best_candidate(body):
+    """Score parents of paragraphs like Readability and return the main-content element"""
+    scores = {}
+    elements = {}
+    for paragraph in body.find_all(SCORED_TAGS):
+        text = paragraph.get_text(' ', strip=True)
+        if len(text) < MIN_PARAGRAPH_CHARS:
+            continue
+        score = 1 + text.count(',') + min(len(text) // 100, 3)
+        parent = paragraph.parent
+        grandparent = parent.parent if parent is not None else None
+        for ancestor, share in ((parent, 1.0), (grandparent, 0.5)):
+            if ancestor is None or ancestor.name is None:
+                continue
+            elements[id(ancestor)] = ancestor
+            scores[id(ancestor)] = scores.get(id(ancestor), 0.0) + score * share
+
+    best, best_score = None, 0.0
+    for key, element in elements.items():
+        text_length = len(element.get_text(' ', strip=True))
+        scores[key] *= 1 - _link_density(element, text_length)
+        if scores[key] > best_score:
+            best, best_score = element, scores[key]
+    if best is None:
+        return [body]
+
+    # Siblings that score well, or read like prose, belong to the same article
+    threshold = max(10.0, best_score * 0.2)
+    parts = []
+    for sibling in (best.parent.children if best.parent is not None else [best]):
+        if sibling is best or scores.get(id(sibling), 0.0) >= threshold:
+            parts.append(sibling)
+        elif getattr(sibling, 'name', None) == 'p':
+            text = sibling.get_text(' ', strip=True)
+            if len(text) > 80 and _link_density(sibling, len(text)) < 0.25:
+                parts.append(sibling)
+    return parts
+
+
+def _block_text(element):
+    """Visible text with each block element as its own paragraph"""
+    if isinstance(element, NavigableString):
+        return ' '.join(element.split())
+    for br in element.find_all('br'):
+        br.replace_with(_BREAK)
+    for block in element.find_all(BLOCK_TAGS):
+        block.insert_before(_BREAK)
+        block.insert_after(_BREAK)
+    lines = (' '.join(line.split()) for line in element.get_text().split(_BREAK))
+    return '\n\n'.join(line for line in lines if line)
+
+
+def extract_main_content(html):
+    """
+    Extracts the main content of a page, dropping navigation, footers, cookie
+    banners, sidebars and other boilerplate.
+
+    Args:
+        html (str): Raw HTML of the page.
+
+    Returns:
+        tuple: (main content text with one block per paragraph, token estimate of all visible text)
+    """
+    soup = BeautifulSoup(html, SOUP_PARSER)
+    for element in soup(['script', 'style', 'noscript', 'template']):
+        element.decompose()
+    body = soup.body or soup
+    page_tokens = estimate_tokens(' '.join(body.get_text(' ').split()))
+    title = soup.find('h1')
+    title = ' '.join(title.get_text(' ').split()) if title is not None else ''
+
+    for element in body.find_all(REMOVED_TAGS):
+        element.decompose()
+    for element in body.find_all(True):
+        if not element.decomposed and element.name == 'header' and element.find_parent(('article', 'main')) is None:
+            element.decompose()
+        elif not element.decomposed and _is_unlikely(element):
+            element.decompose()
+
+    main = body.find('article') or body.find('main') or body.find(attrs={'role': 'main'})
+    if main is not None and len(main.get_text(' ', strip=True)) >= MIN_CONTENT_CHARS:
+        parts = [main]
+    else:
+        parts = _best_candidate(body)
+
+    text = '\n\n'.join(_block_text(part) for part in parts)
+    # The page heading often sits outside the article body
+    if title and title not in ' '.join(text.split()):
+        text = f"{title}\n\n{text}"
+    return text, page_tokens
+
+
+def compact_text(text, dedup_lines=False):
+    """
+    Normalizes whitespace and drops repeated blocks, keeping the first occurrence.
+
+    Tabs are kept and runs of spaces shrink to two spaces, so TSV and
+    column-aligned tables keep their columns.
+
+    Args:
+        text (str): Plain text, with blank lines between blocks.
+        dedup_lines (bool): Also drop repeated lines anywhere in the text, which
+            suits boilerplate extracted from HTML but not tables or lists.
+
+    Returns:
+        str: The compacted text.
+    """
+    text = INVISIBLE.sub('', text.replace('\r\n', '\n').replace('\r', '\n'))
+    blocks = []
+    current = []
+    for line in text.split('\n'):
+        # Collapse runs of spaces inside the line but keep its indentation
+        line = line.rstrip()
+        body = line.lstrip()
+        line = line[:len(line) - len(body)] + SPACES.sub(lambda m: ' ' if len(m.group()) == 1 else '  ', body)
+        if line.strip():
+            current.append(line)
+        elif current:
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+
+    seen_blocks = set()
+    seen_lines = set()
+    kept = []
+    for block in blocks:
+        key = '\n'.join(line.strip().lower() for line in block)
+        if key in seen_blocks:
+            continue
+        seen_blocks.add(key)
+        lines = []
+        for line in block:
+            line_key = line.strip().lower()
+            if dedup_lines and len(line_key) >= MIN_DEDUP_CHARS:
+                if line_key in seen_lines:
+                    continue
+                seen_lines.add(line_key)
+            lines.append(line)
+        if lines:
+            kept.append('\n'.join(lines))
+    return '\n\n'.join(kept)
+
+
+def compact_input(text):
+    """
+    Prepares input for the prompt: main-content extraction for HTML, then
+    whitespace normalization and duplicate removal.
+
+    Args:
+        text (str): The submitted text or HTML.
+
+    Returns:
+        tuple: (compacted text, stats with tokens_before, tokens_after and saved_percent)
+    """
+    html = looks_like_html(text)
+    if html:
+        # Savings are measured against the page's visible text, not its markup
+        content, tokens_before = extract_main_content(text)
+    else:
+        content, tokens_before = text, estimate_tokens(text)
+
+    # Only extracted pages repeat lines as boilerplate; in submitted text they are table rows and list items
+    compacted = compact_text(content, dedup_lines=html)
+    tokens_after = estimate_tokens(compacted)
+    return compacted, {
+        'html': html,
+        'tokens_before': tokens_before,
+        'tokens_after': tokens_after,
+        'saved_percent': round(100.0 * (tokens_before - tokens_after) / tokens_before, 1) if tokens_before else 0.0
+    }
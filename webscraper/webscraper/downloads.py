@@ -0,0 +1,88 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from werkzeug.http import parse_etags, parse_range_header, quote_etag
+
+
+# Artifact names never change content, so clients may keep them for a year without asking again
+IMMUTABLE = 'private, max-age=31536000, immutable'
+# Anything else is revalidated with its ETag on every use
+REVALIDATE = 'no-cache'
+
+
+def make_etag(digest):
+    """Strong ETag for a file's content digest"""
+    return quote_etag(digest[:32])
+
+
+def offload_header(mode, path, root, accel_prefix):
+    """The header that hands path to the front proxy, or None to serve it from Python
+
+    mode is "x-accel-redirect" (nginx: accel_prefix is an internal location
+    aliased to root) or "x-sendfile" (Apache mod_xsendfile, lighttpd).
+    """
+    if mode == 'x-accel-redirect':
+        relative = os.path.relpath(path, root).replace(os.sep, '/')
+        return 'X-Accel-Redirect', accel_prefix.rstrip('/') + '/' + quote(relative)
+    if mode == 'x-sendfile':
+        return 'X-Sendfile', os.path.abspath(path)
+    return None
+
+
+def content_disposition(filename):
+    """attachment header value, with an RFC 5987 filename* for names that are not plain ASCII"""
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(filename)}"
+    escaped = filename.replace('\\', '\\\\').replace('"', '\\"')
+    return f'attachment; filename="{escaped}"'
+
+
+def negotiate(request_headers, filename, size, digest, cache_control, offload=None):
+    """Return (status, headers, byte_range) for a download; byte_range is the (start, stop) to send, or None
+
+    With an offload header the proxy sends the file and serves any range itself.
+    """
+    etag = make_etag(digest)
+    headers = [('ETag', etag), ('Cache-Control', cache_control), ('Accept-Ranges', 'bytes')]
+
+    # If-None-Match uses the weak comparison, so W/ tags from a compressing proxy still match
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match and parse_etags(if_none_match).contains_weak(digest[:32]):
+        return 304, headers, None
+
+    headers += [('Content-Type', mimetypes.guess_type(filename)[0] or 'application/octet-stream'),
+                ('Content-Disposition', content_disposition(filename))]
+    if offload is not None:
+        return 200, headers + [offload], None
+
+    # A Range is only honoured while the file is still the one If-Range names
+    byte_range = request_headers.get('range')
+    if_range = request_headers.get('if-range')
+    if byte_range and (not if_range or if_range.strip() == etag):
+        parsed = parse_range_header(byte_range)
+        # Multiple ranges are answered with the whole file, which the spec allows
+        if parsed is not None and parsed.units == 'bytes' and len(parsed.ranges) == 1:
+            bounds = parsed.range_for_length(size)
+            if bounds is None:
+                return 416, headers + [('Content-Range', f'bytes */{size}'), ('Content-Length', '0')], None
+            start, stop = bounds
+            return 206, headers + [('Content-Range', f'bytes {start}-{stop - 1}/{size}'),
+                                   ('Content-Length', str(stop - start))], (start, stop)
+
+    return 200, headers + [('Content-Length', str(size))], (0, size)
+
+
+def read_range(path, start, stop, chunk_size):
+    """Yield bytes start to stop of a file in chunks; it is only opened once the body is read"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_local = threading.local()
+
+
+def make_session(pool_size=16):
+    """Create a Session whose keep-alive connection pool is sized for pool_size requests at once"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def shared_session():
+    """One pooled Session per thread, reused across calls"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = make_session()
+    return session
+
+
+class FetchResult:
+    def __init__(self, url, html=None, status=None, error=None, elapsed=0.0, attempts=0, text=None, cache=None):
+        self.url = url
+        self.html = html
+        # Parsed text saved by the HTTP cache, if any, and how the cache served the page
+        self.text = text
+        self.cache = cache
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+        self.attempts = attempts
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class Fetcher:
+    """Fetch many URLs concurrently over pooled keep-alive connections
+
+    At most max_in_flight requests run at once, and at most per_host of them
+    go to the same host. Failed requests are retried with exponential backoff
+    (honouring Retry-After), and results are yielded as soon as they complete.
+    With an HttpCache, fresh pages skip the network and stale ones are revalidated.
+    """
+
+    def __init__(self, max_in_flight=16, per_host=4, retries=3, backoff=0.5, timeout=10, session=None, cache=None):
+        self.max_in_flight = max_in_flight
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or make_session(max_in_flight)
+        self.cache = cache
+        self._lock = threading.Lock()
+        self.stats = {'pages': 0, 'failed': 0, 'bytes': 0, 'retries': 0, 'elapsed_seconds': 0.0}
+
+    def _fetch_one(self, url):
+        started = time.time()
+        if self.cache is not None:
+            page = self.cache.fresh(url)
+            if page is not None:
+                return FetchResult(url, page.html, 200, elapsed=time.time() - started, text=page.text, cache=page.status)
+        headers = self.cache.conditional_headers(url) if self.cache is not None else {}
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES and attempt <= self.retries:
+                    self._sleep_before_retry(attempt, response.headers.get('Retry-After'))
+                    continue
+                if response.status_code == 304 and self.cache is not None:
+                    page = self.cache.revalidated(url, response.headers)
+                    if page is not None:
+                        return FetchResult(url, page.html, 304, elapsed=time.time() - started, attempts=attempt,
+                                           text=page.text, cache=page.status)
+                if response.status_code == 304:
+                    # The cached copy went away after its validators were read; ask once more for the page
+                    if headers:
+                        headers = {}
+                        continue
+                    error = RuntimeError(f"An error occurred while fetching the URL: unexpected 304 for {url}")
+                    return FetchResult(url, status=304, error=error, elapsed=time.time() - started, attempts=attempt)
+                response.raise_for_status()
+                if self.cache is not None:
+                    self.cache.store(url, response.headers, response.text)
+                return FetchResult(url, response.text, response.status_code,
+                                   elapsed=time.time() - started, attempts=attempt, cache='miss' if self.cache is not None else None)
+            except requests.exceptions.MissingSchema:
+                error = ValueError(f"Invalid URL '{url}'. Include 'http://' or 'https://'.")
+                return FetchResult(url, error=error, elapsed=time.time() - started, attempts=attempt)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt <= self.retries:
+                    self._sleep_before_retry(attempt)
+                    continue
+                error = RuntimeError(f"An error occurred while fetching the URL: {e}")
+                return FetchResult(url, error=error, elapsed=time.time() - started, attempts=attempt)
+            except requests.exceptions.RequestException as e:
+                # General request exception (invalid response, HTTP error status, etc.)
+                status = e.response.status_code if e.response is not None else None
+                error = RuntimeError(f"An error occurred while fetching the URL: {e}")
+                return FetchResult(url, status=status, error=error, elapsed=time.time() - started, attempts=attempt)
+
+    def fetch(self, url):
+        """Fetch a single URL with the same retries and caching as fetch_all"""
+        result = self._fetch_one(url)
+        with self._lock:
+            if result.ok:
+                self.stats['pages'] += 1
+                self.stats['bytes'] += len(result.html)
+            else:
+                self.stats['failed'] += 1
+        return result
+
+    def _sleep_before_retry(self, attempt, retry_after=None):
+        with self._lock:
+            self.stats['retries'] += 1
+        delay = self.backoff * (2 ** (attempt - 1))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        time.sleep(delay + random.uniform(0, self.backoff))
+
+    def fetch_all(self, urls):
+        """Yield a FetchResult for every URL in completion order"""
+        started = time.time()
+        pending = defaultdict(deque)
+        hosts = []
+        for url in urls:
+            host = urlsplit(url).netloc
+            if host not in pending:
+                hosts.append(host)
+            pending[host].append(url)
+
+        host_in_flight = defaultdict(int)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='fetch') as executor:
+            while pending or running:
+                # Start as many requests as the global and per-host limits allow, round-robin over hosts
+                for host in list(hosts):
+                    while (len(running) < self.max_in_flight and host_in_flight[host] < self.per_host
+                           and pending.get(host)):
+                        url = pending[host].popleft()
+                        running[executor.submit(self._fetch_one, url)] = host
+                        host_in_flight[host] += 1
+                    if host in pending and not pending[host]:
+                        del pending[host]
+                        hosts.remove(host)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host = running.pop(future)
+                    host_in_flight[host] -= 1
+                    result = future.result()
+                    if result.ok:
+                        self.stats['pages'] += 1
+                        self.stats['bytes'] += len(result.html)
+                    else:
+                        self.stats['failed'] += 1
+                    self.stats['elapsed_seconds'] = time.time() - started
+                    yield result
+
+    def summary(self):
+        stats = dict(self.stats)
+        elapsed = stats['elapsed_seconds']
+        stats['pages_per_second'] = round(stats['pages'] / elapsed, 2) if elapsed > 0 else 0.0
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        if self.cache is not None:
+            stats['cache'] = self.cache.summary()
+        return stats
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from batch import percentile
+
+
+PRIMARY = 'primary'
+HEDGE = 'hedge'
+
+
+class Hedger:
+    """
+    Races a second request against a primary one that is slower than usual.
+
+    The primary attempt starts at once. If it has not finished by the given
+    percentile of recent primary latencies, a hedge attempt starts too. The
+    first result that passes accept() wins and the other attempt is told to
+    stop through its cancel event. When admit() says there is no capacity for
+    another request, the hedge is skipped and only the primary runs.
+
+    Args:
+        percentile (float): Percentile of primary latency to hedge after.
+        default_delay (float): Hedge delay in seconds until min_samples
+            latencies have been seen.
+        min_delay (float): The hedge never fires sooner than this.
+        window (int): How many recent primary latencies to keep.
+        min_samples (int): Latencies needed before the percentile is used.
+    """
+
+    def __init__(self, percentile=95, default_delay=5.0, min_delay=0.5, window=200, min_samples=20):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'fired': 0, 'skipped': 0, 'hedge_wins': 0, 'primary_wins': 0, 'cancelled': 0,
+                      'failed': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def delay(self):
+        """Seconds to wait for the primary before hedging"""
+        with self._lock:
+            latencies = list(self._latencies)
+        if len(latencies) < self.min_samples:
+            return max(self.min_delay, self.default_delay)
+        return max(self.min_delay, percentile(latencies, self.percentile))
+
+    def observe(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def run(self, attempt, accept, executor, admit=None):
+        """
+        Runs attempt(which, cancelled) for PRIMARY and, if it is slow, for HEDGE.
+
+        attempt should check the cancelled event as it goes and return early
+        once it is set. The first result accept() approves is returned. If
+        none is approved, the last result is returned so the caller can still
+        try to salvage it. If both attempts raise, the primary's error is
+        raised. admit(), if given, is asked before the hedge starts.
+        """
+        self._count('calls')
+        cancel = {PRIMARY: threading.Event(), HEDGE: threading.Event()}
+        started = time.monotonic()
+        futures = {executor.submit(attempt, PRIMARY, cancel[PRIMARY]): PRIMARY}
+        done, _ = wait(futures, timeout=self.delay())
+        if not done:
+            if admit is None or admit():
+                self._count('fired')
+                futures[executor.submit(attempt, HEDGE, cancel[HEDGE])] = HEDGE
+            else:
+                self._count('skipped')
+
+        pending = set(futures)
+        errors = {}
+        fallback = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                which = futures[future]
+                if which == PRIMARY:
+                    self.observe(time.monotonic() - started)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[which] = e
+                    continue
+                if not accept(result):
+                    fallback = result
+                    continue
+                for other in pending:
+                    loser = futures[other]
+                    cancel[loser].set()
+                    other.cancel()
+                    self._count('cancelled')
+                    if loser == PRIMARY:
+                        # The primary took at least this long; keep the delay from drifting down
+                        self.observe(time.monotonic() - started)
+                self._count('primary_wins' if which == PRIMARY else 'hedge_wins')
+                return result
+
+        if fallback is not None:
+            return fallback
+        self._count('failed')
+        raise errors.get(PRIMARY) or errors[HEDGE]
+
+    async def run_async(self, attempt, accept, admit=None):
+        """Like run(), for a coroutine function attempt(which); the losing attempt is cancelled outright"""
+        self._count('calls')
+        started = time.monotonic()
+        tasks = {asyncio.ensure_future(attempt(PRIMARY)): PRIMARY}
+        done, _ = await asyncio.wait(tasks, timeout=self.delay())
+        if not done:
+            if admit is None or admit():
+                self._count('fired')
+                tasks[asyncio.ensure_future(attempt(HEDGE))] = HEDGE
+            else:
+                self._count('skipped')
+
+        pending = set(tasks)
+        errors = {}
+        fallback = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    which = tasks[task]
+                    if which == PRIMARY:
+                        self.observe(time.monotonic() - started)
+                    if task.exception() is not None:
+                        errors[which] = task.exception()
+                        continue
+                    if not accept(task.result()):
+                        fallback = task.result()
+                        continue
+                    for other in pending:
+                        self._count('cancelled')
+                        if tasks[other] == PRIMARY:
+                            self.observe(time.monotonic() - started)
+                    self._count('primary_wins' if which == PRIMARY else 'hedge_wins')
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if fallback is not None:
+            return fallback
+        self._count('failed')
+        raise errors.get(PRIMARY) or errors[HEDGE]
+
+    def summary(self):
+        with self._lock:
+            summary = dict(self.stats)
+            samples = len(self._latencies)
+        summary['samples'] = samples
+        summary['delay_seconds'] = round(self.delay(), 3)
+        summary['hedge_rate'] = round(summary['fired'] / summary['calls'], 4) if summary['calls'] else 0.0
+        summary['hedge_win_rate'] = round(summary['hedge_wins'] / summary['fired'], 4) if summary['fired'] else 0.0
+        return summary
@@ -0,0 +1,169 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+
+def parse_cache_control(value: str) -> dict:
+    """
+    Parses a Cache-Control header into a dict of directives.
+
+    Args:
+        value (str): The header value, e.g. 'public, max-age=600'.
+
+    Returns:
+        dict: Directive names mapped to their value (or True when valueless).
+    """
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else True
+    return directives
+
+
+class CachedPage:
+    def __init__(self, url, html, text=None, status='miss'):
+        self.url = url
+        self.html = html
+        self.text = text
+        # 'fresh' (served without a request), 'revalidated' (304) or 'miss'
+        self.status = status
+
+
+class HttpCache:
+    """
+    On-disk HTTP response cache for the scraper, keyed by URL.
+
+    Bodies are stored compressed in SQLite with their ETag and Last-Modified
+    validators and Cache-Control max-age. Fresh entries are served without a
+    request, stale ones are revalidated with If-None-Match/If-Modified-Since,
+    and the parsed text is kept next to the HTML so a hit skips parsing too.
+    The least recently used entries are evicted once max_bytes is exceeded.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {'fresh': 0, 'revalidated': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    max_age REAL,
+                    fetched REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    body BLOB NOT NULL,
+                    text BLOB,
+                    size INTEGER NOT NULL
+                )
+            """)
+
+    def _row(self, url):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT etag, last_modified, max_age, fetched, body, text FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _page(self, url, row, status):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE url = ?", (time.time(), url))
+            self.stats[status] += 1
+        text = zlib.decompress(row[5]).decode('utf-8') if row[5] is not None else None
+        return CachedPage(url, zlib.decompress(row[4]).decode('utf-8'), text, status)
+
+    def fresh(self, url: str):
+        """Return the cached page if its max-age has not run out, without any request"""
+        row = self._row(url)
+        if row is None or not row[2] or time.time() - row[3] >= row[2]:
+            return None
+        return self._page(url, row, 'fresh')
+
+    def conditional_headers(self, url: str) -> dict:
+        """Validators to send so the server can answer 304 Not Modified"""
+        row = self._row(url)
+        headers = {}
+        if row is not None:
+            if row[0]:
+                headers['If-None-Match'] = row[0]
+            if row[1]:
+                headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def revalidated(self, url: str, response_headers):
+        """Handle a 304: refresh the entry's freshness and return the cached page"""
+        row = self._row(url)
+        if row is None:
+            return None
+        max_age = self._max_age(response_headers)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET fetched = ?, max_age = COALESCE(?, max_age) WHERE url = ?",
+                (time.time(), max_age, url)
+            )
+        return self._page(url, row, 'revalidated')
+
+    def _max_age(self, response_headers):
+        directives = parse_cache_control(response_headers.get('Cache-Control'))
+        if 'no-cache' in directives:
+            return 0
+        match = re.match(r'^\d+$', str(directives.get('s-maxage') or directives.get('max-age') or ''))
+        return float(match.group(0)) if match else None
+
+    def store(self, url: str, response_headers, html: str):
+        """Cache a full 200 response unless it forbids storing or cannot be reused"""
+        directives = parse_cache_control(response_headers.get('Cache-Control'))
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        max_age = self._max_age(response_headers)
+        with self._lock:
+            self.stats['misses'] += 1
+        if 'no-store' in directives or not (etag or last_modified or max_age):
+            return
+
+        body = zlib.compress(html.encode('utf-8'))
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, last_modified, max_age, fetched, accessed, body, text, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+                (url, etag, last_modified, max_age, now, now, body, len(body))
+            )
+        self._evict()
+
+    def save_text(self, url: str, text: str):
+        """Keep the parsed text with the cached HTML so later hits skip parsing"""
+        data = zlib.compress(text.encode('utf-8'))
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET text = ?, size = size + ? WHERE url = ? AND text IS NULL",
+                               (data, len(data), url))
+
+    def _evict(self):
+        with self._lock, self._conn:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for url, size in self._conn.execute("SELECT url, size FROM responses ORDER BY accessed"):
+                if total <= self.max_bytes:
+                    break
+                victims.append((url,))
+                total -= size
+            self._conn.executemany("DELETE FROM responses WHERE url = ?", victims)
+            self.stats['evictions'] += len(victims)
+
+    def summary(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            stats = dict(self.stats)
+        stats.update(entries=entries, bytes=total)
+        return stats
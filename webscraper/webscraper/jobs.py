@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+# Job lifecycle states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+FINISHED_STATES = (DONE, FAILED)
+
+
+class JobStore:
+    """SQLite-backed store for job state so jobs survive a process restart"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+
+    def create(self, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, stage, payload, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, QUEUED, json.dumps(payload), now, now)
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        if 'result' in fields and fields['result'] is not None:
+            fields['result'] = json.dumps(fields['result'])
+        fields['updated'] = time.time()
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def unfinished(self):
+        """Return the ids of jobs that were queued or running when the process stopped"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row['id'] for row in rows]
+
+
+class JobManager:
+    """Runs submitted jobs on a bounded worker pool and records each stage in the store"""
+
+    def __init__(self, store, runner, max_workers=4):
+        # runner(payload, report) does the work; report(stage) records progress
+        self.store = store
+        self.runner = runner
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job-worker')
+
+    def submit(self, payload):
+        job_id = self.store.create(payload)
+        self.executor.submit(self._run, job_id)
+        return job_id
+
+    def resume_pending(self):
+        """Requeue jobs left unfinished by a previous process"""
+        pending = self.store.unfinished()
+        for job_id in pending:
+            self.store.update(job_id, status=QUEUED, stage=QUEUED)
+            self.executor.submit(self._run, job_id)
+        if pending:
+            logger.info(f"Resumed {len(pending)} unfinished job(s)")
+        return len(pending)
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+
+        def report(stage):
+            self.store.update(job_id, stage=stage)
+
+        self.store.update(job_id, status=RUNNING, stage=RUNNING)
+        try:
+            result = self.runner(job['payload'], report)
+            self.store.update(job_id, status=DONE, stage=DONE, result=result)
+        except Exception as e:
+            logger.exception(f"Error in job {job_id}: {str(e)}")
+            self.store.update(job_id, status=FAILED, stage=FAILED, error=str(e))
+
+    def events(self, job_id, poll_interval=0.5, timeout=600):
+        """Yield Server-Sent Events for every stage change until the job finishes"""
+        last_stage = None
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = self.store.get(job_id)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+                return
+            if job['stage'] != last_stage:
+                last_stage = job['stage']
+                data = {'id': job_id, 'status': job['status'], 'stage': job['stage']}
+                if job['error']:
+                    data['error'] = job['error']
+                yield f"event: progress\ndata: {json.dumps(data)}\n\n"
+            if job['status'] in FINISHED_STATES:
+                return
+            time.sleep(poll_interval)
@@ -0,0 +1,298 @@
+import json
+import re
+
+
+_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_LITERALS = {'true': True, 'false': False, 'null': None, 'True': True, 'False': False, 'None': None}
+_CLOSERS = ',}]:'
+_WHITESPACE = re.compile(r'\s*')
+# Runs of string characters that need no special handling, per quote style
+_PLAIN = {'"': re.compile(r'[^"\\\n\r\t]+'), "'": re.compile(r"[^'\\\n\r\t]+")}
+
+# Stands in for a value that was cut off before any of it could be read
+_MISSING = object()
+
+
+class RepairResult:
+    def __init__(self, value, complete, repairs):
+        self.value = value
+        # False when the text ended before the top-level object was closed
+        self.complete = complete
+        # Short descriptions of everything that had to be fixed up
+        self.repairs = repairs
+
+    @property
+    def repaired(self):
+        return bool(self.repairs) or not self.complete
+
+
+class _Repairer:
+    """Recursive-descent JSON reader that keeps going where json.loads gives up
+
+    Values cut off by the end of the text are dropped, but the complete members
+    of the objects and arrays around them are kept. Trailing and missing
+    commas, missing colons, single quotes, raw newlines and unescaped quotes in
+    strings, Python literals and bare words are fixed up and recorded.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.repairs = []
+
+    def _skip_whitespace(self):
+        self.pos = _WHITESPACE.match(self.text, self.pos).end()
+
+    def _peek(self):
+        self._skip_whitespace()
+        return self.text[self.pos] if self.pos < len(self.text) else ''
+
+    def value(self):
+        """Return (value, complete); value is _MISSING if nothing usable was read"""
+        ch = self._peek()
+        if not ch:
+            return _MISSING, False
+        if ch == '{':
+            return self._object()
+        if ch == '[':
+            return self._array()
+        if ch in '"\'':
+            return self._string()
+        match = _NUMBER.match(self.text, self.pos)
+        if match:
+            end = match.end()
+            if end == len(self.text):
+                # A number at the very end may have been cut short
+                return _MISSING, False
+            self.pos = end
+            literal = match.group(0)
+            return (float(literal) if any(c in literal for c in '.eE') else int(literal)), True
+        word = self._bare_word()
+        if word in _LITERALS:
+            if word not in ('true', 'false', 'null'):
+                self.repairs.append(f'python literal {word}')
+            return _LITERALS[word], True
+        if self.pos >= len(self.text):
+            return _MISSING, False
+        if not word:
+            if self.text[self.pos] in ',}]':
+                # Nothing between the colon and the next delimiter
+                self.repairs.append('missing value')
+                return _MISSING, True
+            # A stray character that cannot start a value
+            self.repairs.append(f'unexpected {self.text[self.pos]!r}')
+            self.pos += 1
+            return self.value()
+        self.repairs.append('unquoted string')
+        return word, True
+
+    def _bare_word(self):
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] not in _CLOSERS + '\n{["\'':
+            self.pos += 1
+        return self.text[start:self.pos].strip()
+
+    def _string(self):
+        quote = self.text[self.pos]
+        if quote == "'":
+            self.repairs.append('single-quoted string')
+        self.pos += 1
+        plain = _PLAIN[quote]
+        chars = []
+        while self.pos < len(self.text):
+            run = plain.match(self.text, self.pos)
+            if run:
+                chars.append(run.group(0))
+                self.pos = run.end()
+                continue
+            ch = self.text[self.pos]
+            self.pos += 1
+            if ch == '\\':
+                if self.pos >= len(self.text):
+                    break
+                escape = self.text[self.pos]
+                self.pos += 1
+                if escape == 'u':
+                    digits = self.text[self.pos:self.pos + 4]
+                    if len(digits) < 4:
+                        break
+                    try:
+                        chars.append(chr(int(digits, 16)))
+                    except ValueError:
+                        self.repairs.append('bad unicode escape')
+                        chars.append('\\u' + digits)
+                    self.pos += 4
+                else:
+                    chars.append({'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}.get(escape, escape))
+            elif ch == quote:
+                # A quote followed by anything but a delimiter or line break is part of the text
+                after = self.pos
+                while after < len(self.text) and self.text[after] in ' \t':
+                    after += 1
+                if after < len(self.text) and self.text[after] not in _CLOSERS + '\r\n':
+                    self.repairs.append('unescaped quote')
+                    chars.append(ch)
+                    continue
+                return ''.join(chars), True
+            else:
+                if ch in '\n\r\t':
+                    self.repairs.append('raw control character in string')
+                chars.append(ch)
+        return _MISSING, False
+
+    def _object(self):
+        self.pos += 1
+        result = {}
+        while True:
+            ch = self._peek()
+            if not ch:
+                return result, False
+            if ch == '}':
+                self.pos += 1
+                return result, True
+            if ch == ']':
+                self.repairs.append('mismatched bracket')
+                self.pos += 1
+                return result, True
+            if ch == ',':
+                self.repairs.append('extra comma')
+                self.pos += 1
+                continue
+
+            if ch in '"\'':
+                key, complete = self._string()
+            else:
+                key = self._bare_word()
+                complete = self.pos < len(self.text)
+                if key:
+                    self.repairs.append('unquoted key')
+            if not complete:
+                return result, False
+            if not key and self._peek() != ':':
+                self.repairs.append(f'unexpected {self._peek()!r}')
+                self.pos += 1
+                continue
+
+            if self._peek() == ':':
+                self.pos += 1
+            elif self._peek():
+                self.repairs.append('missing colon')
+            value, complete = self.value()
+            if value is not _MISSING and (complete or isinstance(value, (dict, list))):
+                result[key] = value
+            if not complete:
+                return result, False
+
+            ch = self._peek()
+            if ch == ',':
+                self.pos += 1
+                if self._peek() == '}':
+                    self.repairs.append('trailing comma')
+            elif ch and ch not in '}]':
+                self.repairs.append('missing comma')
+
+    def _array(self):
+        self.pos += 1
+        result = []
+        while True:
+            ch = self._peek()
+            if not ch:
+                return result, False
+            if ch == ']':
+                self.pos += 1
+                return result, True
+            if ch == '}':
+                self.repairs.append('mismatched bracket')
+                self.pos += 1
+                return result, True
+            if ch == ',':
+                self.repairs.append('extra comma')
+                self.pos += 1
+                continue
+
+            value, complete = self.value()
+            if value is not _MISSING and (complete or isinstance(value, (dict, list))):
+                result.append(value)
+            if not complete:
+                return result, False
+
+            ch = self._peek()
+            if ch == ',':
+                self.pos += 1
+                if self._peek() == ']':
+                    self.repairs.append('trailing comma')
+            elif ch and ch not in '}]':
+                self.repairs.append('missing comma')
+
+
+def repair_json(text):
+    """
+    Parses model output as JSON, salvaging as much as possible.
+
+    Args:
+        text (str): The response text, starting at or before the JSON object.
+
+    Returns:
+        RepairResult: The parsed value (None if nothing could be read), whether
+        the object was complete, and the repairs that were needed.
+    """
+    start = text.find('{')
+    if start < 0:
+        return RepairResult(None, False, ['no JSON object'])
+    try:
+        value, end = json.JSONDecoder().raw_decode(text, start)
+        return RepairResult(value, True, [])
+    except json.JSONDecodeError:
+        pass
+
+    repairer = _Repairer(text)
+    repairer.pos = start
+    value, complete = repairer.value()
+    return RepairResult(None if value is _MISSING else value, complete, repairer.repairs)
+
+
+def _clean_item(item):
+    if not isinstance(item, dict):
+        return None
+    item_type = item.get('type')
+    if item_type in ('paragraph', 'heading') or 'level' in item:
+        return item if isinstance(item.get('text'), str) and item['text'] else None
+    if item_type in ('bullet_list', 'numbered_list'):
+        items = [entry for entry in item.get('items', []) if isinstance(entry, str) and entry]
+        return dict(item, items=items) if items else None
+    if item_type == 'table':
+        headers = item.get('headers')
+        rows = [row for row in item.get('rows', []) if isinstance(row, list) and row]
+        if isinstance(headers, list) and headers and rows:
+            return dict(item, rows=rows)
+    return None
+
+
+def salvage_structure(value):
+    """
+    Keeps every complete section and content item of repaired structured content.
+
+    Args:
+        value: The parsed (possibly partial) response.
+
+    Returns:
+        dict: Structured content with whatever title and sections survived, or
+        None if no section did.
+    """
+    if not isinstance(value, dict):
+        return None
+    sections = []
+    for section in value.get('sections', []) if isinstance(value.get('sections'), list) else []:
+        if not isinstance(section, dict) or not isinstance(section.get('heading'), str):
+            continue
+        content = [item for item in map(_clean_item, section.get('content', []) or []) if item is not None]
+        level = section.get('level', 1)
+        sections.append({
+            'heading': section['heading'],
+            'level': level if isinstance(level, int) else 1,
+            'content': content
+        })
+    if not sections:
+        return None
+    title = value.get('title')
+    return {'title': title if isinstance(title, str) and title else None, 'sections': sections}
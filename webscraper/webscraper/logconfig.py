@@ -0,0 +1,65 @@
+import contextvars
+import functools
+import json
+import logging
+import sys
+import time
+
+
+# The id of the request (or job) the current thread is working for
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `fields` passed in extra merged in"""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level='INFO', fmt='text'):
+    """
+    Sends log records to stdout, tagged with the current request id.
+
+    Args:
+        level (str): Minimum level; DEBUG also logs full document contents.
+        fmt (str): 'text' for human-readable lines or 'json' for one JSON object per line.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+
+
+def bind_request_id(fn):
+    """Wrap fn so it logs under the caller's request id when run on another thread"""
+    request_id = request_id_var.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = request_id_var.set(request_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            request_id_var.reset(token)
+    return wrapper
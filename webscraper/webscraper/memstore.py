@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryArtifactStore:
+    """Size-bounded in-memory store for rendered files with TTL eviction
+
+    Entries pushed out to make room or past their TTL are handed to the
+    spill callback so they can still be served from disk afterwards, and are
+    served from memory until that write has finished. Expiry is lazy: it is
+    checked when the store is used. Each entry's SHA-256 digest is taken
+    once, when it is stored.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=3600, spill=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill = spill
+        self._entries = OrderedDict()
+        # Evicted entries whose spill to disk is still being written
+        self._spilling = {}
+        self._lock = threading.Lock()
+        self.size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'expired': 0, 'spilled': 0}
+
+    def put(self, name, data):
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if name in self._entries:
+                self.size -= len(self._entries.pop(name)[0])
+            self._entries[name] = (data, time.time(), digest)
+            self.size += len(data)
+            self.stats['stores'] += 1
+            spilled = self._expire()
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                old_name = next(iter(self._entries))
+                spilled.append(self._evict(old_name))
+        self._spill(spilled)
+
+    def get(self, name):
+        """Return the data, or None if it is not in memory; an expired entry is spilled first"""
+        entry = self._lookup(name)
+        return entry[0] if entry is not None else None
+
+    def describe(self, name):
+        """Return (data, digest), or None like get()"""
+        entry = self._lookup(name)
+        return (entry[0], entry[2]) if entry is not None else None
+
+    def _lookup(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            expired = entry is not None and time.time() - entry[1] >= self.ttl
+            if entry is not None and not expired:
+                self._entries.move_to_end(name)
+                self.stats['hits'] += 1
+                return entry
+            if entry is None and name in self._spilling:
+                self.stats['hits'] += 1
+                return self._spilling[name]
+            self.stats['misses'] += 1
+            if not expired:
+                return None
+            spilled = [self._take_expired(name)]
+        self._spill(spilled)
+        return None
+
+    def contains(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return name in self._spilling
+            if time.time() - entry[1] < self.ttl:
+                return True
+            spilled = [self._take_expired(name)]
+        self._spill(spilled)
+        return False
+
+    def _spill(self, entries):
+        # Called outside the lock so disk writes do not block other requests
+        for name, entry in entries:
+            try:
+                if self.spill:
+                    self.spill(name, entry[0])
+            finally:
+                with self._lock:
+                    if self._spilling.get(name) is entry:
+                        del self._spilling[name]
+
+    def _evict(self, name):
+        entry = self._entries.pop(name)
+        self.size -= len(entry[0])
+        self.stats['spilled'] += 1
+        if self.spill:
+            self._spilling[name] = entry
+        return name, entry
+
+    def _take_expired(self, name):
+        self.stats['expired'] += 1
+        return self._evict(name)
+
+    def _expire(self):
+        now = time.time()
+        expired = [name for name, (_, created, _) in self._entries.items() if now - created >= self.ttl]
+        return [self._take_expired(name) for name in expired]
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(entries=len(self._entries), bytes=self.size, max_bytes=self.max_bytes)
+        return stats
@@ -0,0 +1,198 @@
+import importlib.util
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+
+# python-docx's own blank document supplies the styles (Title, Heading 1-9,
+# List Bullet, List Number, Table Grid), numbering and section settings, so
+# documents written here look the same as the ones create_document builds.
+# It is located without importing python-docx, which is slow to import.
+TEMPLATE_PATH = os.path.join(importlib.util.find_spec('docx').submodule_search_locations[0],
+                             'templates', 'default.docx')
+DOCUMENT_PART = 'word/document.xml'
+
+# Text width of the template's page (12240 twips wide with 1800 twip margins)
+TEXT_WIDTH_TWIPS = 12240 - 1800 - 1800
+
+FLUSH_BYTES = 64 * 1024
+
+# Characters XML 1.0 does not allow, which python-docx would reject as well
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _load_template():
+    with zipfile.ZipFile(TEMPLATE_PATH) as template:
+        document_xml = template.read(DOCUMENT_PART).decode('utf-8')
+    body_start = document_xml.index('<w:body>') + len('<w:body>')
+    sect_start = document_xml.index('<w:sectPr')
+    return document_xml[:body_start], document_xml[sect_start:]
+
+
+def _runs(text):
+    """Build run XML for text, turning tabs and newlines into w:tab and w:br like python-docx"""
+    text = _INVALID_XML.sub('', str(text))
+    parts = []
+    for piece in re.split(r'(\t|\n)', text.replace('\r\n', '\n').replace('\r', '\n')):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece == '\n':
+            parts.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if piece != piece.strip() else ''
+            parts.append(f'<w:t{space}>{escape(piece)}</w:t>')
+    if not parts:
+        return ''
+    return f"<w:r>{''.join(parts)}</w:r>"
+
+
+def _paragraph(text, style=None, center=False):
+    props = ''
+    if style or center:
+        props = '<w:pPr>'
+        if style:
+            props += f'<w:pStyle w:val="{style}"/>'
+        if center:
+            props += '<w:jc w:val="center"/>'
+        props += '</w:pPr>'
+    return f'<w:p>{props}{_runs(text)}</w:p>'
+
+
+def _heading(text, level):
+    return _paragraph(text, 'Title' if level == 0 else f'Heading{level}')
+
+
+class _Writer:
+    """Buffers XML fragments and flushes them to the zip entry in large writes"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.parts = []
+        self.size = 0
+
+    def write(self, xml):
+        self.parts.append(xml)
+        self.size += len(xml)
+        if self.size >= FLUSH_BYTES:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.stream.write(''.join(self.parts).encode('utf-8'))
+            self.parts = []
+            self.size = 0
+
+
+def _write_table(writer, headers, rows):
+    columns = len(headers)
+    width = TEXT_WIDTH_TWIPS // columns
+    cell_props = f'<w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>'
+
+    def row_xml(values):
+        cells = []
+        for i in range(columns):
+            value = values[i] if i < len(values) else None
+            content = _runs(value) if value is not None else ''
+            cells.append(f'<w:tc>{cell_props}<w:p>{content}</w:p></w:tc>')
+        return f"<w:tr>{''.join(cells)}</w:tr>"
+
+    grid = f'<w:gridCol w:w="{width}"/>' * columns
+    writer.write(
+        '<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:type="auto" w:w="0"/>'
+        '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+        'w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr>'
+        f'<w:tblGrid>{grid}</w:tblGrid>'
+    )
+    writer.write(row_xml(headers))
+    # Each row costs the same no matter how big the table already is
+    for row_data in rows:
+        if isinstance(row_data, list) and row_data:
+            writer.write(row_xml(row_data))
+    writer.write('</w:tbl>')
+
+
+def _write_content_item(writer, content_item):
+    content_type = content_item.get('type', '')
+
+    if content_type == 'heading' or 'level' in content_item:
+        heading_text = content_item.get('text', '')
+        heading_level = content_item.get('level', 2)
+        if not isinstance(heading_level, int):
+            heading_level = 2
+        if heading_text:
+            writer.write(_heading(heading_text, max(0, min(9, heading_level))))
+
+    elif content_type == 'paragraph':
+        text = content_item.get('text', '')
+        if text:
+            paragraphs = text.split('\r\n') if '\r\n' in text else text.split('\n')
+            for para in paragraphs:
+                if para.strip():
+                    # Short lines ending in ':' become subheadings, as in create_document
+                    if len(para) < 50 and para.endswith(':'):
+                        writer.write(_heading(para, 2))
+                    else:
+                        writer.write(_paragraph(para))
+
+    elif content_type == 'bullet_list':
+        for item in content_item.get('items', []):
+            if item:
+                writer.write(_paragraph(item, 'ListBullet'))
+
+    elif content_type == 'numbered_list':
+        for item in content_item.get('items', []):
+            if item:
+                writer.write(_paragraph(item, 'ListNumber'))
+
+    elif content_type == 'table':
+        headers = content_item.get('headers', [])
+        rows = content_item.get('rows', [])
+        if headers and rows:
+            _write_table(writer, headers, rows)
+
+
+def write_document(structured_content, output):
+    """Stream structured content into a DOCX at output (a path or binary file object)
+
+    Produces the same headings, bullet lists and Table Grid tables as
+    create_document, but writes document.xml straight into the zip, so
+    memory stays bounded and every table row costs the same.
+    """
+    document_head, document_tail = _load_template()
+
+    with zipfile.ZipFile(TEMPLATE_PATH) as template, \
+            zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as package:
+        for entry in template.infolist():
+            if entry.filename != DOCUMENT_PART:
+                package.writestr(entry, template.read(entry.filename))
+
+        with package.open(DOCUMENT_PART, 'w', force_zip64=True) as stream:
+            writer = _Writer(stream)
+            writer.write(document_head)
+            writer.write(_paragraph(structured_content.get('title', 'Document'), 'Title', center=True))
+
+            for section in structured_content.get('sections', []):
+                level = section.get('level', 1)
+                level = max(1, min(9, level if isinstance(level, int) else 1))
+                writer.write(_heading(section.get('heading', 'Section'), level))
+
+                for content_item in section.get('content', []):
+                    if isinstance(content_item, dict):
+                        _write_content_item(writer, content_item)
+
+            writer.write(document_tail)
+            writer.flush()
+
+    return True
+
+
+def count_table_rows(structured_content):
+    """Total number of table rows in the document, used to pick a renderer"""
+    total = 0
+    for section in structured_content.get('sections', []):
+        for content_item in section.get('content', []):
+            if isinstance(content_item, dict) and content_item.get('type') == 'table':
+                rows = content_item.get('rows', [])
+                total += len(rows) if isinstance(rows, list) else 0
+    return total
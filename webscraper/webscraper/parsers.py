@@ -0,0 +1,131 @@
+import os
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml is optional; fall back to the pure-Python backends
+    etree = None
+    lxml_html = None
+
+
+# Elements whose content is never visible text
+SKIPPED_TAGS = ('script', 'style')
+
+
+def collapse_whitespace(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def parse_soup(html: str) -> str:
+    """
+    Extracts visible text by building a full BeautifulSoup tree (the original backend).
+
+    Args:
+        html (str): Raw HTML content of the webpage.
+
+    Returns:
+        str: Cleaned text extracted from the page.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove scripts, styles, and comments
+    for element in soup(list(SKIPPED_TAGS)):
+        element.decompose()
+
+    # Extract visible text
+    text = soup.get_text(separator=' ', strip=True)
+
+    # Collapse multiple spaces
+    return collapse_whitespace(text)
+
+
+def parse_lxml(html: str) -> str:
+    """
+    Extracts visible text with lxml's C parser, which is several times faster
+    than building a BeautifulSoup tree on large pages.
+
+    Args:
+        html (str): Raw HTML content of the webpage.
+
+    Returns:
+        str: Cleaned text extracted from the page.
+    """
+    if not html.strip():
+        return ''
+    try:
+        root = lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        # lxml refuses strings with an encoding declaration; hand it bytes instead
+        root = lxml_html.document_fromstring(html.encode('utf-8'))
+
+    # Empty scripts and styles but keep them, so the text on either side stays a separate
+    # string as it does in the other backends; itertext already skips comments
+    for element in list(root.iter(*SKIPPED_TAGS)):
+        element.clear(keep_tail=True)
+
+    return collapse_whitespace(' '.join(root.itertext()))
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def parse_stream(html: str) -> str:
+    """
+    Extracts visible text with a tokenizer, without building a tree, so
+    memory stays proportional to the text rather than the markup.
+
+    Args:
+        html (str): Raw HTML content of the webpage.
+
+    Returns:
+        str: Cleaned text extracted from the page.
+    """
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return collapse_whitespace(' '.join(extractor.parts))
+
+
+PARSERS = {
+    'soup': parse_soup,
+    'stream': parse_stream,
+}
+if lxml_html is not None:
+    PARSERS['lxml'] = parse_lxml
+
+DEFAULT_PARSER = os.getenv('SCRAPER_PARSER', 'lxml' if 'lxml' in PARSERS else 'soup')
+
+
+def get_parser(name: str = None):
+    """
+    Looks up a parser backend by name.
+
+    Args:
+        name (str): 'lxml', 'stream' or 'soup'; defaults to SCRAPER_PARSER or lxml when installed.
+
+    Returns:
+        callable: A function taking HTML and returning its visible text.
+    """
+    name = name or DEFAULT_PARSER
+    if name not in PARSERS:
+        raise ValueError(f"Unknown parser '{name}'. Choose from: {', '.join(sorted(PARSERS))}")
+    return PARSERS[name]
@@ -0,0 +1,325 @@
+import atexit
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+logger = logging.getLogger(__name__)
+
+
+def find_soffice():
+    """Locate the LibreOffice binary, honouring SOFFICE_PATH"""
+    configured = os.getenv("SOFFICE_PATH")
+    if configured:
+        return configured if os.path.exists(configured) else None
+    for name in ('soffice', 'libreoffice'):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def free_port():
+    """An ephemeral port nothing is listening on right now"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ConversionTimeout(Exception):
+    pass
+
+
+class SofficeWorker:
+    """One long-lived headless LibreOffice instance with its own profile
+
+    When LibreOffice's Python bridge (uno) is importable the instance stays
+    running and documents are converted over a UNO socket. Otherwise each
+    batch is converted with a --convert-to call that reuses the worker's
+    already-initialized profile, which still avoids most of the cold start.
+    """
+
+    def __init__(self, index, soffice_path, port, profile_root):
+        self.index = index
+        self.soffice_path = soffice_path
+        # Without a fixed port each start picks a free one, so processes never collide
+        self.fixed_port = port
+        self.port = port
+        self.profile_dir = os.path.join(profile_root, f"worker_{index}")
+        self.process = None
+        self.desktop = None
+        self.conversions = 0
+        try:
+            import uno  # noqa: F401
+            self.use_uno = True
+        except ImportError:
+            self.use_uno = False
+
+    def _profile_arg(self):
+        return f"-env:UserInstallation=file://{os.path.abspath(self.profile_dir)}"
+
+    def start(self, timeout=30):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if not self.use_uno:
+            return
+        self.port = self.fixed_port or free_port()
+        self.process = subprocess.Popen(
+            [self.soffice_path, self._profile_arg(), '--headless', '--invisible', '--nologo',
+             '--norestore', '--nodefault', f'--accept=socket,host=127.0.0.1,port={self.port};urp;'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.desktop = self._connect(timeout)
+
+    def _connect(self, timeout):
+        import uno
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context)
+        deadline = time.time() + timeout
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext")
+                return context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+            except Exception:
+                if time.time() > deadline or (self.process and self.process.poll() is not None):
+                    raise RuntimeError(f"LibreOffice worker {self.index} did not start")
+                time.sleep(0.25)
+
+    def stop(self):
+        self.desktop = None
+        if self.process is not None:
+            self.process.kill()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                pass
+            self.process = None
+
+    def restart(self):
+        self.stop()
+        self.conversions = 0
+        self.start()
+
+    def convert_batch(self, tasks, timeout):
+        """Convert [(docx_path, pdf_path), ...] in one round-trip; returns a list of errors (None on success)"""
+        if self.use_uno:
+            return self._convert_uno(tasks, timeout)
+        return self._convert_cli(tasks, timeout)
+
+    def _convert_uno(self, tasks, timeout):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def prop(name, value):
+            value_prop = PropertyValue()
+            value_prop.Name = name
+            value_prop.Value = value
+            return value_prop
+
+        errors = []
+        for docx_path, pdf_path in tasks:
+            # A hung conversion cannot be interrupted over UNO, so kill the instance instead
+            watchdog = threading.Timer(timeout, self.stop)
+            watchdog.start()
+            try:
+                document = self.desktop.loadComponentFromURL(
+                    uno.systemPathToFileUrl(os.path.abspath(docx_path)), "_blank", 0, (prop("Hidden", True),))
+                try:
+                    document.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                                        (prop("FilterName", "writer_pdf_Export"),))
+                finally:
+                    document.close(True)
+                errors.append(None)
+            except Exception as e:
+                if self.process is None:
+                    errors.append(ConversionTimeout(f"Conversion of {docx_path} timed out after {timeout}s"))
+                    try:
+                        self.start()
+                    except Exception as start_error:
+                        # Keep the results so far; the rest of the batch has no instance to run on
+                        self.stop()
+                        errors += [start_error] * (len(tasks) - len(errors))
+                        break
+                else:
+                    errors.append(e)
+            finally:
+                watchdog.cancel()
+            self.conversions += 1
+        return errors
+
+    def _convert_cli(self, tasks, timeout):
+        with tempfile.TemporaryDirectory(prefix='pdfpool_') as outdir:
+            command = [self.soffice_path, self._profile_arg(), '--headless', '--invisible', '--nologo',
+                       '--norestore', '--convert-to', 'pdf', '--outdir', outdir]
+            command += [os.path.abspath(docx_path) for docx_path, _ in tasks]
+            try:
+                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               timeout=timeout * len(tasks), check=True)
+            except subprocess.TimeoutExpired:
+                return [ConversionTimeout(f"Batch of {len(tasks)} timed out") for _ in tasks]
+            except subprocess.CalledProcessError as e:
+                return [RuntimeError(f"soffice exited with {e.returncode}: {e.stderr.decode(errors='replace')}")
+                        for _ in tasks]
+
+            errors = []
+            for docx_path, pdf_path in tasks:
+                produced = os.path.join(outdir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+                if os.path.exists(produced):
+                    shutil.move(produced, pdf_path)
+                    errors.append(None)
+                else:
+                    errors.append(RuntimeError(f"No PDF produced for {docx_path}"))
+                self.conversions += 1
+            return errors
+
+
+class PdfConverter:
+    """Queue of DOCX to PDF conversions served by a pool of warm LibreOffice workers
+
+    Each converter gets its own profile directory and, unless base_port is
+    given, ephemeral UNO ports, so every server process can run its own pool.
+    """
+
+    def __init__(self, soffice_path, workers=2, batch_size=8, timeout=60, max_conversions_per_worker=200,
+                 base_port=None, profile_root=None):
+        self.soffice_path = soffice_path
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_conversions_per_worker = max_conversions_per_worker
+        self._owns_profile_root = profile_root is None
+        self.profile_root = profile_root or tempfile.mkdtemp(prefix=f'pdfpool_{os.getpid()}_')
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # Seconds each conversion waited for a worker, and seconds its batch took to convert
+        self._queue_waits = deque(maxlen=1000)
+        self._conversion_times = deque(maxlen=1000)
+        self._closed = False
+        self.stats = {'conversions': 0, 'failures': 0, 'timeouts': 0, 'restarts': 0, 'batches': 0}
+        self._workers = []
+        self._threads = []
+        for index in range(workers):
+            worker = SofficeWorker(index, soffice_path, base_port + index if base_port else None, self.profile_root)
+            thread = threading.Thread(target=self._worker_loop, args=(worker,), name=f'pdf-worker-{index}',
+                                      daemon=True)
+            thread.start()
+            self._workers.append(worker)
+            self._threads.append(thread)
+        atexit.register(self.close)
+
+    def close(self, timeout=10):
+        """Stop the workers and their LibreOffice instances, and remove the profiles this converter created"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        for worker in self._workers:
+            worker.stop()
+        if self._owns_profile_root:
+            shutil.rmtree(self.profile_root, ignore_errors=True)
+
+    def submit(self, docx_path, pdf_path):
+        future = Future()
+        self._queue.put((docx_path, pdf_path, future, time.time()))
+        return future
+
+    def convert(self, docx_path, pdf_path):
+        """Convert one document, blocking until it is done"""
+        return self.submit(docx_path, pdf_path).result()
+
+    def convert_many(self, pairs):
+        """Convert [(docx_path, pdf_path), ...] and return an error (or None) for each"""
+        futures = [self.submit(docx_path, pdf_path) for docx_path, pdf_path in pairs]
+        return [future.exception() for future in futures]
+
+    def _next_batch(self):
+        """Up to batch_size queued tasks, or None once the converter is closed"""
+        batch = [self._queue.get()]
+        if batch[0] is None:
+            return None
+        while len(batch) < self.batch_size:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                self._queue.put(None)
+                break
+            batch.append(task)
+        return batch
+
+    def _worker_loop(self, worker):
+        try:
+            worker.start()
+        except Exception as e:
+            logger.error(f"Error starting PDF worker {worker.index}: {str(e)}")
+
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                worker.stop()
+                return
+            started = time.time()
+            try:
+                if worker.use_uno and worker.desktop is None:
+                    worker.restart()
+                    self._count('restarts')
+                errors = worker.convert_batch([(docx, pdf) for docx, pdf, _, _ in batch], self.timeout)
+            except Exception as e:
+                errors = [e] * len(batch)
+                worker.stop()
+
+            finished = time.time()
+            with self._lock:
+                self.stats['batches'] += 1
+            for (docx_path, pdf_path, future, queued), error in zip(batch, errors):
+                with self._lock:
+                    self._queue_waits.append(started - queued)
+                    self._conversion_times.append(finished - started)
+                    if error is None:
+                        self.stats['conversions'] += 1
+                    else:
+                        self.stats['failures'] += 1
+                        if isinstance(error, ConversionTimeout):
+                            self.stats['timeouts'] += 1
+                if error is None:
+                    future.set_result(pdf_path)
+                else:
+                    future.set_exception(error)
+
+            # Recycle long-lived instances before they leak too much memory; if the new one does not
+            # come up, the next batch retries the start
+            if worker.use_uno and worker.conversions >= self.max_conversions_per_worker:
+                try:
+                    worker.restart()
+                    self._count('restarts')
+                except Exception as e:
+                    logger.error(f"Error restarting PDF worker {worker.index}: {str(e)}")
+                    worker.stop()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+            samples = {'queue_wait': sorted(self._queue_waits), 'conversion': sorted(self._conversion_times)}
+        stats['queue_depth'] = self._queue.qsize()
+        stats['workers'] = len(self._threads)
+        for name, seconds in samples.items():
+            if seconds:
+                stats[f'{name}_p50_seconds'] = round(seconds[len(seconds) // 2], 3)
+                stats[f'{name}_p95_seconds'] = round(seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))], 3)
+        return stats
@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+
+from batch import percentile
+
+
+# Marks the end of the input on a stage's queue
+_DONE = object()
+
+
+def run_pipeline(inputs, stages, queue_size=4):
+    """Push inputs through stages that run concurrently with bounded queues between them
+
+    stages is a list of (name, fn, workers): fn takes the previous stage's
+    output and returns this stage's, on `workers` threads. Each queue holds at
+    most queue_size items, so a slow stage holds back the ones before it
+    instead of letting work pile up. While one item is in a later stage the
+    next one is already in an earlier stage. Each item succeeds or fails on its
+    own, and the time spent in every stage is recorded per item.
+    """
+    started = time.time()
+    items = [{'index': i, 'status': 'pending', 'stages': {}} for i in range(len(inputs))]
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    finished = queue.Queue()
+    remaining = [workers for _, _, workers in stages]
+    remaining_lock = threading.Lock()
+
+    def feed():
+        for index, value in enumerate(inputs):
+            items[index]['queued'] = time.time()
+            queues[0].put((index, value))
+        for _ in range(stages[0][2]):
+            queues[0].put(_DONE)
+
+    def work(position):
+        name, fn, _ = stages[position]
+        last = position == len(stages) - 1
+        while True:
+            entry = queues[position].get()
+            if entry is _DONE:
+                break
+            index, value = entry
+            item = items[index]
+            stage_start = time.time()
+            try:
+                value = fn(value)
+            except Exception as e:
+                item['stages'][name] = round(time.time() - stage_start, 3)
+                item.update(status='failed', stage=name, error=str(e))
+                finished.put(index)
+                continue
+            item['stages'][name] = round(time.time() - stage_start, 3)
+            if last:
+                item.update(status='done', result=value, latency_seconds=round(time.time() - item['queued'], 3))
+                finished.put(index)
+            else:
+                queues[position + 1].put((index, value))
+
+        # The last worker out of a stage tells the next stage there is no more input
+        with remaining_lock:
+            remaining[position] -= 1
+            closing = remaining[position] == 0
+        if closing and not last:
+            for _ in range(stages[position + 1][2]):
+                queues[position + 1].put(_DONE)
+
+    threads = [threading.Thread(target=feed, name='pipeline-feed', daemon=True)]
+    for position, (name, _, workers) in enumerate(stages):
+        threads += [threading.Thread(target=work, args=(position,), name=f'pipeline-{name}', daemon=True)
+                    for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for _ in inputs:
+        finished.get()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.time() - started
+    latencies = [item['latency_seconds'] for item in items if item['status'] == 'done']
+    stage_report = {}
+    for name, _, workers in stages:
+        durations = [item['stages'][name] for item in items if name in item['stages']]
+        stage_report[name] = {
+            'workers': workers,
+            'count': len(durations),
+            'busy_seconds': round(sum(durations), 3),
+            'latency_p50_seconds': percentile(durations, 50),
+            'latency_p95_seconds': percentile(durations, 95),
+            'latency_max_seconds': max(durations) if durations else 0.0
+        }
+    for item in items:
+        item.pop('queued', None)
+
+    report = {
+        'count': len(inputs),
+        'succeeded': len(latencies),
+        'failed': len(inputs) - len(latencies),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+        'latency_p50_seconds': percentile(latencies, 50),
+        'latency_p95_seconds': percentile(latencies, 95),
+        'latency_max_seconds': max(latencies) if latencies else 0.0,
+        'stages': stage_report
+    }
+    return items, report
@@ -0,0 +1,429 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+
+# Priority classes, most urgent first
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+# How often a queued coroutine checks whether it may start
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class QuotaExhausted(Exception):
+    """The call could not be made within its deadline or retry budget"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        # Seconds until the quota is expected to allow calls again, if known
+        self.retry_after = retry_after
+
+
+def is_quota_error(exc):
+    """True for 429 / RESOURCE_EXHAUSTED errors from the Gemini client"""
+    code = getattr(exc, 'code', None)
+    if code == 429 or getattr(code, 'value', None) == 429:
+        return True
+    return type(exc).__name__ in ('ResourceExhausted', 'TooManyRequests') or '429' in str(exc)[:50]
+
+
+def retry_after(exc):
+    """The server's requested delay in seconds, from a Retry-After header or a RetryInfo detail"""
+    response = getattr(exc, 'response', None)
+    header = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            pass
+    for detail in getattr(exc, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+
+class TokenBucket:
+    """Holds up to capacity tokens, refilled evenly over each minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount tokens are available (an oversized amount waits for a full bucket)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """Give back (positive) or charge (negative) tokens once the real usage is known"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ScheduledStream:
+    """
+    A streamed response that keeps its concurrency slot until it is read to the end or closed.
+
+    Use it as a context manager so an abandoned stream gives its slot back.
+    A quota error before the first chunk is retried like in call(); one
+    after chunks were handed out cannot be, and raises QuotaExhausted. The
+    TPM bucket is settled once the stream is exhausted.
+    """
+
+    def __init__(self, scheduler, fn, tokens, priority, deadline):
+        self._scheduler = scheduler
+        self._fn = fn
+        self._tokens = tokens
+        self._priority = priority
+        self._deadline = deadline
+        self._sequence = next(scheduler._sequence)
+        self._attempt = 0
+        self._held = False
+        self.response = None
+
+    def _start(self):
+        """Wait for admission and make the request, retrying quota errors; the slot stays held"""
+        while True:
+            self._scheduler._admit(self._tokens, self._priority, self._deadline, self._sequence)
+            self._held = True
+            try:
+                self.response = self._fn()
+                return
+            except Exception as e:
+                self.close()
+                if not is_quota_error(e):
+                    raise
+                self._scheduler._quota_error(e, self._attempt)
+                self._attempt += 1
+
+    def _retry(self, e, read_any):
+        """Back off after a quota error while reading; raises QuotaExhausted if it cannot be retried"""
+        self.close()
+        if read_any:
+            # Chunks already handed out cannot be taken back, so only an untouched stream is retried
+            try:
+                self._scheduler._quota_error(e, self._scheduler.max_retries)
+            except QuotaExhausted as exhausted:
+                raise QuotaExhausted(f'Gemini quota exceeded part way through a streamed response: {str(e)}',
+                                     retry_after=exhausted.retry_after) from e
+        self._scheduler._quota_error(e, self._attempt)
+        self._attempt += 1
+
+    def __iter__(self):
+        read_any = False
+        try:
+            while True:
+                try:
+                    for chunk in self.response:
+                        read_any = True
+                        yield chunk
+                    break
+                except Exception as e:
+                    if not is_quota_error(e):
+                        raise
+                    self._retry(e, read_any)
+                    self._start()
+            self._scheduler.settle(self._tokens, getattr(self.usage_metadata, 'prompt_token_count', None))
+        finally:
+            self.close()
+
+    @property
+    def usage_metadata(self):
+        return getattr(self.response, 'usage_metadata', None)
+
+    def close(self):
+        """Give the concurrency slot back; safe to call more than once"""
+        with self._scheduler._cond:
+            held, self._held = self._held, False
+        if held:
+            self._scheduler._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncScheduledStream(ScheduledStream):
+    """ScheduledStream for a coroutine function returning an async-iterable response"""
+
+    async def _start(self):
+        while True:
+            await self._scheduler._admit_async(self._tokens, self._priority, self._deadline, self._sequence)
+            self._held = True
+            try:
+                self.response = await self._fn()
+                return
+            except Exception as e:
+                self.close()
+                if not is_quota_error(e):
+                    raise
+                self._scheduler._quota_error(e, self._attempt)
+                self._attempt += 1
+
+    def __iter__(self):
+        raise TypeError('AsyncScheduledStream is read with async for')
+
+    async def __aiter__(self):
+        read_any = False
+        try:
+            while True:
+                try:
+                    async for chunk in self.response:
+                        read_any = True
+                        yield chunk
+                    break
+                except Exception as e:
+                    if not is_quota_error(e):
+                        raise
+                    self._retry(e, read_any)
+                    await self._start()
+            self._scheduler.settle(self._tokens, getattr(self.usage_metadata, 'prompt_token_count', None))
+        finally:
+            self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class GeminiScheduler:
+    """
+    Admits Gemini calls within requests-per-minute and tokens-per-minute quotas.
+
+    Callers block in call() until their request reaches the front of the
+    queue (interactive before batch, then first come first served), both
+    buckets have room and a concurrency slot is free. A request that cannot
+    start before its deadline raises QuotaExhausted. Quota errors are retried
+    after the server's Retry-After, or with exponential backoff, and pause
+    every queued request meanwhile, since they share the quota.
+
+    Args:
+        requests_per_minute (int): RPM quota, or 0 for no limit.
+        tokens_per_minute (int): Prompt TPM quota, or 0 for no limit.
+        max_concurrency (int): Calls in flight at once.
+        max_retries (int): Retries of a call that hit a quota error.
+        on_wait (callable): Called with (seconds, priority) each time a call
+            is admitted, with how long it queued.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_concurrency=16, max_retries=3,
+                 backoff=1.0, max_backoff=30.0, on_wait=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_wait = on_wait
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self.stats = {'admitted': 0, 'retries': 0, 'quota_errors': 0, 'expired': 0}
+
+    def _delay(self, tokens, now):
+        """Seconds until the front request may start, or 0 if it may start now"""
+        delay = max(0.0, self._paused_until - now)
+        if self.requests is not None:
+            delay = max(delay, self.requests.wait_time(1, now))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.wait_time(tokens, now))
+        return delay
+
+    def _poll(self, entry, tokens, deadline, now):
+        """Start the request if it may go now; otherwise return how long to wait (None: until notified)
+
+        Call with the lock held.
+        """
+        if self._queue[0] == entry and self._in_flight < self.max_concurrency:
+            delay = self._delay(tokens, now)
+            if not delay:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                if self.requests is not None:
+                    self.requests.take(1, now)
+                if self.tokens is not None and tokens:
+                    self.tokens.take(tokens, now)
+                self._in_flight += 1
+                self.stats['admitted'] += 1
+                self._cond.notify_all()
+                return 0.0
+        else:
+            delay = None
+        if deadline is not None:
+            if now >= deadline:
+                self.stats['expired'] += 1
+                raise QuotaExhausted('Gemini request could not start before its deadline',
+                                     retry_after=max(0.0, self._paused_until - now) or None)
+            delay = deadline - now if delay is None else min(delay, deadline - now)
+        return delay
+
+    def _abandon(self, entry):
+        """Take a request that gave up out of the queue; call with the lock held"""
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def _admit(self, tokens, priority, deadline, sequence):
+        entry = (PRIORITIES.index(priority), sequence)
+        enqueued = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._poll(entry, tokens, deadline, now)
+                    if delay == 0.0:
+                        break
+                    self._cond.wait(delay)
+            except BaseException:
+                self._abandon(entry)
+                raise
+        if self.on_wait is not None:
+            self.on_wait(now - enqueued, priority)
+
+    async def _admit_async(self, tokens, priority, deadline, sequence):
+        entry = (PRIORITIES.index(priority), sequence)
+        enqueued = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+        try:
+            while True:
+                now = time.monotonic()
+                with self._cond:
+                    delay = self._poll(entry, tokens, deadline, now)
+                if delay == 0.0:
+                    break
+                # Coroutines cannot wait on the condition, so they check back regularly
+                await asyncio.sleep(ASYNC_POLL_INTERVAL if delay is None else min(delay, ASYNC_POLL_INTERVAL))
+        except BaseException:
+            # Also covers a cancelled request, which must not hold up the queue
+            with self._cond:
+                self._abandon(entry)
+            raise
+        if self.on_wait is not None:
+            self.on_wait(now - enqueued, priority)
+
+    def can_admit(self, tokens=0):
+        """Whether a call would start right away: nothing queued, a free slot and room in both buckets"""
+        with self._cond:
+            return not self._queue and self._in_flight < self.max_concurrency \
+                and not self._delay(tokens, time.monotonic())
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _quota_error(self, e, attempt):
+        """Pause the queue after a quota error; raise QuotaExhausted once retries run out"""
+        delay = retry_after(e)
+        if delay is None:
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        with self._cond:
+            self.stats['quota_errors'] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            # The rejected request still used up quota on the server
+            if self.requests is not None:
+                self.requests.tokens = min(self.requests.tokens, 0.0)
+            if attempt == self.max_retries:
+                raise QuotaExhausted(f'Gemini quota exceeded after {attempt + 1} attempts: {str(e)}',
+                                     retry_after=delay) from e
+            self.stats['retries'] += 1
+
+    def call(self, fn, tokens=0, priority=INTERACTIVE, deadline=None):
+        """
+        Runs fn() once the quotas allow, retrying quota errors.
+
+        Args:
+            fn (callable): Makes the Gemini call and returns its response.
+            tokens (int): Estimated prompt tokens, charged to the TPM bucket.
+            priority (str): INTERACTIVE or BATCH.
+            deadline (float): time.monotonic() value by which the call must
+                have started, or None to wait as long as it takes.
+
+        Returns:
+            Whatever fn returns.
+        """
+        # A retried request keeps its place in line
+        sequence = next(self._sequence)
+        for attempt in range(self.max_retries + 1):
+            self._admit(tokens, priority, deadline, sequence)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_quota_error(e):
+                    raise
+                self._quota_error(e, attempt)
+            finally:
+                self._release()
+
+    def stream(self, fn, tokens=0, priority=INTERACTIVE, deadline=None):
+        """Like call(), for an fn that returns a streamed response; returns a ScheduledStream
+
+        The call counts against max_concurrency until the stream is read to
+        the end or closed, not just until fn returns.
+        """
+        stream = ScheduledStream(self, fn, tokens, priority, deadline)
+        stream._start()
+        return stream
+
+    async def stream_async(self, fn, tokens=0, priority=INTERACTIVE, deadline=None):
+        """Like stream(), for a coroutine function fn returning an async-iterable response"""
+        stream = AsyncScheduledStream(self, fn, tokens, priority, deadline)
+        await stream._start()
+        return stream
+
+    async def call_async(self, fn, tokens=0, priority=INTERACTIVE, deadline=None):
+        """Like call(), for a coroutine function fn, without blocking the event loop while queued"""
+        sequence = next(self._sequence)
+        for attempt in range(self.max_retries + 1):
+            await self._admit_async(tokens, priority, deadline, sequence)
+            try:
+                return await fn()
+            except Exception as e:
+                if not is_quota_error(e):
+                    raise
+                self._quota_error(e, attempt)
+            finally:
+                self._release()
+
+    def settle(self, estimated, actual):
+        """Correct the TPM bucket once a response reports its real prompt token count"""
+        if self.tokens is not None and actual:
+            with self._cond:
+                self.tokens.adjust(estimated - actual)
+
+    def summary(self):
+        with self._cond:
+            summary = dict(self.stats)
+            summary['queued'] = len(self._queue)
+            summary['queued_batch'] = sum(1 for rank, _ in self._queue if PRIORITIES[rank] == BATCH)
+            summary['in_flight'] = self._in_flight
+            summary['paused_seconds'] = round(max(0.0, self._paused_until - time.monotonic()), 3)
+            if self.requests is not None:
+                summary['requests_available'] = round(self.requests.tokens, 2)
+            if self.tokens is not None:
+                summary['tokens_available'] = round(self.tokens.tokens)
+        return summary
@@ -0,0 +1,123 @@
+import json
+import logging
+
+from jsonrepair import repair_json
+
+
+logger = logging.getLogger(__name__)
+
+
+class SectionStreamParser:
+    """Incrementally parse a streamed structured-content JSON response
+
+    Text chunks are fed in as they arrive from the model. Every entry of the
+    top-level "sections" array is returned as soon as its closing brace is
+    seen, and the title is captured once its string value is complete.
+    Markdown fences and any other text outside the JSON object are ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.title = None
+        self.sections = []
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._pending_key = None
+        self._in_sections = False
+        self._section_start = None
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return the sections it completed"""
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+
+        while self._pos < len(buf) and not self.complete:
+            pos = self._pos
+            ch = buf[pos]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._finish_string(buf[self._string_start:pos + 1])
+                continue
+
+            if self._depth == 0 and ch != '{':
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch == ':':
+                if self._depth == 1:
+                    self._pending_key = self._last_string
+            elif ch == ',':
+                if self._depth == 1:
+                    self._pending_key = None
+            elif ch in '{[':
+                if ch == '[' and self._depth == 1 and self._pending_key == 'sections':
+                    self._in_sections = True
+                self._depth += 1
+                if ch == '{' and self._in_sections and self._depth == 3:
+                    self._section_start = pos
+            elif ch in '}]':
+                if ch == '}' and self._in_sections and self._depth == 3 and self._section_start is not None:
+                    section = self._parse_section(buf[self._section_start:pos + 1])
+                    if section is not None:
+                        self.sections.append(section)
+                        completed.append(section)
+                    self._section_start = None
+                elif ch == ']' and self._in_sections and self._depth == 2:
+                    self._in_sections = False
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+
+        return completed
+
+    def _finish_string(self, literal):
+        try:
+            value = json.loads(literal)
+        except json.JSONDecodeError:
+            value = None
+        if self._depth == 1:
+            if self._pending_key == 'title' and self.title is None:
+                self.title = value
+                self._pending_key = None
+            else:
+                self._last_string = value
+
+    def _parse_section(self, text):
+        try:
+            section = json.loads(text)
+        except json.JSONDecodeError as json_err:
+            # The section's braces balanced, so whatever is wrong inside it is usually repairable
+            result = repair_json(text)
+            if not result.complete or not isinstance(result.value, dict):
+                logger.warning(f"Skipping malformed streamed section: {str(json_err)}")
+                return None
+            logger.info(f"Repaired streamed section: {', '.join(sorted(set(result.repairs)))}")
+            section = result.value
+        return section if isinstance(section, dict) else None
+
+    def document(self):
+        """Assemble the final structured content from the streamed pieces"""
+        return {
+            'title': self.title or 'Generated Document',
+            'sections': list(self.sections)
+        }
+
+
+def format_event(event, data):
+    """Format a Server-Sent Event carrying a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,256 @@
+import re
+
+from chunking import FALLBACK_TITLE
+
+
+ATX_HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+SETEXT_UNDERLINE = re.compile(r'^\s*(=+|-+)\s*$')
+BULLET = re.compile(r'^(\s*)[-*+•]\s+(.+)$')
+NUMBERED = re.compile(r'^(\s*)\d{1,3}[.)]\s+(.+)$')
+TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$')
+FENCE = re.compile(r'^\s*(```|~~~)')
+HORIZONTAL_RULE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+
+# 'Highlights:' style lines: short, ending in a colon, with no sentence punctuation before it
+LABEL_HEADING = re.compile(r'^([A-Z][^.!?:|]{0,58}):$')
+
+# Sections with more prose than this are better split up by the model
+MAX_SECTION_PARAGRAPHS = 8
+
+INTRODUCTION = 'Introduction'
+
+
+def _inline(text):
+    """Drop Markdown emphasis and code markers, and keep link targets readable"""
+    text = re.sub(r'!?\[([^\]]*)\]\(([^)]+)\)', r'\1 (\2)', text)
+    text = re.sub(r'(\*\*|__)(.+?)\1', r'\2', text)
+    text = re.sub(r'(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])', r'\1', text)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    return text.strip()
+
+
+def _pipe_cells(line):
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|'):
+        line = line[:-1]
+    return [_inline(cell) for cell in line.split('|')]
+
+
+class _Builder:
+    def __init__(self):
+        self.title = None
+        self.title_explicit = False
+        self.sections = []
+        self.heading_level = 0
+        self.explicit_headings = 0
+        self.label_headings = 0
+        self.malformed_tables = 0
+        self.structured_chars = 0
+        self.loose_chars = 0
+
+    def section(self, heading, level):
+        self.sections.append({'heading': heading, 'level': level, 'content': []})
+
+    def add(self, item, chars, structured):
+        if not self.sections:
+            self.section(INTRODUCTION, 1)
+        self.sections[-1]['content'].append(item)
+        # Text under a heading, or inside a list or table, was laid out by the author
+        if structured or self.title_explicit or self.sections[-1]['heading'] != INTRODUCTION:
+            self.structured_chars += chars
+        else:
+            self.loose_chars += chars
+
+
+def _read_table(lines, start):
+    """Read a pipe or tab separated table starting at lines[start]; return (item, next index, well formed)
+
+    item is None when the lines hold nothing but separator rows.
+    """
+    first = lines[start]
+    if '\t' in first and '|' not in first:
+        rows = []
+        index = start
+        while index < len(lines) and '\t' in lines[index]:
+            rows.append([_inline(cell) for cell in lines[index].strip().split('\t')])
+            index += 1
+    else:
+        rows = []
+        index = start
+        while index < len(lines) and '|' in lines[index] and lines[index].strip():
+            if not TABLE_SEPARATOR.match(lines[index]):
+                rows.append(_pipe_cells(lines[index]))
+            index += 1
+
+    if not rows:
+        return None, index, False
+    width = len(rows[0])
+    well_formed = len(rows) >= 2 and width >= 2 and all(len(row) == width for row in rows)
+    return {'type': 'table', 'headers': rows[0], 'rows': rows[1:]}, index, well_formed
+
+
+def _is_table_start(lines, index):
+    line = lines[index]
+    following = lines[index + 1] if index + 1 < len(lines) else ''
+    if '\t' in line.strip() and '\t' in following.strip():
+        return True
+    return line.strip().startswith('|') or ('|' in line and TABLE_SEPARATOR.match(following) is not None)
+
+
+def structure_text(text):
+    """
+    Turns plaintext or Markdown into structured content without calling the model.
+
+    Handles ATX and underlined headings, 'Label:' headings, bullet and numbered
+    lists, pipe and tab separated tables, fenced code and paragraphs.
+
+    Args:
+        text (str): The input text.
+
+    Returns:
+        tuple: (structured_content, confidence between 0 and 1 that the result
+        is as good as the model's)
+    """
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    builder = _Builder()
+    paragraph = []
+
+    def flush_paragraph():
+        if paragraph:
+            joined = _inline(' '.join(line.strip() for line in paragraph))
+            builder.add({'type': 'paragraph', 'text': joined}, len(joined), False)
+            paragraph.clear()
+
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        stripped = line.strip()
+        following = lines[index + 1] if index + 1 < len(lines) else ''
+
+        if not stripped:
+            flush_paragraph()
+            index += 1
+            continue
+
+        heading = ATX_HEADING.match(stripped)
+        setext = (not paragraph and SETEXT_UNDERLINE.match(following) and not HORIZONTAL_RULE.match(line)
+                  and len(stripped) < 120 and not BULLET.match(line))
+        if heading or setext:
+            flush_paragraph()
+            if heading:
+                level, heading_text = len(heading.group(1)), _inline(heading.group(2))
+                index += 1
+            else:
+                level, heading_text = (1 if following.strip().startswith('=') else 2), _inline(stripped)
+                index += 2
+            builder.explicit_headings += 1
+            builder.heading_level = level
+            if level == 1 and builder.title is None and not builder.sections:
+                builder.title, builder.title_explicit = heading_text, True
+            else:
+                builder.section(heading_text, level)
+            continue
+
+        if HORIZONTAL_RULE.match(line):
+            flush_paragraph()
+            index += 1
+            continue
+
+        if FENCE.match(line):
+            flush_paragraph()
+            fence = FENCE.match(line).group(1)
+            index += 1
+            code = []
+            while index < len(lines) and not lines[index].strip().startswith(fence):
+                code.append(lines[index])
+                index += 1
+            index += 1
+            if code:
+                builder.add({'type': 'paragraph', 'text': '\n'.join(code)}, sum(len(c) for c in code), True)
+            continue
+
+        if _is_table_start(lines, index):
+            flush_paragraph()
+            start = index
+            item, index, well_formed = _read_table(lines, index)
+            if item is None:
+                # Separator rows with no cells around them are just text
+                paragraph.extend(lines[start:index])
+            elif well_formed:
+                builder.add(item, sum(len(cell) for row in [item['headers']] + item['rows'] for cell in row), True)
+            else:
+                builder.malformed_tables += 1
+                rows = [' | '.join(row) for row in [item['headers']] + item['rows']]
+                builder.add({'type': 'paragraph', 'text': '\n'.join(rows)}, sum(len(row) for row in rows), False)
+            continue
+
+        for pattern, list_type in ((BULLET, 'bullet_list'), (NUMBERED, 'numbered_list')):
+            if pattern.match(line):
+                flush_paragraph()
+                items = []
+                while index < len(lines):
+                    match = pattern.match(lines[index])
+                    if match:
+                        items.append(_inline(match.group(2)))
+                    elif lines[index].strip() and lines[index][:1].isspace() and items \
+                            and not BULLET.match(lines[index]) and not NUMBERED.match(lines[index]):
+                        # An indented continuation line belongs to the item above it
+                        items[-1] = f"{items[-1]} {_inline(lines[index])}"
+                    else:
+                        break
+                    index += 1
+                builder.add({'type': list_type, 'items': items}, sum(len(item) for item in items), True)
+                break
+        else:
+            label = LABEL_HEADING.match(stripped)
+            if label and not paragraph:
+                builder.label_headings += 1
+                builder.section(_inline(label.group(1)), min(builder.heading_level + 1, 9))
+            else:
+                paragraph.append(line)
+            index += 1
+
+    flush_paragraph()
+
+    sections = [section for section in builder.sections if section['content'] or section['heading'] != INTRODUCTION]
+    # Top-level sections sit at level 1 even when the document starts at '##'
+    levels = [section['level'] for section in sections if section['heading'] != INTRODUCTION]
+    shift = min(levels) - 1 if levels else 0
+    for section in sections:
+        if section['heading'] != INTRODUCTION:
+            section['level'] -= shift
+    title = builder.title
+    if title is None and sections and sections[0]['heading'] != INTRODUCTION:
+        title = sections[0]['heading']
+    structured_content = {'title': title or FALLBACK_TITLE, 'sections': sections}
+    return structured_content, _confidence(builder, sections)
+
+
+def _confidence(builder, sections):
+    """How likely the local result matches what the model would produce
+
+    The share of text the author laid out under headings or in lists and
+    tables, scaled by how explicit the headings are, less penalties for
+    tables that did not parse and for long runs of unbroken prose.
+    """
+    total = builder.structured_chars + builder.loose_chars
+    if not total or not sections:
+        return 0.0
+    coverage = builder.structured_chars / total
+
+    if builder.explicit_headings and builder.title_explicit:
+        factor = 1.0
+    elif builder.explicit_headings:
+        factor = 0.9
+    elif builder.label_headings:
+        factor = 0.8
+    else:
+        factor = 0.4
+
+    penalty = 0.15 * builder.malformed_tables
+    paragraphs = max(sum(1 for item in section['content'] if item['type'] == 'paragraph') for section in sections)
+    if paragraphs > MAX_SECTION_PARAGRAPHS:
+        penalty += 0.2
+    return round(max(0.0, min(1.0, coverage * factor - penalty)), 3)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import CHARS_PER_TOKEN, estimate_tokens, split_into_chunks  # noqa: E402
+
+
+def test_max_size_block_is_chunked_once():
+    max_tokens = 3000
+    for text in ('a' * (max_tokens * CHARS_PER_TOKEN), ' '.join(['word'] * max_tokens)):
+        chunks = split_into_chunks(text, max_tokens)
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert estimate_tokens(chunk) <= max_tokens
+            assert split_into_chunks(chunk, max_tokens) == [chunk]
+
+
+def test_paragraphs_fill_chunks_within_budget():
+    text = '\n\n'.join(f"Paragraph {i} " + 'text ' * 50 for i in range(100))
+    chunks = split_into_chunks(text, 500)
+    assert all(estimate_tokens(chunk) <= 500 for chunk in chunks)
+    assert ''.join(chunks).count('Paragraph') == 100
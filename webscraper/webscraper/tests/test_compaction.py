@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compaction import compact_input, compact_text  # noqa: E402
+
+
+def test_tsv_columns_are_kept():
+    text = 'Name\tCount\tNotes\nalpha\t1\tfirst  entry\nbeta\t22\t \nAligned    columns   here'
+    assert compact_text(text) == 'Name\tCount\tNotes\nalpha\t1\tfirst  entry\nbeta\t22\nAligned  columns  here'
+
+
+def test_repeated_row_in_two_tables_is_kept():
+    table = '| Region | Total |\n| --- | --- |\n| North America | 10 |\n| {} | {} |'
+    text = '# 2023\n\n' + table.format('Europe', 4) + '\n\n# 2024\n\n' + table.format('Asia', 7)
+    compacted, _ = compact_input(text)
+    assert compacted.count('| North America | 10 |') == 2
+    assert compacted.count('| Region | Total |') == 2
+
+
+def test_repeated_boilerplate_lines_are_dropped_from_html():
+    html = ('<html><body><article>' + ''.join(
+        f"<p>Paragraph {i} of the article, long enough to count as real content here.</p>"
+        "<p>Share this article with your friends</p>" for i in range(4)
+    ) + '</article></body></html>')
+    compacted, stats = compact_input(html)
+    assert stats['html']
+    assert compacted.count('Share this article with your friends') == 1
+    assert compacted.count('of the article') == 4
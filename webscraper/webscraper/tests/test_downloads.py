@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the app's stores out of the source tree
+_root = tempfile.mkdtemp(prefix='webscraper_test_')
+for _name, _value in (('OUTPUT_FOLDER', 'output'), ('ARTIFACT_DB_PATH', 'artifacts.db'), ('CACHE_DB_PATH', 'cache.db'),
+                      ('JOB_DB_PATH', 'jobs.db'), ('URL_CACHE_PATH', 'http.db')):
+    os.environ[_name] = os.path.join(_root, _value)
+os.environ.setdefault('MEMORY_ARTIFACTS', '0')
+
+import app as webapp  # noqa: E402
+
+
+def store(name, data):
+    temp_path = os.path.join(_root, f"{name}.tmp")
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    return webapp.artifact_store.add_file(name, temp_path)
+
+
+def test_indexed_file_is_served_with_ranges():
+    store('served.txt', b'0123456789')
+    client = webapp.app.test_client()
+    response = client.get('/download/served.txt')
+    assert response.status_code == 200
+    assert response.data == b'0123456789'
+    assert client.get('/download/served.txt', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    response = client.get('/download/served.txt', headers={'Range': 'bytes=2-4'})
+    assert response.status_code == 206
+    assert response.data == b'234'
+
+
+def test_deleted_indexed_file_is_404_and_forgotten():
+    os.remove(store('deleted.txt', b'gone'))
+    response = webapp.app.test_client().get('/download/deleted.txt')
+    assert response.status_code == 404
+    assert not webapp.artifact_store.contains('deleted.txt')
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers import PARSERS  # noqa: E402
+
+FRAGMENTS = [
+    ('Hello<!-- c -->World', 'Hello World'),
+    ('a<br>b<br/>c', 'a b c'),
+    ('<p>Hel<b>lo</b> there</p>', 'Hel lo there'),
+    ('x<script>var a = 1;</script>y<style>p {}</style>z', 'x y z'),
+    ('<div>a<?pi x?>b</div>', 'a b'),
+    ('<html><head><title>T</title></head><body><p>one</p><p>two &amp; three</p></body></html>', 'T one two & three'),
+    ('<ul><li>1</li><li>2</li></ul>\n<!-- end -->\n<p>caf&eacute;&nbsp;<em>na&iuml;ve</em></p>', '1 2 café naïve'),
+]
+
+
+@pytest.mark.parametrize('name', sorted(PARSERS))
+@pytest.mark.parametrize('html,text', FRAGMENTS)
+def test_backends_produce_the_same_text(name, html, text):
+    assert PARSERS[name](html) == text
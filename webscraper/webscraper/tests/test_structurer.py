@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structurer import structure_text  # noqa: E402
+
+
+def test_separator_row_without_cells_is_text():
+    structured_content, confidence = structure_text('| --- |\nhello')
+    content = structured_content['sections'][0]['content']
+    assert content == [{'type': 'paragraph', 'text': '| --- | hello'}]
+    assert confidence < 0.85
+
+
+def test_pipe_table_is_parsed():
+    structured_content, _ = structure_text('# Report\n\n| Name | Count |\n| --- | --- |\n| a | 1 |\n| b | 2 |')
+    assert structured_content['title'] == 'Report'
+    table = structured_content['sections'][0]['content'][0]
+    assert table == {'type': 'table', 'headers': ['Name', 'Count'], 'rows': [['a', '1'], ['b', '2']]}